@@ -0,0 +1,355 @@
+'''Benchmarks the rendering of synthetic scenes without opening a window.
+
+Every combination of scene, size, and camera path is rendered in a process of
+its own (so that its peak memory usage can be measured), into an offscreen
+surface, and the results are written as JSON.
+'''
+from __future__ import division
+
+import argparse
+import json
+import logging
+import math
+import multiprocessing
+import numpy as np
+import os
+import platform
+import sys
+import timeit
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+import pygame
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from three_d.cameras.multiview import MultiViewRenderer, split_surface
+from three_d.cameras.orthographic import OrthographicViewport
+from three_d.cameras.perspective import PerspectiveViewport
+from three_d.kinematics import Kinematics
+from three_d.model import IndexedModel, Model
+from three_d.profiling import FrameProfiler
+from three_d.scene import Scene
+from shapes import CUBE_GEOMETRY, Cube
+
+def random_colors(rng, count):
+    """Generates `count` random colors, none of which is nearly black.
+    """
+    return rng.randint(0x202020, 0xFFFFFF, count)
+
+
+def grid_positions(count):
+    """Generates the centers of `count` cells of a cubic grid of 40-unit
+    cells, centered on the origin.
+    """
+    side = int(math.ceil(count ** (1 / 3)))
+    cells = np.indices((side, side, side)).reshape(3, -1).T[:count]
+    return (cells - (side - 1) / 2) * 40.0
+
+
+def cube_grid(num_edges, rng):
+    """Generates a cubic grid of cubes with about `num_edges` edges in all.
+    """
+    count = max(num_edges // 12, 1)
+    colors = random_colors(rng, count)
+    return [Cube(position, side=20, color=int(color))
+            for position, color in zip(grid_positions(count), colors)]
+
+
+def box_grid(num_edges, rng):
+    """Generates the same grid as `cube_grid`, but of plain models with
+    arrays of their own rather than instances of a shared geometry.
+    """
+    count = max(num_edges // 12, 1)
+    colors = random_colors(rng, count)
+    return [IndexedModel(position, vertices=CUBE_GEOMETRY.vertices * 20,
+                         edge_indices=CUBE_GEOMETRY.edge_indices,
+                         colors=int(color))
+            for position, color in zip(grid_positions(count), colors)]
+
+
+def edge_soup(num_edges, rng):
+    """Generates a single model with `num_edges` random edges.
+    """
+    starts = rng.uniform(-500, 500, (num_edges, 3))
+    ends = starts + rng.normal(0, 30, (num_edges, 3))
+    return [Model(np.zeros(3), starts=starts, ends=ends,
+                  colors=random_colors(rng, num_edges))]
+
+
+def large_mesh(num_edges, rng):
+    """Generates a single wavy height field mesh with about `num_edges`
+    edges.
+    """
+    side = int(math.ceil(math.sqrt(max(num_edges, 4) / 2))) + 1
+    x, z = np.meshgrid(np.linspace(-500, 500, side),
+                       np.linspace(-500, 500, side))
+    y = 40 * np.sin(x / 80) * np.cos(z / 110)
+    vertices = np.column_stack((x.ravel(), y.ravel(), z.ravel()))
+    ids = np.arange(side * side).reshape(side, side)
+    edge_indices = np.concatenate((
+        np.column_stack((ids[:, :-1].ravel(), ids[:, 1:].ravel())),
+        np.column_stack((ids[:-1, :].ravel(), ids[1:, :].ravel()))))
+    return [IndexedModel(np.zeros(3), vertices=vertices,
+                         edge_indices=edge_indices,
+                         colors=random_colors(rng, len(edge_indices)))]
+
+
+def orbit_path(views, center, distance, frames):
+    """Circles around the center once with every view, looking at it.
+    """
+    step = 2 * math.pi / frames
+    for _ in xrange(frames):
+        for view in views:
+            view.rotate_y(step)
+            view.eye = center - distance * view.look_dir
+        yield
+
+
+def flythrough_path(views, center, distance, frames):
+    """Flies straight through the center with every view.
+    """
+    step = 2 * distance / frames
+    for _ in xrange(frames):
+        for view in views:
+            view.translate(step * view.look_dir)
+        yield
+
+
+def still_path(views, center, distance, frames):
+    """Does not move at all, so that no frame is drawn after the first one
+    unless models move, and the frames measure the cost of finding that
+    nothing has changed.
+    """
+    for _ in xrange(frames):
+        yield
+
+
+SCENES = {'cubes': cube_grid, 'boxes': box_grid, 'soup': edge_soup,
+          'mesh': large_mesh}
+PATHS = {'orbit': orbit_path, 'flythrough': flythrough_path,
+         'still': still_path}
+VIEWPORTS = {'perspective': PerspectiveViewport,
+             'orthographic': OrthographicViewport}
+
+
+def moving_models(models, fraction, speed, rng):
+    """Sets a fraction of the models moving and spinning at random
+    velocities.
+
+    Returns
+    -------
+    Kinematics
+    """
+    kinematics = Kinematics()
+    count = int(round(fraction * len(models)))
+    for index in sorted(rng.choice(len(models), count, replace=False)):
+        kinematics.add(models[index], rng.normal(0, speed, 3),
+                       rng.normal(0, 1, 3))
+    return kinematics
+
+
+def get_peak_memory():
+    """Returns the peak resident memory of this process in megabytes, or
+    `None` if it is unknown.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # in bytes on macOS, and in kilobytes elsewhere
+    return peak / (1 << 20 if sys.platform == 'darwin' else 1 << 10)
+
+
+def run_case(case):
+    """Renders a scene along a camera path.
+
+    Parameters
+    ----------
+    case : dict
+        the scene, size, path, and options of the run
+
+    Returns
+    -------
+    dict
+        the measurements of the run, with latencies in milliseconds
+    """
+    rng = np.random.RandomState(case['seed'])
+    models = SCENES[case['scene']](case['size'], rng)
+    low = np.min([obj.world_bounds[0] for obj in models], axis=0)
+    high = np.max([obj.world_bounds[1] for obj in models], axis=0)
+    center = (low + high) / 2
+    distance = 1.5 * np.linalg.norm(high - low)
+    kinematics = moving_models(models, case['moving'], distance / 20, rng) \
+                 if case['moving'] else None
+
+    surface = pygame.Surface((case['width'], case['height']))
+    profiler = FrameProfiler(history=max(case['frames'], 1), enabled=False)
+    rows = int(math.sqrt(case['views']))
+    cells = split_surface(surface, rows, -(-case['views'] // rows))
+    views = [VIEWPORTS[case['viewport']](cell, depth_test=case['depth_test'])
+             for cell in cells[:case['views']]]
+    renderer = MultiViewRenderer(
+        views, models=Scene(models) if case['bvh'] else models,
+        profiler=profiler, workers=case['workers'])
+    for i, view in enumerate(views):
+        # spread the views evenly around the center
+        view.rotate_y(2 * math.pi * i / len(views))
+        view.eye = center - distance * view.look_dir
+
+    start = timeit.default_timer()
+    renderer.repaint()
+    first_frame = timeit.default_timer() - start
+
+    # the latencies of the frames drawn, and of those skipped since nothing
+    # had changed
+    latencies = []
+    idle_latencies = []
+    profiler.enabled = True
+    for _ in PATHS[case['path']](views, center, distance, case['frames']):
+        profiler.begin_frame()
+        start = timeit.default_timer()
+        if kinematics is not None:
+            profiler.mark()
+            kinematics.step(1 / 60)
+            profiler.lap('simulate')
+        drawn = any(renderer.repaint())
+        elapsed = timeit.default_timer() - start
+        (latencies if drawn else idle_latencies).append(elapsed)
+        profiler.end_frame()
+    latencies = np.array(latencies) * 1000
+
+    result = dict(case)
+    result.update({
+        'models': len(models),
+        'edges': sum(obj.num_edges for obj in models),
+        'first_frame_ms': first_frame * 1000,
+        'frames_drawn': len(latencies),
+        # only over the frames drawn, if any
+        'fps': len(latencies) / (latencies.sum() / 1000)
+               if latencies.sum() else None,
+        'latency_ms': dict(zip(('p50', 'p90', 'p99', 'max'),
+                               np.percentile(latencies, [50, 90, 99, 100])
+                               .tolist()))
+                      if len(latencies) else None,
+        'idle_frame_ms': np.median(idle_latencies) * 1000
+                         if idle_latencies else None,
+        'stages_p50_ms': dict(
+            (stage, stats['p50']) for stage, stats in
+            profiler.summary()['stages_ms'].iteritems()
+            if stage not in ('frame', 'interval')),
+        'peak_memory_mb': get_peak_memory(),
+    })
+    renderer.close()
+    return result
+
+
+def _run_case_in(connection, case):
+    connection.send(run_case(case))
+    connection.close()
+
+
+def run_case_in_process(case):
+    """Runs a case in a process of its own (c.f. `run_case`), which may start
+    worker processes of its own, unlike the daemonic ones of a pool.
+    """
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_run_case_in,
+                                      args=(sender, case))
+    process.start()
+    sender.close()
+    try:
+        result = receiver.recv()
+    except EOFError:
+        raise RuntimeError('the benchmark process exited with code {}'
+                           .format(process.exitcode))
+    finally:
+        process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Headless rendering benchmarks')
+    parser.add_argument('--scenes', nargs='+', choices=sorted(SCENES),
+                        default=sorted(SCENES),
+                        help='the kinds of synthetic scenes to render')
+    parser.add_argument('--sizes', nargs='+', type=int,
+                        default=[1000, 10000, 100000],
+                        help='the (approximate) numbers of edges of the \
+                        scenes')
+    parser.add_argument('--paths', nargs='+', choices=sorted(PATHS),
+                        default=sorted(PATHS),
+                        help='the camera paths to replay')
+    parser.add_argument('--frames', type=int, default=100,
+                        help='the number of frames of each camera path')
+    parser.add_argument('--viewport', choices=sorted(VIEWPORTS),
+                        default='perspective')
+    parser.add_argument('--width', type=int, default=800)
+    parser.add_argument('--height', type=int, default=600)
+    parser.add_argument('--bvh', action='store_true',
+                        help='whether to put the models in a Scene')
+    parser.add_argument('--depth-test', action='store_true',
+                        help='whether to draw with a depth buffer')
+    parser.add_argument('--views', type=int, default=1,
+                        help='the number of views of the scene, which split \
+                        the surface into a grid and share a single \
+                        world-space pass (c.f. MultiViewRenderer)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='the number of processes drawing each frame')
+    parser.add_argument('--moving', type=float, default=0,
+                        help='the fraction of the models moving and \
+                        spinning at random velocities, which are stepped \
+                        every frame (c.f. Kinematics)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=str, default=None,
+                        help='the file to write the results to. Default is \
+                        the standard output.')
+    parser.add_argument('--log-level', type=int, default=logging.INFO)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level)
+
+    options = dict((name, getattr(args, name))
+                   for name in ('frames', 'viewport', 'width', 'height', 'bvh',
+                                'depth_test', 'views', 'workers', 'moving',
+                                'seed'))
+    cases = []
+    for scene in args.scenes:
+        for size in args.sizes:
+            for path in args.paths:
+                case = dict(options, scene=scene, size=size, path=path)
+                cases.append(case)
+
+    # a new process for every case, so that the peak memory usage is its own
+    results = []
+    for case in cases:
+        result = run_case_in_process(case)
+        if result['latency_ms'] is None:
+            logging.info('{scene} {size} {path}: no frame drawn, idle '
+                         '{idle_frame_ms:.3f} ms'.format(**result))
+        else:
+            logging.info('{scene} {size} {path}: p50 {latency_ms[p50]:.2f} '
+                         'ms, p99 {latency_ms[p99]:.2f} ms'.format(**result))
+        results.append(result)
+
+    report = {
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pygame': pygame.version.ver,
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
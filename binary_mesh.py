@@ -0,0 +1,145 @@
+'''
+ reads and writes wireframe meshes in a compact binary format, which is
+ memory-mapped when read instead of being parsed
+ a file consists of a 32-byte header followed by three little-endian arrays:
+ header: magic b'WIREMESH', format version (uint32), vertex type (uint32,
+         0 for float32 and 1 for float64), number of vertices V (uint64),
+         number of edges N (uint64)
+ vertices: V x 3 float32 or float64
+ edge indices: N x 2 uint32
+ colors: N uint32 (0xRRGGBB)
+'''
+import argparse
+import numpy as np
+import os
+import struct
+
+from three_d.model import IndexedModel
+from shape_reader import ShapeReader
+
+MAGIC = b'WIREMESH'
+VERSION = 1
+HEADER = struct.Struct('<8sIIQQ')
+
+VERTEX_DTYPE = np.dtype('<f4')
+# the vertex types, by their code in the header
+VERTEX_DTYPES = (VERTEX_DTYPE, np.dtype('<f8'))
+INDEX_DTYPE = np.dtype('<u4')
+COLOR_DTYPE = np.dtype('<u4')
+
+# the number of rows converted at a time while writing
+CHUNK_SIZE = 1 << 20
+
+def is_binary_mesh(filename):
+    """Tells whether a file starts like a binary mesh file.
+    """
+    with open(filename, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def write_binary_mesh(filename, wireframe, vertex_dtype=VERTEX_DTYPE):
+    """Writes the vertices, edges, and colors of a wireframe (but not the
+    position or scale of a model) to a binary mesh file.
+
+    Parameters
+    ----------
+    filename : str
+    wireframe : Wireframe
+    vertex_dtype : dtype, optional
+        the type the vertices are stored as, one of `VERTEX_DTYPES`. Default
+        is float32, which halves the size of the file; float64 keeps the
+        vertices exactly as they are.
+    """
+    vertex_dtype = np.dtype(vertex_dtype).newbyteorder('<')
+    if vertex_dtype not in VERTEX_DTYPES:
+        raise ValueError('unsupported vertex type for a binary mesh: {}'
+                         .format(vertex_dtype))
+    vertices = wireframe.vertices
+    edge_indices = wireframe.edge_indices
+    if len(vertices) > np.iinfo(INDEX_DTYPE).max:
+        raise ValueError('too many vertices for a binary mesh: {}'
+                         .format(len(vertices)))
+    with open(filename, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION,
+                            VERTEX_DTYPES.index(vertex_dtype), len(vertices),
+                            len(edge_indices)))
+        for array, dtype in ((vertices, vertex_dtype),
+                             (edge_indices, INDEX_DTYPE),
+                             (wireframe.colors, COLOR_DTYPE)):
+            for i in xrange(0, len(array), CHUNK_SIZE):
+                f.write(np.ascontiguousarray(array[i:i + CHUNK_SIZE],
+                                             dtype=dtype).tobytes())
+
+
+def read_binary_mesh(filename):
+    """Memory-maps a binary mesh file as a model at the origin, without
+    reading or copying its arrays. The mapping is copy-on-write, so that the
+    model can be changed in memory without changing the file.
+
+    Parameters
+    ----------
+    filename : str
+
+    Returns
+    -------
+    IndexedModel
+    """
+    with open(filename, 'rb') as f:
+        header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise ValueError('{} is too short to be a binary mesh'
+                         .format(filename))
+    magic, version, vertex_type, num_vertices, num_edges = \
+        HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ValueError('{} is not a binary mesh'.format(filename))
+    if version != VERSION:
+        raise ValueError('{} has unsupported binary mesh version {}'
+                         .format(filename, version))
+    if vertex_type >= len(VERTEX_DTYPES):
+        raise ValueError('{} has unsupported vertex type {}'
+                         .format(filename, vertex_type))
+    vertex_dtype = VERTEX_DTYPES[vertex_type]
+
+    def map_array(offset, dtype, shape):
+        if not shape[0]:
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(filename, dtype=dtype, mode='c', offset=offset,
+                         shape=shape)
+
+    vertex_offset = HEADER.size
+    index_offset = vertex_offset + num_vertices * 3 * vertex_dtype.itemsize
+    color_offset = index_offset + num_edges * 2 * INDEX_DTYPE.itemsize
+    if os.path.getsize(filename) < color_offset \
+                                   + num_edges * COLOR_DTYPE.itemsize:
+        raise ValueError('{} is truncated'.format(filename))
+    return IndexedModel(np.array([0, 0, 0]),
+                        vertices=map_array(vertex_offset, vertex_dtype,
+                                           (num_vertices, 3)),
+                        edge_indices=map_array(index_offset, INDEX_DTYPE,
+                                               (num_edges, 2)),
+                        colors=map_array(color_offset, COLOR_DTYPE,
+                                         (num_edges,)),
+                        copy=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Converts a text edge file to a binary mesh file')
+    parser.add_argument('input_file', type=str,
+                        help='the text file to convert')
+    parser.add_argument('output_file', type=str,
+                        help='the binary mesh file to write')
+    parser.add_argument('--double', action='store_true',
+                        help='store the vertices as float64 instead of '
+                             'float32')
+    args = parser.parse_args()
+
+    write_binary_mesh(args.output_file,
+                      ShapeReader(args.input_file).process_file(),
+                      vertex_dtype=VERTEX_DTYPES[1] if args.double
+                                   else VERTEX_DTYPE)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,14 +9,19 @@ class Game(object):
     ----------
     view : Viewport
     models : iterable of Model, optional
+    kinematics : Kinematics, optional
+        The simulation moving some of the models, which is stepped every
+        frame. Default is none.
 
     Attributes
     ----------
     view : Viewport
+    kinematics : Kinematics or None
     """
-    def __init__(self, view, models=None):
+    def __init__(self, view, models=None, kinematics=None):
         self.view = view
         self.view.models.extend(models or [])
+        self.kinematics = kinematics
 
         self.is_moving_forward = False
         self.is_moving_backward = False
@@ -26,7 +31,26 @@ class Game(object):
         self.move_distance = 2
         self.rotation_scale_factor = 0.003
 
-    def tick(self):
+    def tick(self, dt=1 / 60.0):
+        """Advances the game by a frame.
+
+        Parameters
+        ----------
+        dt : float, optional
+            The time since the last frame in seconds, by which the models are
+            moved. Default is 1/60 s.
+
+        Returns
+        -------
+        bool
+            whether the view has been repainted
+        """
+        if self.kinematics is not None:
+            profiler = self.view.profiler
+            profiler.mark()
+            self.kinematics.step(dt)
+            profiler.lap('simulate')
+
         # movement
         move_dir = np.zeros(3)
         if self.is_moving_forward:
@@ -43,7 +67,7 @@ class Game(object):
                 or self.is_moving_left or self.is_moving_right):
             move_dir /= dir_length
             self.view.translate(self.move_distance * move_dir)
-        self.view.repaint()
+        return self.view.repaint()
 
     def move_camera(self, dx, dy):
         theta_x = -dy * self.rotation_scale_factor
@@ -10,8 +10,11 @@ import sys
 from game import Game
 from three_d.cameras.orthographic import OrthographicViewport
 from three_d.cameras.perspective import PerspectiveViewport
+from three_d.kinematics import Kinematics
+from three_d.profiling import FrameProfiler
+from mesh_cache import MeshCache
+from model_loader import expand_paths, load_models
 from shapes import Cube
-from shape_reader import ShapeReader
 
 def get_random_color():
     def random_intensity():
@@ -42,11 +45,38 @@ default_playground = [Cube(np.array([-100, -100, 100]), side=50,
 # default_playground = [Cube(np.array([0, 0, 200]), side=55,
 #                            color=get_random_color())]
 
+def get_moving_cubes(count):
+    """Creates cubes scattered in front of the eye, moving and spinning at
+    random velocities.
+
+    Returns
+    -------
+    cubes : list of Cube
+    kinematics : Kinematics
+        the simulation moving the cubes
+    """
+    kinematics = Kinematics()
+    cubes = []
+    for _ in xrange(count):
+        position = np.array([random.uniform(-1000, 1000),
+                             random.uniform(-1000, 1000),
+                             random.uniform(200, 2000)])
+        cube = Cube(position, side=random.uniform(5, 30),
+                    color=get_random_color())
+        cubes.append(cube)
+        kinematics.add(cube, np.random.normal(0, 50, 3),
+                       np.random.normal(0, 1, 3))
+    return cubes, kinematics
+
 
 def main():
     parser = argparse.ArgumentParser(description='Wireframe visualizer')
-    parser.add_argument('--show-fps', nargs=None, type=bool, default=False,
-                        help='whether to display an fps counter')
+    parser.add_argument('--show-fps', action='store_true',
+                        help='whether to display the frame rate and the time \
+                        spent in each stage of a frame')
+    parser.add_argument('--profile', type=str, default=None,
+                        help='the file to write the frame timings to (as \
+                        JSON) on exit')
     parser.add_argument('--fps', type=int, default=60,
                         help='the framerate of the game')
     parser.add_argument('--fov', type=int, default=70,
@@ -55,29 +85,65 @@ def main():
     parser.add_argument('--log-level', type=int, default=logging.INFO,
                         help='a value in [0, 50] in increments of 10, where 0 \
                         is for all messages, and 50 for only critical errors')
-    parser.add_argument('--input-file', '--input', type=str, default=None,
-                        help='the name of the file containing a description of \
-                        the meshes to draw')
+    parser.add_argument('--input-file', '--input', type=str, nargs='+',
+                        default=None, dest='input_files',
+                        help='the names (or glob patterns) of the files \
+                        containing descriptions of the meshes to draw, as \
+                        text, binary meshes, PLY files, or OBJ files; each \
+                        file is a model')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='the number of processes parsing input files \
+                        (default: the number of CPUs)')
+    parser.add_argument('--render-workers', type=int, default=1,
+                        help='the number of processes drawing each frame \
+                        (default: 1, which draws in the main process)')
+    parser.add_argument('--cache-dir', type=str, default=None,
+                        help='the directory of the cache of parsed meshes \
+                        (default: ~/.cache/wireframes)')
+    parser.add_argument('--cache-size', type=int, default=1024,
+                        help='the most megabytes the cache of parsed meshes \
+                        may take up')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='whether to parse the input file without using \
+                        the cache of parsed meshes')
+    parser.add_argument('--moving-cubes', type=int, default=0,
+                        help='the number of randomly moving cubes to add to \
+                        the scene')
     args = parser.parse_args()
 
-    if args.input_file is None:
+    logging.basicConfig(level=args.log_level)
+
+    if args.input_files is None:
         playground = default_playground
     else:
-        playground = [ShapeReader(args.input_file).process_file()]
+        cache = None
+        if not args.no_cache:
+            cache = MeshCache(args.cache_dir, max_size=args.cache_size << 20)
+        models, errors = load_models(expand_paths(args.input_files),
+                                     cache=cache, processes=args.jobs)
+        for filename, message in errors:
+            logging.error('Could not load {}: {}'.format(filename, message))
+        playground = [model for model in models if model is not None]
+        if not playground:
+            parser.error('none of the input files could be loaded')
 
     fps = args.fps
     show_fps = args.show_fps
 
-    logging.basicConfig(level=args.log_level)
-
     pygame.init()
 
     pygame.display.set_mode((800, 600))
 
     main_surface = pygame.display.get_surface()
-    gameview = PerspectiveViewport(main_surface)
+    profiler = FrameProfiler(enabled=show_fps or args.profile is not None)
+    gameview = PerspectiveViewport(main_surface, profiler=profiler,
+                                   workers=args.render_workers)
 
-    game = Game(gameview, models=playground)
+    kinematics = None
+    if args.moving_cubes:
+        cubes, kinematics = get_moving_cubes(args.moving_cubes)
+        playground = list(playground) + cubes
+    game = Game(gameview, models=playground, kinematics=kinematics)
 
     pygame.display.flip()
 
@@ -86,18 +152,27 @@ def main():
 
     logging.info('Initializing fonts...')
     if show_fps:
-        fps_font = pygame.font.SysFont(None, 10)
+        fps_font = pygame.font.SysFont(None, 18)
 
+    overlay_area = None
     is_mouse_focused = True
     pygame.event.set_grab(True)
     pygame.mouse.set_visible(False)
 
     logging.info('Entering main game loop...')
     while True:
+        # whether the window needs to be redrawn even if the view has not
+        # changed
+        is_exposed = False
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 logging.info('Received QUIT event.')
+                if args.profile is not None:
+                    profiler.dump(args.profile)
+                gameview.close()
                 sys.exit()
+            elif event.type == pygame.VIDEOEXPOSE:
+                is_exposed = True
             elif event.type == pygame.MOUSEMOTION:
                 game.move_camera(*pygame.mouse.get_rel())
             elif event.type == pygame.KEYDOWN:
@@ -128,13 +203,33 @@ def main():
                     pass
             else:
                 pass
-        fps_clock.tick(fps)
-        game.tick()
-        pygame.display.update()
+        dt = fps_clock.tick(fps) / 1000.0
+        profiler.begin_frame()
+        is_repainted = game.tick(dt)
+        covered = None
         if show_fps:
-            fps_text = fps_font.render(fps_clock.get_fps(), False,
-                                       (255, 0, 0))
-            main_surface.blit(fps_text, (0, 0))
+            profiler.mark()
+            overlay = profiler.render_overlay(fps_font)
+            area = overlay.get_rect().clip(main_surface.get_rect())
+            # the display still shows the overlay of the last frame
+            dirty_area = area.union(overlay_area or area)
+            overlay_area = area
+            # the overlay is taken off again after the display update, so
+            # that the surface keeps the last frame for when it is not
+            # repainted
+            covered = main_surface.subsurface(area).copy()
+            main_surface.blit(overlay, area)
+            profiler.lap('overlay')
+        profiler.mark()
+        # the display keeps the last frame while nothing changes
+        if is_repainted or is_exposed:
+            pygame.display.update()
+        elif covered is not None:
+            pygame.display.update(dirty_area)
+        profiler.lap('display')
+        if covered is not None:
+            main_surface.blit(covered, area)
+        profiler.end_frame()
 
     sys.exit()
 
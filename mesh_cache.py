@@ -0,0 +1,270 @@
+'''
+ caches parsed meshes on disk as binary meshes (c.f. `binary_mesh`), so that
+ a mesh file which has not changed since it was last loaded is memory-mapped
+ instead of being parsed again
+ each entry consists of a binary mesh file and a JSON file describing the
+ source file it was parsed from: its path, size, modification time, and the
+ CRC-32 checksum of its contents, all of which must match for the entry to be
+ used
+ the least recently used entries are evicted once the cache outgrows its size
+ cap; entries which do not match or cannot be read are replaced by parsing the
+ source file again
+'''
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import zlib
+
+import numpy as np
+
+from binary_mesh import read_binary_mesh, write_binary_mesh
+
+# bump this whenever the parsers change what they make of a file
+CACHE_VERSION = 2
+
+DEFAULT_MAX_SIZE = 1 << 30
+
+# the number of bytes read at a time while checksumming
+CHECKSUM_CHUNK_SIZE = 1 << 20
+
+MESH_SUFFIX = '.wfm'
+INFO_SUFFIX = '.json'
+
+def default_cache_directory():
+    """The directory of the cache, in the user's cache directory.
+    """
+    cache_home = os.environ.get('XDG_CACHE_HOME') \
+                 or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'wireframes')
+
+
+def checksum_file(filename):
+    """The CRC-32 checksum of the contents of a file. It only has to tell
+    apart versions of a file of the same size and modification time, and is
+    many times faster to compute than a cryptographic hash.
+    """
+    checksum = 0
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHECKSUM_CHUNK_SIZE), b''):
+            checksum = zlib.crc32(chunk, checksum)
+    return checksum & 0xFFFFFFFF
+
+
+class MeshCache(object):
+    """A directory of parsed meshes.
+
+    Parameters
+    ----------
+    directory : str, optional
+        Default is `default_cache_directory()`.
+    max_size : int, optional
+        the most bytes the entries may take up. Default is 1 GiB.
+    """
+    def __init__(self, directory=None, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory or default_cache_directory()
+        self.max_size = max_size
+
+    def _entry_path(self, source_path):
+        name = hashlib.sha1(source_path.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name)
+
+    def describe(self, filename):
+        """Describes a source file as its cache entry must.
+
+        Returns
+        -------
+        dict
+            the path, size, modification time, and checksum of the file
+        """
+        source_path = os.path.abspath(filename)
+        stat = os.stat(source_path)
+        # as it reads back from the JSON file of an entry
+        return json.loads(json.dumps({'version': CACHE_VERSION,
+                                      'path': source_path,
+                                      'size': stat.st_size,
+                                      'mtime': stat.st_mtime,
+                                      'crc32': checksum_file(source_path)}))
+
+    def get(self, filename, description=None):
+        """Looks up the mesh of a source file.
+
+        Parameters
+        ----------
+        filename : str
+        description : dict, optional
+            the description of the file, if already known (c.f. `describe`)
+
+        Returns
+        -------
+        IndexedModel
+            the cached model, memory-mapped, or `None` if there is no valid
+            entry for the file as it is now
+        """
+        description = description or self.describe(filename)
+        model = self._read(self._entry_path(description['path']),
+                           description)
+        if model is not None:
+            logging.info('Loaded {} from the mesh cache'.format(filename))
+        return model
+
+    def put(self, filename, model, description=None):
+        """Adds the mesh of a source file, unless it cannot be written.
+
+        Parameters
+        ----------
+        filename : str
+        model : Wireframe
+            the mesh parsed from the file
+        description : dict, optional
+            the description of the file when it was parsed, if known (c.f.
+            `describe`)
+        """
+        description = description or self.describe(filename)
+        try:
+            self._write(self._entry_path(description['path']), description,
+                        model)
+        except (EnvironmentError, ValueError) as e:
+            logging.warning('Could not cache {}: {}'.format(filename, e))
+
+    def load(self, filename, parse):
+        """Loads a mesh from the cache, or parses it and adds it to the cache
+        if it is missing, stale, or unreadable.
+
+        Parameters
+        ----------
+        filename : str
+            the source file
+        parse : callable
+            parses the source file into a wireframe, given its name
+
+        Returns
+        -------
+        Wireframe
+            the cached model, memory-mapped, or the parsed one
+        """
+        description = self.describe(filename)
+        model = self.get(filename, description)
+        if model is None:
+            model = parse(filename)
+            self.put(filename, model, description)
+        return model
+
+    def _read(self, entry, description):
+        """Reads an entry, and marks it as the most recently used one.
+
+        Returns
+        -------
+        IndexedModel
+            the model, or `None` if the entry is missing, describes another
+            source file, or is corrupt
+        """
+        if not os.path.exists(entry + INFO_SUFFIX):
+            return None
+        try:
+            with open(entry + INFO_SUFFIX, 'r') as f:
+                info = json.load(f)
+            if info.get('source') != description \
+                    or os.path.getsize(entry + MESH_SUFFIX) != info['bytes']:
+                return None
+            model = read_binary_mesh(entry + MESH_SUFFIX)
+            os.utime(entry + INFO_SUFFIX, None)
+        except (EnvironmentError, ValueError, KeyError, TypeError) as e:
+            logging.warning('Ignoring corrupt mesh cache entry {}: {}'
+                            .format(entry, e))
+            return None
+        return model
+
+    def _write(self, entry, description, model):
+        """Writes an entry, replacing any previous one, then evicts the least
+        recently used entries while the cache is over its size cap.
+        """
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        # write to temporary files first, so that neither other processes
+        # nor a crash ever leave a partly written entry behind
+        fd, mesh_file = tempfile.mkstemp(suffix=MESH_SUFFIX,
+                                         dir=self.directory)
+        os.close(fd)
+        info_file = None
+        try:
+            # in double precision, so that a model read from the cache is the
+            # same as the one parsed
+            write_binary_mesh(mesh_file, model, vertex_dtype=np.float64)
+            size = os.path.getsize(mesh_file)
+            if size > self.max_size:
+                return
+            fd, info_file = tempfile.mkstemp(suffix=INFO_SUFFIX,
+                                             dir=self.directory)
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'source': description, 'bytes': size}, f)
+            # the description of the old mesh goes first, so that it never
+            # describes the new one
+            self.remove(entry)
+            os.rename(mesh_file, entry + MESH_SUFFIX)
+            os.rename(info_file, entry + INFO_SUFFIX)
+        finally:
+            for temporary_file in (mesh_file, info_file):
+                if temporary_file is not None \
+                        and os.path.exists(temporary_file):
+                    os.remove(temporary_file)
+        self.evict(keep=entry)
+
+    def entries(self):
+        """Lists the entries of the cache.
+
+        Returns
+        -------
+        list of tuple
+            the path (without suffix), time of last use, and size in bytes of
+            each entry, from the least to the most recently used one
+        """
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for name in os.listdir(self.directory):
+            if not name.endswith(INFO_SUFFIX):
+                continue
+            entry = os.path.join(self.directory, name[:-len(INFO_SUFFIX)])
+            try:
+                last_use = os.path.getmtime(entry + INFO_SUFFIX)
+                size = os.path.getsize(entry + INFO_SUFFIX)
+                if os.path.exists(entry + MESH_SUFFIX):
+                    size += os.path.getsize(entry + MESH_SUFFIX)
+            except EnvironmentError:
+                # removed by another process meanwhile
+                continue
+            entries.append((entry, last_use, size))
+        entries.sort(key=lambda entry: entry[1])
+        return entries
+
+    def evict(self, keep=None):
+        """Removes the least recently used entries until the cache fits in
+        its size cap.
+
+        Parameters
+        ----------
+        keep : str, optional
+            an entry not to remove
+        """
+        entries = self.entries()
+        total_size = sum(size for _, _, size in entries)
+        for entry, _, size in entries:
+            if total_size <= self.max_size:
+                break
+            if entry == keep:
+                continue
+            self.remove(entry)
+            total_size -= size
+
+    def remove(self, entry):
+        for suffix in (INFO_SUFFIX, MESH_SUFFIX):
+            try:
+                os.remove(entry + suffix)
+            except EnvironmentError:
+                pass
+
+    def clear(self):
+        for entry, _, _ in self.entries():
+            self.remove(entry)
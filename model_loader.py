@@ -0,0 +1,183 @@
+'''
+ loads models from mesh files of any supported format, which is detected
+ from the contents of each file (or, for OBJ files, from its extension),
+ possibly through a cache of parsed meshes (c.f. `mesh_cache`)
+ many files are parsed in parallel by a pool of processes, which send back
+ the arrays of the models rather than the models themselves
+'''
+from itertools import izip
+import glob
+import multiprocessing
+import numpy as np
+import os
+
+from binary_mesh import INDEX_DTYPE, is_binary_mesh, read_binary_mesh
+from three_d.model import IndexedModel
+from obj_reader import ObjReader
+from ply_reader import PlyReader
+from shape_reader import ShapeReader
+
+def is_ply_file(filename):
+    """Tells whether a file starts like a PLY file.
+    """
+    with open(filename, 'rb') as f:
+        return f.readline(16).strip() == b'ply'
+
+
+def parse_model(filename):
+    """Parses a model from a PLY file (c.f. `PlyReader`), an OBJ file (c.f.
+    `ObjReader`), or a text edge file (c.f. `ShapeReader`).
+
+    Parameters
+    ----------
+    filename : str
+
+    Returns
+    -------
+    IndexedModel
+    """
+    if is_ply_file(filename):
+        return PlyReader(filename).process_file()
+    if os.path.splitext(filename)[1].lower() == '.obj':
+        return ObjReader(filename).process_file()
+    return ShapeReader(filename).process_file()
+
+
+def load_model(filename, cache=None):
+    """Loads a model from a binary mesh file (c.f. `binary_mesh`), which is
+    memory-mapped, or from any file `parse_model` can parse.
+
+    Parameters
+    ----------
+    filename : str
+    cache : MeshCache, optional
+        the cache of parsed meshes to use, if any
+
+    Returns
+    -------
+    IndexedModel
+    """
+    if is_binary_mesh(filename):
+        return read_binary_mesh(filename)
+    if cache is not None:
+        return cache.load(filename, parse_model)
+    return parse_model(filename)
+
+
+def expand_paths(patterns):
+    """Expands glob patterns into the files they match, in sorted order.
+
+    Parameters
+    ----------
+    patterns : iterable of str
+        file names or glob patterns
+
+    Returns
+    -------
+    list of str
+        the files matched by each pattern in turn (or the pattern itself, if
+        it matches none, so that loading it reports the missing file), each
+        only once
+    """
+    paths = []
+    seen = set()
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            if path not in seen:
+                seen.add(path)
+                paths.append(path)
+    return paths
+
+
+def parse_arrays(filename):
+    """Parses a model into compact arrays, to be sent from a worker process.
+
+    Returns
+    -------
+    arrays : tuple of numpy array
+        the vertices, edge indices (as `uint32`, if they fit), and colors of
+        the model, or `None` if it could not be parsed
+    error : str
+        why the model could not be parsed, or `None`
+    """
+    try:
+        model = parse_model(filename)
+    except Exception as e:
+        return None, '{}: {}'.format(type(e).__name__, e)
+    edge_indices = model.edge_indices
+    if len(model.vertices) <= np.iinfo(INDEX_DTYPE).max:
+        edge_indices = edge_indices.astype(INDEX_DTYPE)
+    return (model.vertices, edge_indices, model.colors), None
+
+
+def load_models(filenames, cache=None, processes=None):
+    """Loads a model from each of many files, parsing them in parallel. Binary
+    meshes and cached meshes are memory-mapped by this process; the other
+    files are parsed by a pool of processes (c.f. `parse_model`).
+
+    Parameters
+    ----------
+    filenames : iterable of str
+    cache : MeshCache, optional
+        the cache of parsed meshes to use, if any
+    processes : int, optional
+        the number of processes parsing files. Default is the number of CPUs.
+
+    Returns
+    -------
+    models : list of IndexedModel
+        the model of each file, in the order of `filenames`, with `None` for
+        the files that could not be loaded
+    errors : list of tuple
+        the name of each file that could not be loaded and why, in the order
+        of `filenames`
+    """
+    filenames = list(filenames)
+    models = [None] * len(filenames)
+    messages = [None] * len(filenames)
+    descriptions = {}
+    unparsed = []
+    for i, filename in enumerate(filenames):
+        try:
+            if is_binary_mesh(filename):
+                models[i] = read_binary_mesh(filename)
+                continue
+            if cache is not None:
+                descriptions[i] = cache.describe(filename)
+                models[i] = cache.get(filename, descriptions[i])
+        except (EnvironmentError, ValueError) as e:
+            messages[i] = '{}: {}'.format(type(e).__name__, e)
+            continue
+        if models[i] is None:
+            unparsed.append(i)
+
+    names = [filenames[i] for i in unparsed]
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    pool = None
+    if min(processes, len(names)) > 1:
+        pool = multiprocessing.Pool(min(processes, len(names)))
+        results = pool.imap(parse_arrays, names)
+    else:
+        results = (parse_arrays(name) for name in names)
+    try:
+        # the models are made (and cached) while the next files are parsed
+        for i, (arrays, message) in izip(unparsed, results):
+            if message is not None:
+                messages[i] = message
+                continue
+            vertices, edge_indices, colors = arrays
+            models[i] = IndexedModel(np.array([0, 0, 0]), vertices=vertices,
+                                     edge_indices=edge_indices,
+                                     colors=colors, copy=False)
+            if cache is not None:
+                cache.put(filenames[i], models[i], descriptions[i])
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    errors = [(filename, message)
+              for filename, message in izip(filenames, messages)
+              if message is not None]
+    return models, errors
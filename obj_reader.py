@@ -0,0 +1,106 @@
+'''
+ reads in a Wavefront OBJ file
+ returns its faces and polylines as an IndexedModel with one edge per pair of
+ adjacent vertices, however many faces share it
+ only the vertex positions ('v'), faces ('f'), and polylines ('l') are used;
+ texture coordinates, normals, groups, and materials are ignored
+ the whole file is split into tokens at once with numpy, and the tokens of
+ each kind of line are converted at once
+'''
+import numpy as np
+
+from three_d.mesh import polygon_edges, unique_edges
+from three_d.model import IndexedModel
+from shape_reader import DEFAULT_COLOR, parse_floats
+
+# the characters separating the tokens of a line, as for `str.split`
+_SEPARATORS = np.zeros(256, dtype=bool)
+_SEPARATORS[np.frombuffer(b' \t\n\r\x0b\x0c', dtype=np.uint8)] = True
+
+class ObjReader(object):
+
+    def __init__(self, obj_file, color=DEFAULT_COLOR):
+        self.obj_file = obj_file
+        self.color = color
+
+    def process_file(self):
+        with open(self.obj_file, 'rb') as f:
+            buf = np.frombuffer(f.read(), dtype=np.uint8)
+        # the tokens, and the line and the keyword of the line of each
+        changes = np.diff(np.concatenate(([False], ~_SEPARATORS[buf],
+                                          [False])).astype(np.int8))
+        token_starts = np.flatnonzero(changes == 1)
+        token_ends = np.flatnonzero(changes == -1)
+        lines = np.searchsorted(np.flatnonzero(buf == ord('\n')),
+                                token_starts)
+        first = np.ones(len(token_starts), dtype=bool)
+        first[1:] = lines[1:] != lines[:-1]
+        # the number of tokens before each one on its line
+        line_firsts = np.flatnonzero(first)
+        places = np.arange(len(token_starts)) \
+                 - line_firsts[np.cumsum(first) - 1]
+        keywords = np.where(token_ends - token_starts == 1,
+                            buf[np.minimum(token_starts, len(buf) - 1)], 0)
+        kinds = keywords[line_firsts][np.cumsum(first) - 1]
+
+        is_vertex = kinds == ord('v')
+        vertex_lines = lines[line_firsts[keywords[line_firsts] == ord('v')]]
+        coords = np.flatnonzero(is_vertex & (places >= 1) & (places <= 3))
+        if len(coords) != 3 * len(vertex_lines):
+            raise ValueError('{} has a vertex without three coordinates'
+                             .format(self.obj_file))
+        vertices, valid = parse_floats(buf, token_starts[coords],
+                                       token_ends[coords])
+        if not valid.all():
+            raise ValueError('{} has a vertex coordinate that is not a '
+                             'number'.format(self.obj_file))
+        vertices = vertices.reshape((-1, 3))
+
+        # a reference is v, v/vt, v//vn, or v/vt/vn
+        slashes = np.flatnonzero(buf == ord('/'))
+        edge_indices = [np.empty((0, 2), dtype=np.intp)]
+        for kind, closed in (('f', True), ('l', False)):
+            refs = np.flatnonzero((kinds == ord(kind)) & (places >= 1))
+            if not len(refs):
+                continue
+            ref_starts = token_starts[refs]
+            ref_ends = token_ends[refs]
+            if len(slashes):
+                next_slashes = slashes[np.minimum(
+                    np.searchsorted(slashes, ref_starts), len(slashes) - 1)]
+                ref_ends = np.where((next_slashes >= ref_starts)
+                                    & (next_slashes < ref_ends),
+                                    next_slashes, ref_ends)
+            indices, valid = parse_floats(buf, ref_starts, ref_ends)
+            if not (valid & (ref_ends > ref_starts)
+                    & (indices == np.round(indices))).all():
+                raise ValueError('{} has a vertex reference that is not an '
+                                 'integer'.format(self.obj_file))
+            # the polygons, in the order of their lines
+            ref_lines = lines[refs]
+            polygon_firsts = np.flatnonzero(np.concatenate(
+                ([True], ref_lines[1:] != ref_lines[:-1])))
+            sizes = np.diff(np.append(polygon_firsts, len(refs)))
+            bases = np.searchsorted(vertex_lines, ref_lines[polygon_firsts])
+            edge_indices.append(polygon_edges(
+                self._resolve(indices.astype(np.intp), bases, sizes),
+                sizes, closed=closed))
+
+        edge_indices = np.concatenate(edge_indices)
+        if len(edge_indices) and (edge_indices.min() < 0
+                                  or edge_indices.max() >= len(vertices)):
+            raise ValueError('{} refers to a vertex that does not exist'
+                             .format(self.obj_file))
+        edge_indices = edge_indices[unique_edges(edge_indices)]
+        return IndexedModel(np.array([0, 0, 0]), vertices=vertices,
+                            edge_indices=edge_indices, colors=self.color)
+
+    @staticmethod
+    def _resolve(refs, bases, sizes):
+        """Turns the 1-based (or, if negative, relative to the vertices read
+        so far) vertex references into indices.
+        """
+        indices = np.asarray(refs, dtype=np.intp)
+        bases = np.repeat(np.asarray(bases, dtype=np.intp),
+                          np.asarray(sizes, dtype=np.intp))
+        return np.where(indices < 0, bases + indices, indices - 1)
@@ -0,0 +1,477 @@
+'''
+ reads in a PLY file, in ASCII or binary (either byte order)
+ returns its faces and edges as an IndexedModel with one edge per pair of
+ adjacent vertices, however many faces share it
+ the vertices are the x, y, and z properties of the 'vertex' element, the
+ faces the 'vertex_indices' (or 'vertex_index') lists of the 'face' element,
+ and the edges the 'vertex1' and 'vertex2' properties of the 'edge' element;
+ edges are colored by the red, green, and blue properties of the edges or,
+ failing that, by the mean colors of their vertices
+'''
+import numpy as np
+
+from three_d.mesh import polygon_edges, unique_edges
+from three_d.model import IndexedModel
+from shape_reader import DEFAULT_COLOR
+
+PLY_TYPES = {'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1',
+             'short': 'i2', 'int16': 'i2', 'ushort': 'u2', 'uint16': 'u2',
+             'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+             'float': 'f4', 'float32': 'f4', 'double': 'f8', 'float64': 'f8'}
+
+BYTE_ORDERS = {'binary_little_endian': '<', 'binary_big_endian': '>'}
+
+# how many positions of the data are searched for records at a time
+# (c.f. `walk_records`)
+RECORD_WINDOW = 1 << 16
+
+class PlyElement(object):
+    """An element declared in the header of a PLY file.
+
+    Parameters
+    ----------
+    name : str
+    count : int
+        the number of records
+
+    Attributes
+    ----------
+    properties : list of tuple
+        the name and type of each property, with the type being a numpy
+        type string for scalar properties, or a tuple of the types of the
+        length and the items for list properties
+    """
+    def __init__(self, name, count):
+        self.name = name
+        self.count = count
+        self.properties = []
+
+    @property
+    def has_lists(self):
+        return any(isinstance(kind, tuple) for _, kind in self.properties)
+
+
+class PlyReader(object):
+
+    def __init__(self, ply_file):
+        self.ply_file = ply_file
+
+    def read_header(self, f):
+        """Reads the header of a PLY file.
+
+        Returns
+        -------
+        data_format : str
+            'ascii', 'binary_little_endian', or 'binary_big_endian'
+        elements : list of PlyElement
+        """
+        if f.readline().strip() != b'ply':
+            raise ValueError('{} is not a PLY file'.format(self.ply_file))
+        data_format = None
+        elements = []
+        for line in iter(f.readline, b''):
+            tokens = line.split()
+            if not tokens or tokens[0] in (b'comment', b'obj_info'):
+                continue
+            if tokens[0] == b'end_header':
+                break
+            if tokens[0] == b'format':
+                data_format = tokens[1]
+            elif tokens[0] == b'element':
+                elements.append(PlyElement(tokens[1], int(tokens[2])))
+            elif tokens[0] == b'property' and tokens[1] == b'list':
+                elements[-1].properties.append(
+                    (tokens[4], (PLY_TYPES[tokens[2]], PLY_TYPES[tokens[3]])))
+            elif tokens[0] == b'property':
+                elements[-1].properties.append((tokens[2],
+                                                PLY_TYPES[tokens[1]]))
+        else:
+            raise ValueError('{} has no end of header'.format(self.ply_file))
+        if data_format != 'ascii' and data_format not in BYTE_ORDERS:
+            raise ValueError('{} has unknown format {}'
+                             .format(self.ply_file, data_format))
+        return data_format, elements
+
+    def read_elements(self):
+        """Reads all elements of the file.
+
+        Returns
+        -------
+        dict of str to dict
+            the values of each property of each element, by name: an array
+            for scalar properties, and a tuple of the array of the lengths
+            and the concatenated items for list properties
+        """
+        with open(self.ply_file, 'rb') as f:
+            data_format, elements = self.read_header(f)
+            data = f.read()
+        if data_format == 'ascii':
+            # all values of all elements, one after another
+            data = np.fromstring(data, sep=' ')
+            read_element = read_ascii_element
+        else:
+            read_element = lambda data, offset, element: read_binary_element(
+                data, offset, element, BYTE_ORDERS[data_format])
+        offset = 0
+        values = {}
+        for element in elements:
+            values[element.name], offset = read_element(data, offset,
+                                                        element)
+        return values
+
+    def process_file(self):
+        elements = self.read_elements()
+        vertex = elements.get('vertex', {})
+        if not all(axis in vertex for axis in ('x', 'y', 'z')):
+            raise ValueError('{} has no vertex positions'
+                             .format(self.ply_file))
+        vertices = np.column_stack((vertex['x'], vertex['y'], vertex['z']))
+
+        edge_indices = [np.empty((0, 2), dtype=np.intp)]
+        colors = [np.empty(0, dtype=np.uint32)]
+        # whether each edge gets the colors of its vertices
+        from_vertices = [np.empty(0, dtype=bool)]
+        edge = elements.get('edge', {})
+        if 'vertex1' in edge and 'vertex2' in edge:
+            count = len(edge['vertex1'])
+            edge_indices.append(np.column_stack((edge['vertex1'],
+                                                 edge['vertex2'])))
+            colors.append(get_colors(edge, count))
+            from_vertices.append(np.full(count, 'red' not in edge,
+                                         dtype=bool))
+        face = elements.get('face', {})
+        face_lists = face.get('vertex_indices', face.get('vertex_index'))
+        if face_lists is not None:
+            sizes, indices = face_lists
+            face_edges = polygon_edges(indices, sizes)
+            edge_indices.append(face_edges)
+            colors.append(np.full(len(face_edges), DEFAULT_COLOR,
+                                  dtype=np.uint32))
+            from_vertices.append(np.ones(len(face_edges), dtype=bool))
+        edge_indices = np.concatenate(edge_indices).astype(np.intp)
+        if len(edge_indices) and (edge_indices.min() < 0
+                                  or edge_indices.max() >= len(vertices)):
+            raise ValueError('{} refers to a vertex that does not exist'
+                             .format(self.ply_file))
+        kept = unique_edges(edge_indices)
+        edge_indices = edge_indices[kept]
+        colors = np.concatenate(colors)[kept]
+        from_vertices = np.concatenate(from_vertices)[kept]
+
+        vertex_colors = get_colors(vertex, len(vertices), None)
+        if vertex_colors is not None and from_vertices.any():
+            # the mean colors of the vertices of each edge
+            channels = np.column_stack([vertex_colors >> shift & 0xFF
+                                        for shift in (16, 8, 0)])
+            mean = channels[edge_indices[from_vertices]].sum(axis=1) // 2
+            colors[from_vertices] = (mean[:, 0] << 16) | (mean[:, 1] << 8) \
+                                    | mean[:, 2]
+        return IndexedModel(np.array([0, 0, 0]), vertices=vertices,
+                            edge_indices=edge_indices, colors=colors)
+
+
+def get_colors(values, count, default=DEFAULT_COLOR):
+    """Packs the red, green, and blue properties of the records of an
+    element into colors. Floating-point channels are taken to be in [0, 1].
+
+    Parameters
+    ----------
+    values : dict
+        the values of the properties of the element
+    count : int
+        the number of records of the element
+    default : int, optional
+        the color of every record if the element has no colors, or `None`
+        to return `None` instead. Default is white.
+
+    Returns
+    -------
+    numpy array (of shape (count,)) of uint32
+    """
+    if not all(channel in values for channel in ('red', 'green', 'blue')):
+        if default is None:
+            return None
+        return np.full(count, default, dtype=np.uint32)
+    color = np.zeros(count, dtype=np.uint32)
+    for channel, shift in (('red', 16), ('green', 8), ('blue', 0)):
+        value = values[channel]
+        if value.dtype.kind == 'f':
+            value = np.round(value * 0xFF)
+        color |= np.clip(value, 0, 0xFF).astype(np.uint32) << shift
+    return color
+
+
+def read_binary_element(data, offset, element, byte_order):
+    """Reads the records of an element from binary data.
+
+    Returns
+    -------
+    values : dict
+        as in `PlyReader.read_elements`
+    offset : int
+        the offset of the next element in `data`
+    """
+    fields = []
+    sizes = {}
+    if element.has_lists and element.count:
+        # assume that all lists have the lengths of those of the first
+        # record, so that all records are read at once
+        position = offset
+        for i, (name, kind) in enumerate(element.properties):
+            if isinstance(kind, tuple):
+                size_type = np.dtype(byte_order + kind[0])
+                sizes[i] = int(np.frombuffer(data, size_type, 1,
+                                             position)[0])
+                position += size_type.itemsize \
+                            + sizes[i] * np.dtype(kind[1]).itemsize
+            else:
+                position += np.dtype(kind).itemsize
+    for i, (name, kind) in enumerate(element.properties):
+        if isinstance(kind, tuple):
+            fields.append(('n{}'.format(i), byte_order + kind[0]))
+            fields.append(('v{}'.format(i), byte_order + kind[1],
+                           (sizes.get(i, 0),)))
+        else:
+            fields.append(('v{}'.format(i), byte_order + kind))
+    dtype = np.dtype(fields)
+    end = offset + element.count * dtype.itemsize
+    if end <= len(data) and all(sizes.values()):
+        records = np.frombuffer(data, dtype, element.count, offset)
+        if all((records['n{}'.format(i)] == size).all()
+               for i, size in sizes.iteritems()):
+            values = {}
+            for i, (name, kind) in enumerate(element.properties):
+                field = records['v{}'.format(i)]
+                if isinstance(kind, tuple):
+                    values[name] = (np.full(element.count, sizes[i],
+                                            dtype=np.intp), field.ravel())
+                else:
+                    values[name] = field
+            return values, end
+
+    # the lists differ in length
+    def read(kind, positions):
+        kind = np.dtype(byte_order + kind)
+        size = len(data) - offset - kind.itemsize + 1
+        if size <= 0:
+            return (np.zeros(len(positions), dtype=kind),
+                    np.zeros(len(positions), dtype=bool))
+        # the values at every byte, most of them unaligned
+        values = np.ndarray((size,), kind, data, offset, (1,))
+        valid = positions < size
+        return values[np.where(valid, positions, 0)], valid
+    values, size = read_varying_records(
+        element, len(data) - offset, read,
+        lambda kind: np.dtype(kind).itemsize)
+    return values, offset + size
+
+
+def read_ascii_element(data, offset, element):
+    """Reads the records of an element from the values of ASCII data.
+
+    Parameters
+    ----------
+    data : numpy array
+        all values of the data
+    offset : int
+        the index of the first value of the element in `data`
+
+    Returns
+    -------
+    values : dict
+        as in `PlyReader.read_elements`
+    offset : int
+        the index of the first value of the next element in `data`
+    """
+    sizes = {}
+    width = 0
+    if element.count:
+        # assume that all lists have the lengths of those of the first
+        # record, so that all records are read at once
+        for i, (name, kind) in enumerate(element.properties):
+            if isinstance(kind, tuple):
+                if offset + width >= len(data):
+                    break
+                sizes[i] = int(data[offset + width])
+                width += 1 + sizes[i]
+            else:
+                width += 1
+    end = offset + element.count * width
+    if end <= len(data) and all(sizes.values()):
+        records = data[offset:end].reshape((element.count, width))
+        values = {}
+        column = 0
+        uniform = True
+        for i, (name, kind) in enumerate(element.properties):
+            if isinstance(kind, tuple):
+                uniform &= (records[:, column] == sizes[i]).all()
+                items = records[:, column + 1:column + 1 + sizes[i]]
+                values[name] = (np.full(element.count, sizes[i],
+                                        dtype=np.intp),
+                                items.ravel().astype(kind[1]))
+                column += 1 + sizes[i]
+            else:
+                values[name] = records[:, column].astype(kind)
+                column += 1
+        if uniform:
+            return values, end
+
+    # the lists differ in length
+    def read(kind, positions):
+        valid = positions < len(data) - offset
+        return data[offset + np.where(valid, positions, 0)], valid
+    values, size = read_varying_records(element, len(data) - offset, read,
+                                        lambda kind: 1)
+    return values, offset + size
+
+
+def next_records(element, positions, read, item_size):
+    """Finds the position following a record at each of some positions.
+
+    Parameters
+    ----------
+    element : PlyElement
+    positions : numpy array of int
+        positions from the first record of the element
+    read, item_size : callable
+        as in `read_varying_records`
+
+    Returns
+    -------
+    following : numpy array of int
+        the position following a record at each position
+    valid : numpy array of bool
+        whether the lists of each record have been read from the data
+    """
+    following = positions.copy()
+    valid = np.ones(len(positions), dtype=bool)
+    for _, kind in element.properties:
+        if isinstance(kind, tuple):
+            counts, read_valid = read(kind[0], following)
+            valid &= read_valid & (counts >= 0)
+            following += item_size(kind[0]) \
+                + np.where(valid, counts, 0).astype(np.intp) \
+                * item_size(kind[1])
+        else:
+            following += item_size(kind)
+    return following, valid
+
+
+def walk_records(element, size, read, item_size):
+    """Finds the positions of consecutive records of varying sizes, without
+    reading the records one at a time.
+
+    The data is searched a window of `RECORD_WINDOW` positions at a time,
+    starting at a record. The record following a record at every position of
+    the window is found at once, and its steps are doubled until they span
+    the window; the records of the window are then unfolded from these
+    doubled steps, halving them level by level. The window after it starts
+    at the record following the last of them, so that only the data of the
+    element is searched, plus at most one window.
+
+    Parameters
+    ----------
+    element : PlyElement
+    size, read, item_size
+        as in `read_varying_records`
+
+    Returns
+    -------
+    starts : numpy array (of shape (element.count,)) of int
+        the position of each record
+    end : int
+        the position following the last record
+
+    Raises
+    ------
+    ValueError
+        if the data of the element is truncated
+    """
+    starts = []
+    base = 0
+    remaining = element.count
+    while remaining:
+        width = max(1, min(RECORD_WINDOW, size - base + 1))
+        positions = np.arange(width)
+        following, valid = next_records(element, base + positions, read,
+                                        item_size)
+        following -= base
+        valid &= following <= size - base
+        # the steps within the window, ending in `width` past its end, or in
+        # `width + 1` past a truncated record
+        steps = np.where(following < width, following, width)
+        steps = np.append(np.where(valid, steps, width + 1),
+                          [width, width + 1]).astype(np.int32)
+        # no more records fit in the window than the shortest one allows
+        shortest = max(1, int((following - positions).min()))
+        levels = [steps]
+        while shortest << len(levels) <= width:
+            levels.append(levels[-1][levels[-1]])
+        chain = np.zeros(1, dtype=np.int32)
+        for level in reversed(levels):
+            unfolded = np.empty(2 * len(chain), dtype=np.int32)
+            unfolded[::2] = chain
+            unfolded[1::2] = level[chain]
+            chain = unfolded
+        chain = chain[chain < width][:remaining]
+        if not valid[chain].all():
+            break
+        starts.append(base + chain)
+        remaining -= len(chain)
+        base += int(following[chain[-1]])
+    if remaining:
+        raise ValueError('the data of element {} is truncated'
+                         .format(element.name))
+    if not starts:
+        return np.empty(0, dtype=np.intp), 0
+    return np.concatenate(starts), base
+
+
+def read_varying_records(element, size, read, item_size):
+    """Reads the records of an element whose lists differ in length. The
+    position of every record is found from the lengths of the lists in the
+    record before it (c.f. `walk_records`), and then all values are read at
+    once.
+
+    Parameters
+    ----------
+    element : PlyElement
+    size : int
+        the size of the data from the first record of the element to the end
+    read : callable
+        `read(kind, positions)` returns the values of a type at positions from
+        the first record, and whether each position is within the data
+    item_size : callable
+        `item_size(kind)` returns the size of a value of a type
+
+    Returns
+    -------
+    values : dict
+        as in `PlyReader.read_elements`
+    size : int
+        the size of the data of the element
+
+    Raises
+    ------
+    ValueError
+        if the data of the element is truncated
+    """
+    starts, end = walk_records(element, size, read, item_size)
+
+    values = {}
+    positions = starts
+    for name, kind in element.properties:
+        if isinstance(kind, tuple):
+            counts = read(kind[0], positions)[0].astype(np.intp)
+            positions = positions + item_size(kind[0])
+            firsts = np.cumsum(counts) - counts
+            item_positions = np.repeat(positions - firsts * item_size(kind[1]),
+                                       counts) \
+                + np.arange(counts.sum()) * item_size(kind[1])
+            values[name] = (counts,
+                            read(kind[1], item_positions)[0].astype(kind[1]))
+            positions = positions + counts * item_size(kind[1])
+        else:
+            values[name] = read(kind, positions)[0].astype(kind)
+            positions = positions + item_size(kind)
+    return values, end
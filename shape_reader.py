@@ -1,15 +1,259 @@
 '''
  reads in text file with edge coordinates and optional color field
- returns a shape as a list of Edges
+ returns a shape as an IndexedModel whose coincident endpoints are merged
  text file has the following format on each line:
  start point, end point, color(optional)
- 0 0 0, 1 0 0, 0xFFF000
+ 0 0 0, 1 0 0, #FFF000
+ the file is read in large chunks, and the lines of each chunk are tokenized
+ and converted at once with numpy; lines with unusual characters (tabs,
+ 'nan', ...) are parsed one at a time instead, with the same result
 '''
 import numpy as np
 import re
+import warnings
+
+from itertools import izip
+from three_d.model import IndexedModel
+
+DEFAULT_COLOR = 0xFFFFFF
+
+# the number of bytes read and parsed at a time
+CHUNK_SIZE = 1 << 22
+
+# tokens longer than this are parsed one line at a time
+MAX_TOKEN_LENGTH = 32
+
+# the classes of the characters of lines that are parsed in bulk; lines with
+# any other characters are parsed one at a time
+_OTHER, _NUMBER, _SPACE, _COMMA, _LETTER = xrange(5)
+_CHAR_CLASSES = np.zeros(256, dtype=np.uint8)
+for _chars, _class in (('0123456789.+-eE', _NUMBER), (' ', _SPACE),
+                       (',', _COMMA), ('#abcdfABCDF', _LETTER)):
+    _CHAR_CLASSES[np.frombuffer(_chars, dtype=np.uint8)] = _class
+
+_HEX_VALUES = np.full(256, -1, dtype=np.int64)
+for _i, _c in enumerate('0123456789abcdef'):
+    _HEX_VALUES[ord(_c)] = _HEX_VALUES[ord(_c.upper())] = _i
+
+def _counts_in_ranges(positions, starts, ends):
+    """Counts the elements of the sorted array `positions` within
+    `[starts[i], ends[i])` for every `i`.
+    """
+    return np.searchsorted(positions, ends) - np.searchsorted(positions, starts)
+
+
+def _strip(buf, starts, ends):
+    """Strips the spaces around the ranges `[starts[i], ends[i])` of a
+    buffer.
+    """
+    low = starts.copy()
+    active = np.flatnonzero(low < ends)
+    while len(active):
+        active = active[buf[low[active]] == ord(' ')]
+        low[active] += 1
+        active = active[low[active] < ends[active]]
+    high = ends.copy()
+    active = np.flatnonzero(high > low)
+    while len(active):
+        active = active[buf[high[active] - 1] == ord(' ')]
+        high[active] -= 1
+        active = active[high[active] > low[active]]
+    return low, high
+
+
+def parse_floats(buf, starts, ends):
+    """Converts the tokens `buf[starts[i]:ends[i]]`, which are in increasing
+    order and do not overlap, to floats as `float` would, with NaN and `False`
+    validity for the tokens that are not numbers.
+    """
+    count = len(starts)
+    # blank out everything but the tokens, and end every token with a
+    # separator, so that the whole buffer is converted at once; a final 0
+    # makes sure that any token that is not a number cuts the result short
+    boundaries = np.zeros(len(buf) + 1, dtype=np.int8)
+    boundaries[starts] = 1
+    boundaries[ends] = -1
+    in_token = np.cumsum(boundaries[:-1], dtype=np.int8).view(bool)
+    text = np.full(len(buf) + 2, ord(' '), dtype=np.uint8)
+    np.copyto(text[:len(buf)], buf, where=in_token)
+    text[ends] = ord(';')
+    text[-1] = ord('0')
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        values = np.fromstring(text.tobytes(), sep=';')
+    if len(values) == count + 1:
+        return values[:-1], np.ones(count, dtype=bool)
+
+    # at least one token is not a number; find them one at a time
+    values = np.empty(count)
+    valid = np.ones(count, dtype=bool)
+    for i, (start, end) in enumerate(izip(starts.tolist(), ends.tolist())):
+        try:
+            values[i] = float(buf[start:end].tobytes())
+        except ValueError:
+            values[i] = np.nan
+            valid[i] = False
+    return values, valid
+
+
+def _point_tokens(buf, spaces, letters, starts, ends):
+    """Finds the coordinates of the points in many ranges of a buffer at
+    once, as `ShapeReader.parse_point` would.
+
+    Parameters
+    ----------
+    buf : numpy array of uint8
+        the text, containing only the characters parsed in bulk in the ranges
+    spaces, letters : numpy array of int
+        the positions of the spaces and of the characters other than spaces
+        and commas that cannot be part of numbers in `buf`
+    starts, ends : numpy array (of shape (M,)) of int
+        the ranges of the points in `buf`
+
+    Returns
+    -------
+    token_starts, token_ends : numpy array (of shape (M, 3)) of int
+        the ranges of the coordinates of each point in `buf`
+    valid : numpy array (of shape (M,)) of bool
+        whether each point consists of (at least) three tokens made of
+        characters of numbers; the tokens may still not be numbers
+    """
+    count = len(starts)
+    low, high = _strip(buf, starts, ends)
+
+    # the first three tokens between single spaces; any further ones are
+    # ignored
+    first_space = np.searchsorted(spaces, low)
+    num_spaces = np.searchsorted(spaces, high) - first_space
+    valid = num_spaces >= 2
+    if not valid.any():
+        return (np.zeros((count, 3), dtype=np.intp),
+                np.zeros((count, 3), dtype=np.intp), valid)
+    separators = spaces[np.minimum(first_space[:, np.newaxis] + np.arange(3),
+                                   len(spaces) - 1)]
+    token_starts = np.column_stack((low, separators[:, :2] + 1))
+    token_ends = separators
+    token_ends[:, 2] = np.where(num_spaces >= 3, separators[:, 2], high)
+    valid &= (token_ends > token_starts).all(axis=1)
+    valid &= (_counts_in_ranges(letters, token_starts.ravel(),
+                                token_ends.ravel()) == 0) \
+        .reshape((-1, 3)).all(axis=1)
+    return token_starts, token_ends, valid
+
+
+def _parse_colors(buf, starts, ends):
+    """Parses the colors in many ranges of a buffer at once, as
+    `ShapeReader.parse_color` would.
+
+    Parameters
+    ----------
+    buf : numpy array of uint8
+        the text, containing only the characters parsed in bulk in the ranges
+    starts, ends : numpy array (of shape (M,)) of int
+        the ranges of the colors in `buf`
+
+    Returns
+    -------
+    numpy array (of shape (M,)) of uint32
+    """
+    colors = np.full(len(starts), DEFAULT_COLOR, dtype=np.uint32)
+    hashes, _ = _strip(buf, starts, ends)
+    digits = buf[np.minimum(hashes[:, np.newaxis] + np.arange(1, 7),
+                            len(buf) - 1)]
+    values = _HEX_VALUES[digits]
+    valid = (hashes + 7 <= ends) \
+        & (buf[np.minimum(hashes, len(buf) - 1)] == ord('#')) \
+        & (values >= 0).all(axis=1)
+    colors[valid] = (values[valid] << np.arange(20, -1, -4)).sum(axis=1)
+    return colors
+
+
+def parse_lines(data):
+    """Parses many lines of edges at once, dropping the malformed ones just
+    as `ShapeReader.parse_line` does.
+
+    Parameters
+    ----------
+    data : str
+        the lines, separated by newlines
+
+    Returns
+    -------
+    starts, ends : numpy array (of shape (N, 3))
+    colors : numpy array (of shape (N,)) of uint32
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    if not len(buf):
+        return np.empty((0, 3)), np.empty((0, 3)), np.empty(0, np.uint32)
+    newlines = np.flatnonzero(buf == ord('\n'))
+    line_starts = np.concatenate(([0], newlines + 1))
+    line_ends = np.concatenate((newlines, [len(buf)]))
+    # a carriage return at the end of a line is stripped like any space
+    line_ends = line_ends - ((line_ends > line_starts)
+                             & (buf[line_ends - 1] == ord('\r')))
+
+    classes = _CHAR_CLASSES[buf]
+    commas = np.flatnonzero(classes == _COMMA)
+    num_commas = _counts_in_ranges(commas, line_starts, line_ends)
+    bulk = _counts_in_ranges(np.flatnonzero(classes == _OTHER), line_starts,
+                             line_ends) == 0
+    lines = np.flatnonzero(bulk & ((num_commas == 1) | (num_commas == 2)))
+    spaces = np.flatnonzero(classes == _SPACE)
+    letters = np.flatnonzero(classes == _LETTER)
+
+    first_comma = np.searchsorted(commas, line_starts[lines])
+    first_commas = commas[first_comma]
+    second_commas = commas[np.minimum(first_comma + 1, len(commas) - 1)]
+    has_color = num_commas[lines] == 2
+    point_ends = np.where(has_color, second_commas, line_ends[lines])
+
+    start_token_starts, start_token_ends, valid = _point_tokens(
+        buf, spaces, letters, line_starts[lines], first_commas)
+    end_token_starts, end_token_ends, valid_ends = _point_tokens(
+        buf, spaces, letters, first_commas + 1, point_ends)
+    token_starts = np.hstack((start_token_starts, end_token_starts))
+    token_ends = np.hstack((start_token_ends, end_token_ends))
+    valid &= valid_ends
+    # the lines with very long tokens are parsed one at a time
+    unknown = valid & ((token_ends - token_starts)
+                       > MAX_TOKEN_LENGTH).any(axis=1)
+    valid &= ~unknown
+
+    points = np.zeros((len(lines), 6))
+    rows = np.flatnonzero(valid)
+    if len(rows):
+        values, valid_values = parse_floats(buf, token_starts[rows].ravel(),
+                                            token_ends[rows].ravel())
+        points[rows] = values.reshape((-1, 6))
+        valid[rows] = valid_values.reshape((-1, 6)).all(axis=1)
+    colors = np.full(len(lines), DEFAULT_COLOR, dtype=np.uint32)
+    colored = np.flatnonzero(has_color)
+    colors[colored] = _parse_colors(buf, second_commas[colored] + 1,
+                                    line_ends[lines[colored]])
+    starts = points[valid, :3]
+    ends = points[valid, 3:]
+    colors = colors[valid]
+
+    # the lines that cannot be parsed in bulk are parsed one at a time
+    others = np.concatenate((np.flatnonzero(~bulk), lines[unknown]))
+    if not len(others):
+        return starts, ends, colors
+
+    others.sort()
+    edges = [ShapeReader.parse_line(data[line_starts[i]:line_ends[i]])
+             for i in others.tolist()]
+    parsed = np.array([edge is not None for edge in edges], dtype=bool)
+    edges = [edge for edge in edges if edge is not None]
+    other_starts = np.array([edge[0] for edge in edges]).reshape((-1, 3))
+    other_ends = np.array([edge[1] for edge in edges]).reshape((-1, 3))
+    other_colors = np.array([edge[2] for edge in edges], dtype=np.uint32)
+    # put the edges of all lines back in the order of the lines
+    order = np.argsort(np.concatenate((lines[valid], others[parsed])),
+                       kind='mergesort')
+    return (np.concatenate((starts, other_starts))[order],
+            np.concatenate((ends, other_ends))[order],
+            np.concatenate((colors, other_colors))[order])
 
-from three_d.primitives import Edge
-from three_d.model import Model
 
 class ShapeReader(object):
 
@@ -20,7 +264,7 @@ class ShapeReader(object):
     def parse_color(s):
         result = re.match(r'#([A-Fa-f0-9]{6})', s.strip())
         if result is None:
-            return 0xFFFFFF
+            return DEFAULT_COLOR
         return int(result.group(1), 16)
 
     @staticmethod
@@ -29,26 +273,71 @@ class ShapeReader(object):
         try:
             return np.array([float(coords[0]), float(coords[1]),
                              float(coords[2])])
-        except ValueError:
+        except (ValueError, IndexError):
             return None
 
-    def process_file(self):
-        with open(self.shape_file, 'r') as f:
-            edges = []
-            for line in f:
-                parts = line.split(',')
-                if len(parts) != 2 and len(parts) != 3:
-                    continue
-                if len(parts) == 2:
-                    color = 0xFFFFFF
-                else:
-                    color = ShapeReader.parse_color(parts[2])
-                start = ShapeReader.parse_point(parts[0])
-                if start is None:
-                    continue
-                end = ShapeReader.parse_point(parts[1])
-                if end is None:
+    @staticmethod
+    def parse_line(line):
+        """Parses a single line.
+
+        Returns
+        -------
+        tuple of numpy array, numpy array, and int, or None
+            the start, end, and color of the edge, or `None` if the line is
+            malformed
+        """
+        parts = line.split(',')
+        if len(parts) != 2 and len(parts) != 3:
+            return None
+        if len(parts) == 2:
+            color = DEFAULT_COLOR
+        else:
+            color = ShapeReader.parse_color(parts[2])
+        start = ShapeReader.parse_point(parts[0])
+        if start is None:
+            return None
+        end = ShapeReader.parse_point(parts[1])
+        if end is None:
+            return None
+        return start, end, color
+
+    def read_batches(self, chunk_size=CHUNK_SIZE):
+        """Reads the edges of the file in batches, one for every chunk of
+        about `chunk_size` bytes, so that the whole text never has to be in
+        memory at once.
+
+        Yields
+        ------
+        starts, ends : numpy array (of shape (N, 3))
+        colors : numpy array (of shape (N,)) of uint32
+        """
+        with open(self.shape_file, 'rb') as f:
+            rest = b''
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                # only complete lines are parsed; the rest waits for the next
+                # chunk
+                end = chunk.rfind(b'\n') + 1
+                if not end:
+                    rest += chunk
                     continue
-                edges.append(Edge(start, end, color))
+                data = rest + chunk[:end]
+                rest = chunk[end:]
+                yield parse_lines(data)
+            if rest:
+                yield parse_lines(rest)
+
+    def process_file(self):
+        starts = [np.empty((0, 3))]
+        ends = [np.empty((0, 3))]
+        colors = [np.empty(0, dtype=np.uint32)]
+        for batch_starts, batch_ends, batch_colors in self.read_batches():
+            starts.append(batch_starts)
+            ends.append(batch_ends)
+            colors.append(batch_colors)
 
-            return Model(np.array([0, 0, 0]), edges)
+        return IndexedModel(np.array([0, 0, 0]), starts=np.concatenate(starts),
+                            ends=np.concatenate(ends),
+                            colors=np.concatenate(colors))
@@ -2,25 +2,66 @@
 '''
 import numpy as np
 
-from three_d.primitives import Edge
-
-from three_d.model import Model
-
-class Cube(Model):
-
-    def __init__(self, position, color=0xFFFFFF, side=17, **kwargs):
-        s = side / 2.0
-        cube = [Edge(np.array([-s, -s, -s]), np.array([-s, -s, s]), color=color),
-                Edge(np.array([-s, -s, -s]), np.array([-s, s, -s]), color=color),
-                Edge(np.array([-s, -s, -s]), np.array([s, -s, -s]), color=color),
-                Edge(np.array([-s, -s, s]), np.array([-s, s, s]), color=color),
-                Edge(np.array([-s, -s, s]), np.array([s, -s, s]), color=color),
-                Edge(np.array([-s, s, -s]), np.array([-s, s, s]), color=color),
-                Edge(np.array([-s, s, -s]), np.array([s, s, -s]), color=color),
-                Edge(np.array([s, -s, -s]), np.array([s, s, -s]), color=color),
-                Edge(np.array([s, -s, -s]), np.array([s, -s, s]), color=color),
-                Edge(np.array([-s, s, s]), np.array([s, s, s]), color=color),
-                Edge(np.array([s, -s, s]), np.array([s, s, s]), color=color),
-                Edge(np.array([s, s, -s]), np.array([s, s, s]), color=color)]
-        super(Cube, self).__init__(position, edges=cube, **kwargs)
-        self.side = side
+from three_d.instancing import InstancedModel, SharedGeometry
+
+# the cube of side 1 centered on the origin, which all cubes share
+CUBE_GEOMETRY = SharedGeometry(
+    vertices=np.array([[-0.5, -0.5, -0.5],
+                       [-0.5, -0.5, 0.5],
+                       [-0.5, 0.5, -0.5],
+                       [-0.5, 0.5, 0.5],
+                       [0.5, -0.5, -0.5],
+                       [0.5, -0.5, 0.5],
+                       [0.5, 0.5, -0.5],
+                       [0.5, 0.5, 0.5]]),
+    edge_indices=np.array([[0, 1], [0, 2], [0, 4], [1, 3], [1, 5], [2, 3],
+                           [2, 6], [4, 6], [4, 5], [3, 7], [5, 7], [6, 7]]))
+
+class Cube(InstancedModel):
+    """A cube, which is an instance of `CUBE_GEOMETRY` scaled to its side.
+
+    Parameters
+    ----------
+    position : numpy array (of size 3)
+    color : int, optional
+    side : float, optional
+    scale : float, optional
+        A factor by which the side is scaled. Default is 1.
+    kwargs
+        Passed on to `InstancedModel`, e.g. `rotation`.
+    """
+    def __init__(self, position, color=0xFFFFFF, side=17, scale=1.0,
+                 **kwargs):
+        if side <= 0:
+            raise ValueError('the side of a cube must be positive: {}'
+                             .format(side))
+        self._side = side
+        super(Cube, self).__init__(CUBE_GEOMETRY, position, scale=side * scale,
+                                   color=color, **kwargs)
+
+    @property
+    def side(self):
+        """The length of the sides of this cube before it is scaled. Assigning
+        it resizes the cube, keeping its scale.
+        """
+        return self._side
+
+    @side.setter
+    def side(self, side):
+        if side <= 0:
+            raise ValueError('the side of a cube must be positive: {}'
+                             .format(side))
+        scale = self.scale
+        self._side = side
+        self.scale = scale
+
+    @property
+    def scale(self):
+        """The factor by which this cube is scaled, as for any model. Its row
+        of the instance array scales the unit cube by the side times it.
+        """
+        return self._row_scale / self._side
+
+    @scale.setter
+    def scale(self, scale):
+        self._row_scale = self._side * scale
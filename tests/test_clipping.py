@@ -0,0 +1,163 @@
+"""Tests the vectorized clipping against the view volume in homogeneous
+coordinates, and the perspective projection feeding it.
+"""
+from __future__ import division
+
+import unittest
+
+import numpy as np
+import pygame
+
+from three_d.cameras.perspective import PerspectiveViewport
+from three_d.mathutil import (clip_t, clip_4d_liang_barsky_batch,
+                              homogeneous_clip_planes, outcodes_4d,
+                              perspective_division)
+
+def clip_edge(p0, p1, planes, offsets):
+    """Clips one segment against the planes, one plane at a time, by the
+    algorithm of Liang and Barsky (c.f. `clip_4d_liang_barsky`).
+
+    Returns
+    -------
+    visible : bool
+    p0, p1 : numpy array (of size 4)
+        the clipped endpoints
+    """
+    d0 = p0.dot(planes) + offsets
+    d1 = p1.dot(planes) + offsets
+    t0_t1 = np.array((0.0, 1.0))
+    for k in xrange(len(offsets)):
+        # the segment is inside the plane where (d0 - d1) * t <= d0
+        if not clip_t(d0[k] - d1[k], d0[k], t0_t1):
+            return False, p0, p1
+    t0, t1 = t0_t1
+    if t0 > t1:
+        return False, p0, p1
+    return True, p0 + t0 * (p1 - p0), p0 + t1 * (p1 - p0)
+
+
+class ClipBatchTest(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.RandomState(5)
+
+    def assert_clips_like_edges(self, p0, p1, planes, offsets):
+        visible, clipped0, clipped1 = clip_4d_liang_barsky_batch(
+            p0, p1, planes, offsets)
+        expected = [clip_edge(a, b, planes, offsets) for a, b in zip(p0, p1)]
+        np.testing.assert_array_equal(visible,
+                                      [v for v, _, _ in expected])
+        self.assertEqual(len(clipped0), visible.sum())
+        expected0 = np.array([a for v, a, _ in expected if v])
+        expected1 = np.array([b for v, _, b in expected if v])
+        np.testing.assert_allclose(clipped0, expected0.reshape((-1, 4)),
+                                   atol=1e-12)
+        np.testing.assert_allclose(clipped1, expected1.reshape((-1, 4)),
+                                   atol=1e-12)
+        # the clipped endpoints lie inside every plane
+        for points in (clipped0, clipped1):
+            self.assertTrue((points.dot(planes) + offsets >= -1e-9).all())
+
+    def test_random_edges(self):
+        for clip_far in (True, False):
+            planes, offsets = homogeneous_clip_planes(-1.5, 0.5, -1.0, 2.0,
+                                                      clip_far=clip_far)
+            p0 = self.rng.uniform(-3, 3, (500, 4))
+            p1 = self.rng.uniform(-3, 3, (500, 4))
+            self.assert_clips_like_edges(p0, p1, planes, offsets)
+
+    def test_edges_crossing_eye_plane(self):
+        planes, offsets = homogeneous_clip_planes()
+        p0 = self.rng.uniform(-1, 1, (200, 4))
+        p1 = self.rng.uniform(-1, 1, (200, 4))
+        p0[:, 3] = self.rng.uniform(0.5, 2, 200)
+        p1[:, 3] = -self.rng.uniform(0.5, 2, 200)
+        p0[:, 2] = p0[:, 3] * self.rng.uniform(0, 1, 200)
+        self.assert_clips_like_edges(p0, p1, planes, offsets)
+        _, clipped0, clipped1 = clip_4d_liang_barsky_batch(p0, p1, planes,
+                                                           offsets)
+        self.assertTrue(len(clipped1))
+        self.assertTrue((clipped1[:, 3] > 0).all())
+
+    def test_edges_in_planes(self):
+        planes, offsets = homogeneous_clip_planes()
+        w = self.rng.uniform(1, 2, (100, 2))
+        y = self.rng.uniform(-0.9, 0.9, (100, 2)) * w
+        z = self.rng.uniform(0.1, 0.9, (100, 2)) * w
+        # on the right plane x = w, which is inside
+        p0 = np.column_stack((w[:, 0], y[:, 0], z[:, 0], w[:, 0]))
+        p1 = np.column_stack((w[:, 1], y[:, 1], z[:, 1], w[:, 1]))
+        self.assert_clips_like_edges(p0, p1, planes, offsets)
+        visible, clipped0, clipped1 = clip_4d_liang_barsky_batch(
+            p0, p1, planes, offsets)
+        self.assertTrue(visible.all())
+        np.testing.assert_array_equal(clipped0, p0)
+        np.testing.assert_array_equal(clipped1, p1)
+        # parallel to the right plane, just outside of it
+        p0[:, 0] += 0.1
+        p1[:, 0] += 0.1
+        self.assert_clips_like_edges(p0, p1, planes, offsets)
+        self.assertFalse(clip_4d_liang_barsky_batch(
+            p0, p1, planes, offsets)[0].any())
+
+    def test_outcodes(self):
+        planes, offsets = homogeneous_clip_planes()
+        points = np.array([[0.0, 0.0, 0.5, 1.0],
+                           [2.0, 0.0, 0.5, 1.0],
+                           [-2.0, 2.0, 0.5, 1.0],
+                           [0.0, 0.0, 2.0, 1.0],
+                           [0.0, 0.0, 0.0, -1.0]])
+        codes = outcodes_4d(points, planes, offsets)
+        self.assertEqual(codes[0], 0)
+        self.assertEqual(codes[1], 0b10)
+        self.assertEqual(codes[2], 0b1001)
+        self.assertEqual(codes[3], 0b100000)
+        # behind the eye, outside the eye plane among others
+        self.assertTrue(codes[4] & 0b1000000)
+
+
+class PerspectiveDivisionTest(unittest.TestCase):
+    def test_masks_points_behind_eye(self):
+        points = np.array([[2.0, 4.0, 1.0, 2.0, 7.0],
+                           [1.0, 1.0, 1.0, 0.0, 7.0],
+                           [1.0, 1.0, 1.0, -1.0, 7.0]])
+        valid = perspective_division(points)
+        np.testing.assert_array_equal(valid, [True, False, False])
+        np.testing.assert_array_equal(points[0], [1.0, 2.0, 0.5, 1.0, 7.0])
+        self.assertTrue(np.isnan(points[1:, :3]).all())
+        # the attributes are left as they are
+        np.testing.assert_array_equal(points[:, 3:], [[1.0, 7.0]] * 3)
+
+    def test_out(self):
+        points = np.array([[2.0, 4.0, 1.0, 2.0]])
+        out = np.empty_like(points)
+        self.assertTrue(perspective_division(points, out=out).all())
+        np.testing.assert_array_equal(points, [[2.0, 4.0, 1.0, 2.0]])
+        np.testing.assert_array_equal(out, [[1.0, 2.0, 0.5, 1.0]])
+
+
+class InfiniteProjectionTest(unittest.TestCase):
+    def make_viewport(self, far):
+        return PerspectiveViewport(pygame.Surface((80, 60)), near=1.0,
+                                   far=far)
+
+    def test_near_plane(self):
+        matrix = self.make_viewport(float('inf')).projection_matrix
+        planes, offsets = homogeneous_clip_planes(clip_far=False)
+        # camera coordinates at distances 0.5, 1, 2, and 1e9 along the axis
+        points = np.array([[0.0, 0.0, d, 1.0] for d in (0.5, 1.0, 2.0, 1e9)])
+        projected = points.dot(matrix.T)
+        np.testing.assert_allclose(projected[:, 2], [-0.5, 0.0, 1.0, 1e9 - 1])
+        codes = outcodes_4d(projected, planes, offsets)
+        # before the near plane only
+        self.assertEqual(list(codes != 0), [True, False, False, False])
+        perspective_division(projected)
+        np.testing.assert_allclose(projected[1:, 2], [0.0, 0.5, 1.0])
+
+    def test_limit_of_finite_far(self):
+        infinite = self.make_viewport(float('inf')).projection_matrix
+        finite = self.make_viewport(1e12).projection_matrix
+        np.testing.assert_allclose(finite, infinite, atol=1e-9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+"""Tests moving instanced and plain models with a simulation against moving
+them one at a time.
+"""
+import unittest
+
+import numpy as np
+
+from shapes import CUBE_GEOMETRY, Cube
+from three_d.kinematics import Kinematics
+from three_d.mathutil import rotation_matrices
+from three_d.model import IndexedModel, Model
+
+def plain_cube(position, side):
+    return IndexedModel(position, vertices=CUBE_GEOMETRY.vertices * side,
+                        edge_indices=CUBE_GEOMETRY.edge_indices)
+
+
+class KinematicsTest(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.RandomState(17)
+        positions = self.rng.uniform(-100, 100, (30, 3))
+        sides = self.rng.uniform(1, 10, 30)
+        self.cubes = [Cube(position, side=side)
+                      for position, side in zip(positions, sides)]
+        self.plain = [plain_cube(position, side)
+                      for position, side in zip(positions, sides)]
+        self.velocities = self.rng.normal(0, 10, (30, 3))
+        self.angular_velocities = self.rng.normal(0, 1, (30, 3))
+        # some at rest, some only moving, and some only spinning
+        self.velocities[:5] = 0
+        self.angular_velocities[:10] = 0
+        self.velocities[25:] = 0
+
+    def simulate(self, models, steps=3, dt=0.1):
+        kinematics = Kinematics()
+        for model, velocity, angular_velocity in zip(
+                models, self.velocities, self.angular_velocities):
+            kinematics.add(model, velocity, angular_velocity)
+        versions = [model.version for model in models]
+        for _ in xrange(steps):
+            kinematics.step(dt)
+        return kinematics, versions
+
+    def test_plain_models_follow_instances(self):
+        self.simulate(self.cubes)
+        self.simulate(self.plain)
+        for cube, plain in zip(self.cubes, self.plain):
+            np.testing.assert_allclose(plain.position, cube.position)
+            np.testing.assert_allclose(plain.world_vertices,
+                                       cube.world_vertices, atol=1e-9)
+            for plain_corner, cube_corner in zip(plain.world_bounds,
+                                                 cube.world_bounds):
+                np.testing.assert_allclose(plain_corner, cube_corner,
+                                           atol=1e-9)
+
+    def test_motion(self):
+        positions = [cube.position.copy() for cube in self.cubes]
+        rotations = [cube.rotation.copy() for cube in self.cubes]
+        self.simulate(self.cubes, steps=1, dt=0.5)
+        spins = rotation_matrices(0.5 * self.angular_velocities)
+        for i, cube in enumerate(self.cubes):
+            np.testing.assert_allclose(
+                cube.position, positions[i] + 0.5 * self.velocities[i])
+            np.testing.assert_allclose(cube.rotation,
+                                       spins[i].dot(rotations[i]))
+
+    def test_versions(self):
+        for models in (self.cubes, self.plain):
+            _, versions = self.simulate(models)
+            changed = [model.version != version
+                       for model, version in zip(models, versions)]
+            self.assertEqual(changed, [False] * 5 + [True] * 25)
+            self.assertEqual(len(set(model.version for model in models)),
+                             len(models))
+
+    def test_assigned_positions(self):
+        kinematics, _ = self.simulate(self.plain, steps=1)
+        model = self.plain[7]
+        model.position = [1.0, 2.0, 3.0]
+        kinematics.step(1.0)
+        np.testing.assert_allclose(model.position,
+                                   [1.0, 2.0, 3.0] + self.velocities[7])
+
+    def test_rotations(self):
+        models = [plain_cube(np.zeros(3), 5) for _ in xrange(4)]
+        models.append(Model(np.zeros(3), starts=self.rng.rand(6, 3),
+                            ends=self.rng.rand(6, 3)))
+        clones = [model.clone() for model in models]
+        vertices = [model.vertices.copy() for model in models]
+        kinematics = Kinematics()
+        for model, angular_velocity in zip(models,
+                                           self.angular_velocities[-5:]):
+            kinematics.add(model, angular_velocity=angular_velocity)
+        for _ in xrange(3):
+            kinematics.step(0.1)
+        spins = rotation_matrices(0.3 * self.angular_velocities[-5:])
+        for model, clone, spin, original in zip(models, clones, spins,
+                                                vertices):
+            # the vertices are left as they were, and still shared
+            self.assertIs(model.vertices, clone.vertices)
+            np.testing.assert_array_equal(model.vertices, original)
+            np.testing.assert_allclose(model.rotation, spin, atol=1e-12)
+            np.testing.assert_allclose(model.world_vertices[:, :3],
+                                       original.dot(spin.T), atol=1e-12)
+            np.testing.assert_array_equal(clone.rotation, np.identity(3))
+            rotated = model.clone()
+            np.testing.assert_array_equal(rotated.rotation, model.rotation)
+            np.testing.assert_array_equal(rotated.world_vertices,
+                                          model.world_vertices)
+
+    def test_remove(self):
+        kinematics, _ = self.simulate(self.plain, steps=1)
+        removed = self.plain[12]
+        kinematics.remove(removed)
+        self.assertNotIn(removed, kinematics)
+        self.assertEqual(len(kinematics), 29)
+        position = removed.position.copy()
+        version = removed.version
+        kinematics.step(1.0)
+        np.testing.assert_array_equal(removed.position, position)
+        self.assertEqual(removed.version, version)
+        moved = self.plain[13]
+        self.assertIn(moved, kinematics)
+        previous = moved.position.copy()
+        kinematics.step(1.0)
+        np.testing.assert_allclose(moved.position,
+                                   previous + self.velocities[13])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+"""Tests that the mesh cache gives back exactly what was parsed, and never
+leaves temporary files behind.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import mesh_cache
+from mesh_cache import MeshCache
+from model_loader import parse_model
+
+class MeshCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.RandomState(17)
+        self.directory = tempfile.mkdtemp()
+        self.cache = MeshCache(os.path.join(self.directory, 'cache'))
+        self.source = os.path.join(self.directory, 'mesh.txt')
+        # coordinates that float32 cannot represent
+        points = 1e7 + self.rng.uniform(-1, 1, (200, 2, 3)).round(3)
+        colors = self.rng.randint(1 << 24, size=len(points))
+        with open(self.source, 'w') as f:
+            for (start, end), color in zip(points, colors):
+                f.write('{}, {}, #{:06X}\n'.format(
+                    ' '.join(repr(x) for x in start),
+                    ' '.join(repr(x) for x in end), color))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_hit_equals_miss(self):
+        missed = self.cache.load(self.source, parse_model)
+        hit = self.cache.get(self.source)
+        self.assertIsNotNone(hit)
+        for name in ('vertices', 'edge_indices', 'colors'):
+            np.testing.assert_array_equal(getattr(hit, name),
+                                          getattr(missed, name))
+        self.assertEqual(hit.vertices.dtype, missed.vertices.dtype)
+
+    def test_failed_write_leaves_no_files(self):
+        rename = os.rename
+        def failing_rename(source, destination):
+            if destination.endswith(mesh_cache.INFO_SUFFIX):
+                raise OSError('rename failed')
+            rename(source, destination)
+        mesh_cache.os.rename = failing_rename
+        try:
+            self.cache.put(self.source, parse_model(self.source))
+        finally:
+            mesh_cache.os.rename = rename
+        self.assertEqual(
+            [name for name in os.listdir(self.cache.directory)
+             if not name.endswith(mesh_cache.MESH_SUFFIX)], [])
+        self.assertIsNone(self.cache.get(self.source))
+
+    def test_too_large(self):
+        self.cache.max_size = 100
+        self.cache.put(self.source, parse_model(self.source))
+        self.assertEqual(os.listdir(self.cache.directory), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
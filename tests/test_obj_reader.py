@@ -0,0 +1,100 @@
+"""Tests reading Wavefront OBJ files against reading them one line at a time.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from obj_reader import ObjReader
+
+def reference(text):
+    """Reads the vertices and the edges of faces and polylines one line at a
+    time.
+    """
+    vertices = []
+    edges = set()
+    for line in text.split('\n'):
+        tokens = line.split()
+        if not tokens:
+            continue
+        if tokens[0] == 'v':
+            vertices.append([float(x) for x in tokens[1:4]])
+        elif tokens[0] in ('f', 'l'):
+            refs = [int(token.partition('/')[0]) for token in tokens[1:]]
+            indices = [ref - 1 if ref > 0 else len(vertices) + ref
+                       for ref in refs]
+            pairs = zip(indices, indices[1:])
+            if tokens[0] == 'f' and indices:
+                pairs.append((indices[-1], indices[0]))
+            edges.update((min(a, b), max(a, b)) for a, b in pairs if a != b)
+    return np.array(vertices).reshape((-1, 3)), edges
+
+
+class ObjReaderTest(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.RandomState(17)
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self, text):
+        path = os.path.join(self.directory, 'mesh.obj')
+        with open(path, 'wb') as f:
+            f.write(text)
+        return ObjReader(path).process_file()
+
+    def random_text(self, count):
+        lines = ['# a comment', 'o object', 'mtllib materials.mtl']
+        num_vertices = 0
+        for _ in xrange(count):
+            kind = self.rng.randint(6)
+            if kind <= 1 or num_vertices < 5:
+                coords = self.rng.uniform(-10, 10, 3 + self.rng.randint(2))
+                lines.append('v ' + ' '.join('{:.4f}'.format(x)
+                                             for x in coords))
+                num_vertices += 1
+            elif kind == 2:
+                lines.append(self.rng.choice(['vt 0.5 0.5', 'vn 0 0 1', '',
+                                              '  ', 'g group', 's off',
+                                              'usemtl red', '#f 1 2 3']))
+            else:
+                size = self.rng.randint(2, 7)
+                refs = self.rng.randint(1, num_vertices + 1, size)
+                relative = self.rng.rand(size) < 0.3
+                refs = np.where(relative, refs - num_vertices - 1, refs)
+                forms = ['{}', '{}/1', '{}//1', '{}/1/1']
+                lines.append('\t'.join(
+                    ['f' if kind < 5 else 'l']
+                    + [forms[self.rng.randint(4)].format(ref)
+                       for ref in refs]))
+            if self.rng.rand() < 0.1:
+                lines[-1] += '\r'
+        return '\n'.join(lines)
+
+    def test_random_file(self):
+        text = self.random_text(2000)
+        model = self.read(text)
+        vertices, edges = reference(text)
+        np.testing.assert_array_equal(model.vertices, vertices)
+        self.assertEqual(set(tuple(sorted(edge)) for edge in
+                             model.edge_indices.tolist()), edges)
+        self.assertEqual(len(model.edge_indices), len(edges))
+
+    def test_empty_file(self):
+        model = self.read('')
+        self.assertEqual(len(model.vertices), 0)
+        self.assertEqual(len(model.edge_indices), 0)
+
+    def test_malformed_files(self):
+        for text in ('v 1 2\nv 1 2 3', 'v 1 2 x', 'v 1 2 3\nf 1 x 1',
+                     'v 1 2 3\nf 1 /2 1', 'v 1 2 3\nf 1 1.5 1',
+                     'v 1 2 3\nf 1 2 3'):
+            with self.assertRaises(ValueError):
+                self.read(text)
+
+
+if __name__ == '__main__':
+    unittest.main()
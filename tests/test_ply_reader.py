@@ -0,0 +1,139 @@
+"""Tests reading PLY files whose faces have lists of different lengths.
+"""
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+import numpy as np
+
+import ply_reader
+from ply_reader import PlyReader
+
+HEADER = '''ply
+format {} 1.0
+comment made by the tests
+element vertex {}
+property float x
+property float y
+property float z
+element face {}
+property uchar flags
+property list uchar int vertex_indices
+property float quality
+property list ushort short extra
+end_header
+'''
+
+class PlyReaderTest(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.RandomState(17)
+        self.directory = tempfile.mkdtemp()
+        self.vertices = self.rng.randint(-50, 50, (40, 3)).astype(float)
+        count = 500
+        self.sizes = self.rng.choice([3, 4, 4, 5, 0], count)
+        self.flags = self.rng.randint(256, size=count)
+        self.quality = self.rng.randint(-8, 8, count) / 4.0
+        self.faces = [self.rng.randint(40, size=size) for size in self.sizes]
+        self.extra = [self.rng.randint(-300, 300, self.rng.randint(3))
+                      for _ in xrange(count)]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, data_format, truncate=0):
+        header = HEADER.format(data_format, len(self.vertices),
+                               len(self.faces))
+        if data_format == 'ascii':
+            lines = [' '.join('{:g}'.format(x) for x in vertex)
+                     for vertex in self.vertices]
+            for flags, face, quality, extra in zip(
+                    self.flags, self.faces, self.quality, self.extra):
+                lines.append(' '.join(str(x) for x in
+                                      [flags, len(face)] + list(face)
+                                      + [quality, len(extra)] + list(extra)))
+            body = '\n'.join(lines) + '\n'
+        else:
+            order = '<' if data_format == 'binary_little_endian' else '>'
+            parts = [struct.pack(order + '3f', *vertex)
+                     for vertex in self.vertices]
+            for flags, face, quality, extra in zip(
+                    self.flags, self.faces, self.quality, self.extra):
+                parts.append(struct.pack(
+                    '{}BB{}ifH{}h'.format(order, len(face), len(extra)),
+                    flags, len(face), *(list(face) + [quality, len(extra)]
+                                        + list(extra))))
+            body = ''.join(parts)
+        path = os.path.join(self.directory, 'mesh.ply')
+        with open(path, 'wb') as f:
+            f.write(header + body[:len(body) - truncate])
+        return path
+
+    def test_mixed_list_lengths(self):
+        for data_format in ('ascii', 'binary_little_endian',
+                            'binary_big_endian'):
+            elements = PlyReader(self.write(data_format)).read_elements()
+            vertex = elements['vertex']
+            np.testing.assert_array_equal(
+                np.column_stack((vertex['x'], vertex['y'], vertex['z'])),
+                self.vertices)
+            face = elements['face']
+            np.testing.assert_array_equal(face['flags'], self.flags)
+            np.testing.assert_array_equal(face['quality'], self.quality)
+            sizes, indices = face['vertex_indices']
+            np.testing.assert_array_equal(sizes, self.sizes)
+            np.testing.assert_array_equal(indices,
+                                          np.concatenate(self.faces))
+            self.assertEqual(indices.dtype, np.int32)
+            sizes, extra = face['extra']
+            np.testing.assert_array_equal(sizes,
+                                          [len(x) for x in self.extra])
+            np.testing.assert_array_equal(extra, np.concatenate(self.extra))
+
+    def test_small_windows(self):
+        # records spanning windows, and windows holding a few records
+        window = ply_reader.RECORD_WINDOW
+        try:
+            for ply_reader.RECORD_WINDOW in (1, 5, 64):
+                for data_format in ('ascii', 'binary_big_endian'):
+                    face = PlyReader(
+                        self.write(data_format)).read_elements()['face']
+                    np.testing.assert_array_equal(face['quality'],
+                                                  self.quality)
+                    np.testing.assert_array_equal(
+                        face['vertex_indices'][1], np.concatenate(self.faces))
+                with self.assertRaises(ValueError):
+                    PlyReader(self.write('binary_little_endian',
+                                         truncate=4)).read_elements()
+        finally:
+            ply_reader.RECORD_WINDOW = window
+
+    def test_uniform_list_lengths(self):
+        self.sizes[:] = 3
+        self.faces = [self.rng.randint(40, size=3) for _ in self.faces]
+        self.extra = [np.arange(2) for _ in self.extra]
+        for data_format in ('ascii', 'binary_little_endian'):
+            face = PlyReader(self.write(data_format)).read_elements()['face']
+            np.testing.assert_array_equal(face['vertex_indices'][1],
+                                          np.concatenate(self.faces))
+
+    def test_edges(self):
+        model = PlyReader(self.write('binary_little_endian')).process_file()
+        expected = set()
+        for face in self.faces:
+            for a, b in zip(face, np.roll(face, -1)):
+                if a != b:
+                    expected.add((min(a, b), max(a, b)))
+        self.assertEqual(set(tuple(sorted(edge))
+                             for edge in model.edge_indices.tolist()),
+                         expected)
+
+    def test_truncated(self):
+        for data_format in ('ascii', 'binary_little_endian'):
+            with self.assertRaises(ValueError):
+                PlyReader(self.write(data_format, truncate=4)).read_elements()
+
+
+if __name__ == '__main__':
+    unittest.main()
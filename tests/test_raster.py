@@ -0,0 +1,125 @@
+"""Tests that the NumPy line rasterizer draws the same pixels as
+`pygame.draw.line`.
+"""
+import unittest
+
+import numpy as np
+import pygame
+
+from three_d.raster import LineRasterizer
+
+WIDTH = 64
+HEIGHT = 48
+
+def random_lines(rng, count):
+    """Returns the endpoints of random lines of every kind: steep, shallow,
+    horizontal, vertical, degenerate, and going off the surface.
+    """
+    starts = rng.uniform(-20, WIDTH + 20, (count, 2))
+    ends = rng.uniform(-20, HEIGHT + 20, (count, 2))
+    kinds = rng.randint(6, size=count)
+    ends[kinds == 1, 1] = starts[kinds == 1, 1] # horizontal
+    ends[kinds == 2, 0] = starts[kinds == 2, 0] # vertical
+    ends[kinds == 3] = starts[kinds == 3] # degenerate
+    # steep, within a pixel horizontally
+    ends[kinds == 4, 0] = starts[kinds == 4, 0] + rng.uniform(-1, 1)
+    # far off the surface, within the range of the integers of pygame
+    ends[kinds == 5] *= rng.choice((-1e4, 1e4, 1e6), ((kinds == 5).sum(), 1))
+    return starts, ends
+
+def make_surface():
+    surface = pygame.Surface((WIDTH, HEIGHT), 0, 32)
+    surface.fill(0x102030)
+    return surface
+
+
+class LineRasterizerTest(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.RandomState(10)
+
+    def draw_both(self, starts, ends, colors, clip=None):
+        drawn = make_surface()
+        expected = make_surface()
+        if clip is not None:
+            drawn.set_clip(clip)
+            expected.set_clip(clip)
+        LineRasterizer().draw(drawn, starts, ends, colors)
+        for i in xrange(len(starts)):
+            pygame.draw.line(expected, int(colors[i]), tuple(starts[i]),
+                             tuple(ends[i]))
+        return drawn, expected
+
+    def assert_same_pixels(self, drawn, expected):
+        np.testing.assert_array_equal(pygame.surfarray.array2d(drawn),
+                                      pygame.surfarray.array2d(expected))
+
+    def test_random_lines(self):
+        starts, ends = random_lines(self.rng, 600)
+        colors = self.rng.randint(1, 0xFFFFFF, 600)
+        self.assert_same_pixels(*self.draw_both(starts, ends, colors))
+
+    def test_clip_area(self):
+        starts, ends = random_lines(self.rng, 300)
+        colors = self.rng.randint(1, 0xFFFFFF, 300)
+        self.assert_same_pixels(*self.draw_both(starts, ends, colors,
+                                                clip=(5, 7, 40, 30)))
+
+    def test_special_lines(self):
+        lines = np.array([[0, 0, WIDTH - 1, HEIGHT - 1], # diagonal
+                          [WIDTH - 1, 0, 0, HEIGHT - 1],
+                          [3, 5, 3, 5], # a single pixel
+                          [WIDTH - 1, 2, WIDTH - 1, 20], # on the edges
+                          [0, HEIGHT - 1, 30, HEIGHT - 1],
+                          [-5, 10, WIDTH + 5, 10], # across the surface
+                          [10, -5, 10, HEIGHT + 5],
+                          [-10, -10, -1, -1], # outside
+                          [2.9, 3.9, 40.1, 7.5]], dtype=float)
+        colors = np.arange(1, len(lines) + 1) * 0x1F0F07
+        self.assert_same_pixels(*self.draw_both(lines[:, :2], lines[:, 2:],
+                                                colors))
+
+    def test_depth_test_drops_occluded_lines(self):
+        # a near line drawn first hides the middle of a far one drawn after
+        starts = np.array([[10.0, 20.0], [0.0, 20.0], [15.0, 20.0]])
+        ends = np.array([[40.0, 20.0], [60.0, 20.0], [30.0, 20.0]])
+        depths = np.array([[1.0, 1.0], [2.0, 2.0], [3.0, 3.0]])
+        colors = np.array([0xFF0000, 0x00FF00, 0x0000FF])
+        surface = make_surface()
+        LineRasterizer().draw(surface, starts, ends, colors, depths=depths)
+        row = pygame.surfarray.array2d(surface)[:, 20]
+        self.assertTrue((row[10:41] == 0xFF0000).all())
+        self.assertTrue((row[:10] == 0x00FF00).all())
+        self.assertTrue((row[41:61] == 0x00FF00).all())
+        # the farthest line is entirely hidden
+        self.assertFalse((row == 0x0000FF).any())
+
+    def test_depth_test_random_lines(self):
+        # with a constant depth along every line, the depth test draws the
+        # same pixels as drawing the lines from the farthest to the nearest
+        count = 300
+        starts, ends = random_lines(self.rng, count)
+        colors = self.rng.randint(1, 0xFFFFFF, count)
+        line_depths = self.rng.permutation(count).astype(float)
+        drawn = make_surface()
+        rasterizer = LineRasterizer()
+        rasterizer.draw(drawn, starts, ends, colors,
+                        depths=np.column_stack((line_depths, line_depths)))
+        expected = make_surface()
+        for i in np.argsort(-line_depths):
+            pygame.draw.line(expected, int(colors[i]), tuple(starts[i]),
+                             tuple(ends[i]))
+        self.assert_same_pixels(drawn, expected)
+
+        # the depth buffer is kept until it is cleared
+        rasterizer.draw(drawn, starts, ends, np.zeros(count, dtype=int),
+                        depths=np.column_stack((line_depths, line_depths))
+                        + 0.5)
+        self.assert_same_pixels(drawn, expected)
+        rasterizer.clear_depths()
+        rasterizer.draw(drawn, starts, ends, colors,
+                        depths=np.column_stack((line_depths, line_depths)))
+        self.assert_same_pixels(drawn, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+"""Tests the bounding volume hierarchy of `Scene` against testing every model.
+"""
+import unittest
+
+import numpy as np
+
+from shapes import Cube
+from three_d.mathutil import classify_boxes, homogeneous_clip_planes
+from three_d.scene import Scene
+
+class SceneTest(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.RandomState(8)
+        # a box in world coordinates: -200 <= x, y <= 200, 0 <= z <= 300
+        planes, self.offsets = homogeneous_clip_planes(clip_far=True)
+        to_clip = np.diag((1 / 200.0, 1 / 200.0, 1 / 300.0, 1.0))
+        self.planes = to_clip.T.dot(planes)
+
+    def make_cubes(self, count):
+        return [Cube(position, side=10)
+                for position in self.rng.uniform(-400, 400, (count, 3))]
+
+    def assert_consistent(self, scene):
+        capacity = len(scene._slot_items)
+        for node in xrange(1, capacity):
+            np.testing.assert_array_equal(
+                scene._low[node],
+                np.minimum(scene._low[2 * node], scene._low[2 * node + 1]))
+            np.testing.assert_array_equal(
+                scene._high[node],
+                np.maximum(scene._high[2 * node], scene._high[2 * node + 1]))
+        for index, model in enumerate(scene.models):
+            self.assertEqual(scene._slot_items[scene._slots[index]], index)
+            low, high = model.world_bounds
+            np.testing.assert_array_equal(
+                scene._low[capacity + scene._slots[index]], low)
+        expected = []
+        if scene.models:
+            bounds = [model.world_bounds for model in scene.models]
+            outside, _ = classify_boxes(np.array([low for low, _ in bounds]),
+                                        np.array([high for _, high in bounds]),
+                                        self.planes, self.offsets)
+            expected = np.flatnonzero(~outside)
+        np.testing.assert_array_equal(
+            scene.query_planes(self.planes, self.offsets), expected)
+
+    def test_insert_one_at_a_time(self):
+        scene = Scene()
+        for count, cube in enumerate(self.make_cubes(300), 1):
+            scene.insert(cube)
+            self.assertEqual(len(scene), count)
+            if count in (1, 2, 3, 5, 17, 64, 65, 200):
+                self.assert_consistent(scene)
+        self.assertEqual(len(scene._slot_items), 512)
+        self.assert_consistent(scene)
+
+    def test_grow_keeps_slots(self):
+        scene = Scene(self.make_cubes(8))
+        slots = list(scene._slots)
+        scene._changes = 0
+        scene.insert(self.make_cubes(1)[0])
+        self.assertEqual(len(scene._slot_items), 16)
+        self.assertEqual(scene._slots[:8], slots)
+        self.assertEqual(scene._changes, 1)
+        self.assert_consistent(scene)
+
+    def test_remove_move_and_insert(self):
+        cubes = self.make_cubes(100)
+        scene = Scene(cubes[:50])
+        for cube in cubes[50:]:
+            scene.insert(cube)
+        for cube in cubes[::3]:
+            scene.remove(cube)
+        for cube in cubes[1::3]:
+            cube.position = cube.position + 100.0
+            scene.move(cube)
+        for cube in cubes[::6]:
+            scene.insert(cube)
+        self.assertEqual(len(scene), 100 - len(cubes[::3])
+                         + len(cubes[::6]))
+        self.assert_consistent(scene)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+"""Tests that the bulk parser of text edge files agrees with parsing one line
+at a time with `ShapeReader.parse_line`.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from shape_reader import DEFAULT_COLOR, ShapeReader, parse_lines
+
+POINTS = ['0 0 0', '1.5 -2 3e2', ' 4 5 6 ', '-0.25 +7 .5', '1 2 3 4',
+          '1e-3 2E+4 -5.', 'nan 1 2', 'inf -inf 0', '1\t2 3',
+          '1  2 3', '1 2', '', '1 2 x', '1.2.3 4 5', 'abc 1 2', '- 1 2',
+          '0.' + '1' * 40 + ' 2 3', '1e400 2 3', '1 2 3e', 'e 1 2',
+          '0x10 1 2', '1,5 2 3']
+COLORS = ['#FFF000', ' #abcdef ', '#ABCDEF12', '#FFF', 'FFF000', '',
+          '#GGGGGG', '#123456 trailing', '#a1b2c3']
+OTHERS = ['', '   ', '# a comment', '// comment, with a comma', 'hello',
+          ',', ',,', ',,,', '\r', '#FFF000']
+
+def reference(data):
+    """Parses lines one at a time.
+    """
+    edges = [ShapeReader.parse_line(line) for line in data.split('\n')]
+    edges = [edge for edge in edges if edge is not None]
+    return (np.array([edge[0] for edge in edges]).reshape((-1, 3)),
+            np.array([edge[1] for edge in edges]).reshape((-1, 3)),
+            np.array([edge[2] for edge in edges], dtype=np.uint32))
+
+def random_text(rng, count):
+    lines = []
+    for _ in xrange(count):
+        kind = rng.randint(4)
+        if kind == 0:
+            line = OTHERS[rng.randint(len(OTHERS))]
+        elif kind == 1:
+            line = '{}, {}'.format(POINTS[rng.randint(len(POINTS))],
+                                   POINTS[rng.randint(len(POINTS))])
+        else:
+            line = '{},{}, {}'.format(POINTS[rng.randint(len(POINTS))],
+                                      POINTS[rng.randint(len(POINTS))],
+                                      COLORS[rng.randint(len(COLORS))])
+        if rng.rand() < 0.1:
+            line += '\r'
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+class ParseLinesTest(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.RandomState(16)
+
+    def assert_same_edges(self, parsed, expected):
+        for actual, wanted in zip(parsed, expected):
+            self.assertEqual(actual.shape, wanted.shape)
+            self.assertEqual(actual.dtype, wanted.dtype)
+            np.testing.assert_array_equal(actual, wanted)
+
+    def test_mixed_lines(self):
+        data = random_text(self.rng, 3000)
+        parsed = parse_lines(data)
+        self.assertTrue(0 < len(parsed[0]) < 3000)
+        self.assert_same_edges(parsed, reference(data))
+
+    def test_every_line(self):
+        for point in POINTS:
+            for line in ('{}, 1 2 3'.format(point), '1 2 3, {}'.format(point),
+                         '{}, {}, #102030'.format(point, point)):
+                self.assert_same_edges(parse_lines(line), reference(line))
+        for color in COLORS:
+            line = '1 2 3, 4 5 6, {}'.format(color)
+            self.assert_same_edges(parse_lines(line), reference(line))
+        for line in OTHERS:
+            self.assert_same_edges(parse_lines(line), reference(line))
+
+    def test_only_malformed_lines(self):
+        data = '\n'.join(OTHERS)
+        starts, ends, colors = parse_lines(data)
+        self.assertEqual(starts.shape, (0, 3))
+        self.assertEqual(ends.shape, (0, 3))
+        self.assertEqual(len(colors), 0)
+
+    def test_default_color(self):
+        starts, ends, colors = parse_lines('0 0 0, 1 1 1\n0 0 0, 1 1 1, x')
+        np.testing.assert_array_equal(colors, [DEFAULT_COLOR] * 2)
+
+
+class ReadBatchesTest(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.RandomState(17)
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_chunk_boundaries(self):
+        data = random_text(self.rng, 500)
+        path = os.path.join(self.directory, 'edges.txt')
+        with open(path, 'wb') as f:
+            f.write(data)
+        expected = reference(data)
+        # chunks smaller than a line, and ones cutting lines anywhere
+        for chunk_size in (1, 7, 64, 1000, len(data) - 1, len(data) + 1):
+            batches = list(ShapeReader(path).read_batches(chunk_size))
+            parsed = [np.concatenate([batch[i] for batch in batches])
+                      for i in xrange(3)]
+            for actual, wanted in zip(parsed, expected):
+                np.testing.assert_array_equal(actual, wanted)
+
+    def test_process_file(self):
+        data = random_text(self.rng, 200) + '\n'
+        path = os.path.join(self.directory, 'edges.txt')
+        with open(path, 'wb') as f:
+            f.write(data)
+        model = ShapeReader(path).process_file()
+        starts, ends, colors = reference(data)
+        self.assertEqual(model.num_edges, len(starts))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+"""Tests cubes, which are instances of a shared geometry, against the
+equivalent plain models.
+"""
+import unittest
+
+import numpy as np
+
+from shapes import CUBE_GEOMETRY, Cube
+from three_d.model import IndexedModel
+
+def plain_cube(position, side):
+    return IndexedModel(position, vertices=CUBE_GEOMETRY.vertices * side,
+                        edge_indices=CUBE_GEOMETRY.edge_indices)
+
+
+class CubeTest(unittest.TestCase):
+    def test_side_and_scale(self):
+        cube = Cube(np.array([1.0, 2, 3]), side=10, scale=2)
+        self.assertEqual(cube.side, 10)
+        self.assertEqual(cube.scale, 2)
+        self.assertEqual(cube.geometry.instances.scales[cube.row], 20)
+        plain = plain_cube([1, 2, 3], 20)
+        np.testing.assert_allclose(cube.world_vertices, plain.world_vertices)
+
+    def test_scale_setter(self):
+        cube = Cube(np.zeros(3), side=10, scale=2)
+        cube.world_bounds
+        version = cube.version
+        cube.scale = 3
+        self.assertEqual(cube.scale, 3)
+        self.assertNotEqual(cube.version, version)
+        for corner, expected in zip(cube.world_bounds, (-15, 15)):
+            np.testing.assert_allclose(corner, [expected] * 3)
+        cube *= 2
+        self.assertEqual(cube.scale, 6)
+        np.testing.assert_allclose(cube.world_bounds[1], [30] * 3)
+        self.assertEqual(cube.clone().scale, 6)
+
+    def test_side_setter(self):
+        cube = Cube(np.array([1.0, 2, 3]), side=10, scale=2)
+        version = cube.version
+        cube.side = 4
+        self.assertEqual(cube.side, 4)
+        self.assertEqual(cube.scale, 2)
+        self.assertNotEqual(cube.version, version)
+        plain = plain_cube([1, 2, 3], 8)
+        for cube_corner, plain_corner in zip(cube.world_bounds,
+                                             plain.world_bounds):
+            np.testing.assert_allclose(cube_corner, plain_corner)
+        with self.assertRaises(ValueError):
+            cube.side = 0
+
+    def test_keyword_arguments(self):
+        rotation = np.array([[0.0, -1, 0], [1, 0, 0], [0, 0, 1]])
+        cube = Cube(np.zeros(3), side=2, rotation=rotation)
+        np.testing.assert_array_equal(cube.rotation, rotation)
+        with self.assertRaises(TypeError):
+            Cube(np.zeros(3), vertices=np.zeros((8, 3)))
+
+    def test_model_attributes(self):
+        cube = Cube(np.array([5.0, 0, 0]), color=0x123456, side=3)
+        np.testing.assert_array_equal(cube.vertices, CUBE_GEOMETRY.vertices)
+        np.testing.assert_array_equal(cube.edge_indices,
+                                      CUBE_GEOMETRY.edge_indices)
+        np.testing.assert_array_equal(cube.colors, 0x123456)
+        self.assertEqual(len(cube.lod_levels), len(CUBE_GEOMETRY.lod_levels))
+        self.assertEqual(cube.num_edges, 12)
+        self.assertEqual(len(cube.edges), 12)
+        np.testing.assert_array_equal(cube.bounds[0], [-0.5] * 3)
+        for method in (cube.make_writable, cube.build_lods,
+                       lambda: cube.set_arrays(np.zeros((1, 3)),
+                                               np.ones((1, 3)))):
+            with self.assertRaises(TypeError):
+                method()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+"""Tests that viewports skip repainting exactly when nothing affecting the
+drawing has changed.
+"""
+import unittest
+
+import numpy as np
+import pygame
+
+from three_d.cameras.orthographic import OrthographicViewport
+from three_d.cameras.perspective import PerspectiveViewport
+from three_d.model import IndexedModel, Model
+from three_d.scene import Scene
+
+def random_model(rng, position):
+    return IndexedModel(position, vertices=rng.uniform(-10, 10, (8, 3)),
+                        edge_indices=rng.randint(8, size=(12, 2)),
+                        colors=0xFFFFFF)
+
+
+class RepaintTest(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.RandomState(17)
+        self.models = [random_model(self.rng, [x, 0.0, 100.0])
+                       for x in (-30.0, 0.0, 30.0)]
+        self.view = PerspectiveViewport(pygame.Surface((80, 60)),
+                                        models=self.models)
+        self.assertTrue(self.view.repaint())
+
+    def tearDown(self):
+        self.view.close()
+
+    def assert_repaints(self, change):
+        """Checks that nothing is drawn again until `change` is made, and
+        that it is drawn again once after it.
+        """
+        self.assertFalse(self.view.repaint())
+        change()
+        self.assertTrue(self.view.repaint())
+        self.assertFalse(self.view.repaint())
+
+    def test_unchanged(self):
+        for _ in xrange(3):
+            self.assertFalse(self.view.repaint())
+        # a wireframe that is not drawn
+        random_model(self.rng, np.zeros(3)).position = np.ones(3)
+        self.assertFalse(self.view.repaint())
+        self.assertTrue(self.view.repaint(force=True))
+
+    def test_changed_models(self):
+        changes = [
+            lambda: setattr(self.models[0], 'position', [-30.0, 5.0, 100.0]),
+            lambda: setattr(self.models[1], 'scale', 2.0),
+            lambda: setattr(self.models[1], 'rotation',
+                            [[0.0, -1, 0], [1, 0, 0], [0, 0, 1]]),
+            lambda: setattr(self.models[2].edges[0], 'color', 0xFF0000),
+            lambda: self.models[2].edges[1].start.__setitem__(0, 3.0),
+            lambda: self.models.append(random_model(self.rng,
+                                                    [0.0, 20.0, 100.0])),
+            lambda: self.models.pop(0),
+        ]
+        for change in changes:
+            self.assert_repaints(change)
+
+    def test_changed_camera(self):
+        view = self.view
+        changes = [
+            lambda: view.translate(np.array([0.0, 0.0, 5.0])),
+            lambda: setattr(view, 'eye', np.array([1.0, 0.0, 5.0])),
+            lambda: view.rotate_y(0.1),
+        ]
+        for change in changes:
+            self.assert_repaints(change)
+
+    def test_changed_projection(self):
+        view = self.view
+        changes = [
+            lambda: setattr(view, 'zoom', 2.0),
+            lambda: setattr(view, 'near', 1.0),
+            lambda: setattr(view, 'far', 500.0),
+            lambda: setattr(view, 'center_offset', (5, 0)),
+        ]
+        for change in changes:
+            self.assert_repaints(change)
+
+    def test_changed_options(self):
+        view = self.view
+        changes = [
+            lambda: setattr(view, 'background_color', 0x202020),
+            lambda: setattr(view, 'depth_test', True),
+            lambda: setattr(view, 'fade_distances', (50.0, 200.0)),
+            lambda: setattr(view, 'lod', False),
+            lambda: setattr(view, 'clip', False),
+            lambda: setattr(view, 'workers', 2),
+            lambda: setattr(view, 'workers', 1),
+        ]
+        for change in changes:
+            self.assert_repaints(change)
+
+    def test_scene(self):
+        scene = Scene(self.models)
+        view = OrthographicViewport(pygame.Surface((80, 60)), models=scene)
+        self.assertTrue(view.repaint())
+        self.assertFalse(view.repaint())
+        self.models[0].position = [0.0, 40.0, 100.0]
+        scene.move(self.models[0])
+        self.assertTrue(view.repaint())
+        self.assertFalse(view.repaint())
+        view.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+"""Tests changing wireframes through views of their edges.
+"""
+import unittest
+
+import numpy as np
+
+from three_d.model import IndexedModel, Model
+from three_d.primitives import Edge, Wireframe
+
+class EdgeViewTest(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.RandomState(17)
+        self.model = Model(np.array([10.0, 0, 0]),
+                           starts=self.rng.rand(4, 3),
+                           ends=self.rng.rand(4, 3))
+
+    def test_element_writes(self):
+        world_vertices = self.model.world_vertices.copy()
+        version = self.model.version
+        edge = self.model.edges[1]
+        edge.start[1] = 7
+        self.assertEqual(self.model.starts[1, 1], 7)
+        self.assertNotEqual(self.model.version, version)
+        self.assertEqual(self.model.world_vertices[1, 1], 7)
+        np.testing.assert_array_equal(
+            np.delete(self.model.world_vertices, 1, axis=0),
+            np.delete(world_vertices, 1, axis=0))
+        end = edge.end
+        end[0] += 2
+        self.assertEqual(self.model.ends[1, 0], end[0])
+
+    def test_whole_writes(self):
+        edge = self.model.edges[2]
+        start = edge.start
+        edge.start += 1
+        np.testing.assert_allclose(self.model.starts[2], start + 1)
+        edge.end = [1, 2, 3]
+        np.testing.assert_array_equal(self.model.ends[2], [1, 2, 3])
+        edge.color = 0x123456
+        self.assertEqual(self.model.colors[2], 0x123456)
+        edge *= 2
+        np.testing.assert_allclose(self.model.starts[2], 2 * (start + 1))
+
+    def test_copies(self):
+        start = self.model.edges[0].start
+        derived = start + 1
+        derived[0] = 100
+        self.assertNotEqual(self.model.starts[0, 0], 100)
+        self.assertIs(type(start.view(np.ndarray) * 2), np.ndarray)
+
+    def test_shared_vertex(self):
+        model = IndexedModel(np.zeros(3), vertices=np.eye(3),
+                             edge_indices=[[0, 1], [1, 2]])
+        model.edges[0].end[2] = 5
+        np.testing.assert_array_equal(model.edges[1].start, [0, 1, 5])
+
+    def test_edges(self):
+        wireframe = Wireframe(edges=[Edge(np.zeros(3), np.ones(3), 0xFF)])
+        self.assertEqual(repr(wireframe.edges[0]), repr(
+            Edge(np.zeros(3), np.ones(3), 0xFF)))
+
+
+class CloneTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(17)
+        self.model = Model(np.zeros(3), starts=rng.rand(4, 3),
+                           ends=rng.rand(4, 3))
+        self.starts = self.model.starts.copy()
+
+    def assert_original_mutable(self, other):
+        """Checks that the edges of the model can still be written after it
+        has shared its arrays with `other`, which is left unchanged.
+        """
+        other_starts = other.starts.copy()
+        version = self.model.version
+        edge = self.model.edges[0]
+        edge.start[0] = 1
+        edge.start += 1
+        edge.end = [3, 4, 5]
+        edge.color = 0x123456
+        np.testing.assert_array_equal(self.model.starts[0],
+                                      [2, self.starts[0, 1] + 1,
+                                       self.starts[0, 2] + 1])
+        np.testing.assert_array_equal(self.model.ends[0], [3, 4, 5])
+        self.assertEqual(self.model.colors[0], 0x123456)
+        self.assertNotEqual(self.model.version, version)
+        np.testing.assert_array_equal(other.starts, other_starts)
+        self.assertNotEqual(other.colors[0], 0x123456)
+        # the arrays are no longer shared, so they can be written directly
+        self.model.starts[1] = 0
+
+    def test_clone(self):
+        clone = self.model.clone()
+        self.assert_original_mutable(clone)
+        clone.edges[1].start[2] = 9
+        self.assertEqual(clone.starts[1, 2], 9)
+        np.testing.assert_array_equal(self.model.starts[1], 0)
+
+    def test_binary_operators(self):
+        moved = self.model + np.array([1.0, 0, 0])
+        self.assert_original_mutable(moved)
+        np.testing.assert_allclose(moved.starts,
+                                   self.starts + [1.0, 0, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
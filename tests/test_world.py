@@ -0,0 +1,146 @@
+"""Tests updating packed world geometry incrementally against packing it from
+scratch.
+"""
+import unittest
+
+import numpy as np
+
+from three_d.instancing import SharedGeometry
+from three_d.mathutil import rotation_matrices
+from three_d.model import IndexedModel, Model
+from three_d.world import WorldGeometry
+
+ARRAYS = ('vertices', 'edge_indices', 'colors', 'vertex_offsets',
+          'edge_offsets', 'lod_offsets', 'lod_edge_offsets', 'lod_errors',
+          'bounds_low', 'bounds_high', 'centers', 'radii')
+
+class WorldGeometryTest(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.RandomState(17)
+        self.geometry = SharedGeometry(
+            vertices=self.rng.uniform(-1, 1, (30, 3)),
+            edge_indices=self.rng.randint(30, size=(60, 2)),
+            colors=self.rng.randint(1 << 24, size=60), lods=2)
+        self.models = []
+        for i in xrange(12):
+            if i % 3 == 2:
+                model = self.geometry.instantiate(
+                    self.rng.uniform(-50, 50, 3), scale=self.rng.uniform(1, 3),
+                    color=int(self.rng.randint(1 << 24)) if i % 2 else None)
+            else:
+                model = IndexedModel(
+                    self.rng.uniform(-50, 50, 3),
+                    scale=self.rng.uniform(1, 3),
+                    vertices=self.rng.uniform(-5, 5, (20, 3)),
+                    edge_indices=self.rng.randint(20, size=(40, 2)),
+                    colors=self.rng.randint(1 << 24, size=40))
+                if i % 2:
+                    model.build_lods(2)
+            self.models.append(model)
+        self.world = WorldGeometry(self.models)
+
+    def assert_packed(self, models=None):
+        """Checks the world against one packed from scratch.
+        """
+        models = self.models if models is None else models
+        fresh = WorldGeometry()
+        fresh.pack(list(models))
+        for name in ARRAYS:
+            np.testing.assert_allclose(getattr(self.world, name),
+                                       getattr(fresh, name), atol=1e-9,
+                                       err_msg=name)
+        self.assertEqual(self.world.models, list(models))
+
+    def update(self, models=None, in_place=False):
+        """Updates the world, checking that it has not been packed again from
+        scratch if the models were changed in place.
+        """
+        buffer = self.world.vertices
+        version = self.world.version
+        changed = self.world.update(self.models if models is None else models)
+        self.assertEqual(changed, self.world.version != version)
+        if in_place:
+            self.assertIs(self.world.vertices, buffer)
+        return changed
+
+    def test_unchanged(self):
+        version = self.world.version
+        self.assertFalse(self.world.update(self.models))
+        self.assertEqual(self.world.version, version)
+        # a change to a wireframe that is not packed
+        Model(np.zeros(3), starts=np.zeros((1, 3)), ends=np.ones((1, 3)))
+        self.assertFalse(self.update(in_place=True))
+        self.assert_packed()
+
+    def test_moved_models(self):
+        self.models[0].position = [1.0, 2.0, 3.0]
+        self.models[4].scale = 0.5
+        self.assertTrue(self.update(in_place=True))
+        self.assert_packed()
+        self.models[2].position = [-4.0, 0.0, 9.0]
+        self.models[5].scale = 4.0
+        self.models[8].rotation = rotation_matrices(
+            np.array([[0.3, 0.2, -1.0]]))[0]
+        self.models[11].color = 0x123456
+        self.assertTrue(self.update(in_place=True))
+        self.assert_packed()
+
+    def test_rotated_models(self):
+        model = self.models[3]
+        rotation = rotation_matrices(np.array([[0.5, -0.1, 0.7]]))[0]
+        model.rotation = rotation
+        self.assertTrue(self.update(in_place=True))
+        self.assert_packed()
+        expected = model.vertices.dot(model.scale * rotation.T) \
+                   + model.position
+        np.testing.assert_allclose(
+            self.world.vertices[self.world.vertex_offsets[3]:
+                                self.world.vertex_offsets[4], :3],
+            expected)
+        low, high = self.world.bounds_low[3], self.world.bounds_high[3]
+        self.assertTrue((expected >= low - 1e-9).all()
+                        and (expected <= high + 1e-9).all())
+        # a rotated model packed from scratch
+        self.world = WorldGeometry(self.models)
+        self.assert_packed()
+        np.testing.assert_allclose(
+            self.world.vertices[self.world.vertex_offsets[3]:
+                                self.world.vertex_offsets[4], :3],
+            expected)
+
+    def test_moved_instances_in_bulk(self):
+        instances = self.geometry.instances
+        instances.positions[:] += 10
+        instances.mark_dirty()
+        self.assertTrue(self.update(in_place=True))
+        self.assert_packed()
+
+    def test_edited_geometry(self):
+        # the same sizes, repacked in place
+        self.models[1].edges[3].start = [7.0, 7.0, 7.0]
+        self.models[3].transform(np.diag([2.0, 1.0, 1.0, 1.0]))
+        self.assertTrue(self.update(in_place=True))
+        self.assert_packed()
+        # other sizes, which repack everything
+        self.models[6].set_indexed_arrays(self.rng.rand(5, 3),
+                                          [[0, 1], [1, 2], [3, 4]])
+        self.assertTrue(self.update())
+        self.assert_packed()
+        self.models[0].build_lods(3)
+        self.assertTrue(self.update())
+        self.assert_packed()
+
+    def test_added_and_removed_models(self):
+        models = self.models + [self.geometry.instantiate([0.0, 0.0, 60.0])]
+        self.assertTrue(self.update(models))
+        self.assert_packed(models)
+        del models[3]
+        del models[1]
+        self.assertTrue(self.update(models))
+        self.assert_packed(models)
+        self.assertTrue(self.update([]))
+        self.assert_packed([])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+"""Contains a renderer drawing several viewports of the same models.
+"""
+from three_d.parallel import ParallelRenderer
+from three_d.profiling import FrameProfiler
+from three_d.world import WorldGeometry
+
+def split_surface(surface, rows, columns):
+    """Splits a surface into a grid of subsurfaces, e.g. one for each view of
+    a `MultiViewRenderer`.
+
+    Parameters
+    ----------
+    surface : pygame surface
+    rows, columns : int
+
+    Returns
+    -------
+    list of pygame surface
+        the cells of the grid, row by row, which cover the whole surface
+    """
+    width, height = surface.get_size()
+    cells = []
+    for row in xrange(rows):
+        top = row * height // rows
+        bottom = (row + 1) * height // rows
+        for column in xrange(columns):
+            left = column * width // columns
+            right = (column + 1) * width // columns
+            cells.append(surface.subsurface((left, top, right - left,
+                                             bottom - top)))
+    return cells
+
+
+class MultiViewRenderer(object):
+    """Draws several viewports (e.g. on subsurfaces of one window, c.f.
+    `split_surface`) of the same models.
+
+    The views share a single `WorldGeometry`, so that the models are packed
+    into world space, the hierarchy of a `Scene` is refit, and the bounding
+    spheres of the models are computed only once per frame for all views.
+    Each view then only repeats the stages that depend on its camera: culling,
+    choosing the levels of detail, projection, clipping, and rasterization.
+    With several workers, the views also share one pool of worker processes
+    and a single copy of the geometry in shared memory.
+
+    Parameters
+    ----------
+    views : iterable of Viewport
+        the views, whose models, world geometry, and profiler are replaced by
+        those of this renderer
+    models : iterable of Model or Scene, optional
+    profiler : FrameProfiler, optional
+        The profiler to time the stages of drawing all views with. Default is
+        a disabled one.
+    workers : int, optional
+        The number of worker processes drawing each view (c.f.
+        `Viewport.workers`). Default is 1, which draws in this process.
+
+    Attributes
+    ----------
+    views : list of Viewport
+    models : iterable of Model or Scene
+    world : WorldGeometry
+    profiler : FrameProfiler
+    workers : int
+    renderer : ParallelRenderer or None
+        the pool of worker processes shared by the views, once started
+    """
+    def __init__(self, views, models=None, profiler=None, workers=1):
+        self.views = []
+        self._models = models if models is not None else []
+        self.world = WorldGeometry()
+        self.profiler = profiler if profiler is not None \
+                        else FrameProfiler(enabled=False)
+        self.workers = workers
+        self.renderer = None
+        for view in views:
+            self.add_view(view)
+
+    @property
+    def models(self):
+        """The models drawn by every view.
+        """
+        return self._models
+
+    @models.setter
+    def models(self, models):
+        self._models = models
+        for view in self.views:
+            view.models = models
+
+    def add_view(self, view):
+        """Makes a viewport draw the models of this renderer.
+
+        Parameters
+        ----------
+        view : Viewport
+        """
+        view.close()
+        view.models = self._models
+        view.world = self.world
+        view.profiler = self.profiler
+        view.workers = self.workers
+        if self.workers > 1:
+            if self.renderer is None:
+                self.renderer = ParallelRenderer(self.workers)
+            view.renderer = self.renderer
+        self.views.append(view)
+
+    def remove_view(self, view):
+        """Stops drawing a viewport, which keeps the models but gets world
+        geometry of its own.
+
+        Parameters
+        ----------
+        view : Viewport
+        """
+        self.views.remove(view)
+        view.world = WorldGeometry()
+        view.renderer = None
+
+    def repaint(self, force=False):
+        """Brings the shared world geometry up to date with the models, then
+        draws every view whose drawing has changed since its last repaint
+        (c.f. `Viewport.repaint`).
+
+        Parameters
+        ----------
+        force : bool, optional
+            Whether to draw every view even if nothing has changed. Default is
+            `False`.
+
+        Returns
+        -------
+        list of bool
+            whether each view has been drawn
+        """
+        profiler = self.profiler
+        profiler.mark()
+        changed = self.world.update(self._models)
+        profiler.lap('world')
+        return [view.repaint_view(changed or force) for view in self.views]
+
+    def close(self):
+        """Stops the worker processes shared by the views, if started.
+        """
+        for view in self.views:
+            view.renderer = None
+        if self.renderer is not None:
+            self.renderer.close()
+            self.renderer = None
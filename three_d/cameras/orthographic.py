@@ -25,7 +25,7 @@ class OrthographicViewport(Viewport):
         l = -w / 2 - dx
         t = h / 2 - dy
         b = -h / 2 - dy
-        self._projection_matrix = np.matrix([
+        self._projection_matrix = np.array([
             [2.0 / w, 0,     0,          -(r + l) / w],
             [0,       2 / h, 0,          -(t + b) / h],
             [0,       0,     1 / (f - n), n / (n - f)],
@@ -33,8 +33,8 @@ class OrthographicViewport(Viewport):
 
     def to_view_coords(self, projected_points):
         view = np.empty((projected_points.shape[0], 2))
-        view[:, 0] = self.width * projected_points[:, 0].getA1()
+        np.multiply(projected_points[:, 0], self.width, out=view[:, 0])
         view[:, 0] += self.center_offset[0] + self.width / 2
-        view[:, 1] = self.height * projected_points[:, 1].getA1()
+        np.multiply(projected_points[:, 1], self.height, out=view[:, 1])
         view[:, 1] += self.center_offset[1] + self.height / 2
         return view
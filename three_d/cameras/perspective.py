@@ -50,16 +50,16 @@ class PerspectiveViewport(Viewport):
         t = h / 2 - dy
         b = -h / 2 - dy
         if self.far == float('inf'):
-            self._projection_matrix = np.matrix([
+            self._projection_matrix = np.array([
             [2.0 / w, 0,         -(l + r) / w, 0],
             [0,           2 / h, -(t + b) / h, 0],
-            [0,           0,     1,            n],
+            [0,           0,     1,            -n],
             [0,           0,     1,            0]])
         else:
             p = f - n
             # focal_length = 1.0 / math.tan(self.vertical_fov_rad * 0.5 / self.zoom)
             # aspect_ratio = self.width / self.height
-            self._projection_matrix = np.matrix([
+            self._projection_matrix = np.array([
             [2.0 / w, 0,         -(l + r) / w, 0],
             [0,           2 / h, -(t + b) / h, 0],
             [0,           0,     f / p,        -n * f / p],
@@ -68,11 +68,16 @@ class PerspectiveViewport(Viewport):
 
     def to_view_coords(self, projected_points):
         view = np.empty((projected_points.shape[0], 2))
-        view[:, (0, 1)] = (self.height / 2) * projected_points[:, (0, 1)]
+        np.multiply(projected_points[:, :2], self.height / 2, out=view)
         view[:, 0] += self.width / 2 + self.center_offset[0]
         view[:, 1] += self.height / 2 + self.center_offset[1]
         return view
 
+    def to_depths(self, distances):
+        # the reciprocal distance varies linearly across the view, and orders
+        # points like their projected z / w, which is constant if `near` is 0
+        return -1.0 / distances
+
     @property
     def vertical_fov_rad(self):
         """The vertical field-of-view in radians.
@@ -1,23 +1,42 @@
 """Contains the base class for all three-dimensional viewports."""
 from __future__ import division
 
-import logging
-import math
 import numpy as np
 import pygame
-import time
 
 from abc import ABCMeta, abstractmethod
-from three_d.mathutil import perspective_division, clip_4d_liang_barsky
-from itertools import chain, izip
+import copy
+from three_d.mathutil import (perspective_division, homogeneous_clip_planes,
+                               outcodes_4d, clip_4d_liang_barsky_batch,
+                               boxes_outside_planes, rotate_in_plane,
+                               cross_into)
+from three_d.parallel import ParallelRenderer
+from three_d.profiling import FrameProfiler
+from three_d.raster import LineRasterizer
+from three_d.scene import Scene
+from three_d.scratch import ScratchArrays
+from three_d.world import WorldGeometry
+from itertools import izip
+
+class SurfaceSize(object):
+    """Stands in for the surface of a detached viewport (c.f.
+    `Viewport.detached_copy`), which only needs its size.
+    """
+    def __init__(self, size, clip):
+        self._size = tuple(size)
+        self._clip = pygame.Rect(clip)
+
+    def get_size(self):
+        return self._size
+
+    def get_width(self):
+        return self._size[0]
+
+    def get_height(self):
+        return self._size[1]
 
-def timed(f):
-  def wrapper(*args):
-      now = time.clock()
-      result = f(*args)
-      logging.log(1, '{}: {}'.format(f.__name__, time.clock() - now))
-      return result
-  return wrapper
+    def get_clip(self):
+        return self._clip
 
 
 class Viewport(object):
@@ -38,7 +57,39 @@ class Viewport(object):
     up : numpy array, optional
         Defaults to (0, 1, 0).
     zoom : float, optional
-    models : iterable of Model, optional
+    models : iterable of Model or Scene, optional
+    clip : bool, optional
+        Whether to clip the edges against the view volume. Default is `True`.
+    cull : bool, optional
+        Whether to skip the models whose bounding boxes lie outside the view
+        volume before doing any per-edge work. Default is `True`.
+    lod : bool, optional
+        Whether to draw models at the coarsest level of detail (c.f.
+        `Wireframe.build_lods`) that is off by at most `lod_pixel_error`
+        pixels, and models smaller than `min_pixel_size` pixels as a single
+        point. Default is `True`.
+    lod_pixel_error : float, optional
+        Default is 1 pixel.
+    min_pixel_size : float, optional
+        Default is 1 pixel.
+    batch_draw : bool, optional
+        Whether to draw all edges at once with a `LineRasterizer` instead of
+        calling `pygame.draw.line` for each edge; both draw the same pixels.
+        Default is `True`.
+    depth_test : bool, optional
+        Whether to hide the parts of edges behind other edges with a depth
+        buffer (requires `batch_draw`). Default is `False`.
+    fade_distances : tuple of float, optional
+        The distances from the eye along the look direction between which
+        edges fade from their colors into the background color (requires
+        `batch_draw`). Default is no fading.
+    profiler : FrameProfiler, optional
+        The profiler to time the stages of drawing with. Default is a disabled
+        one.
+    workers : int, optional
+        The number of worker processes to draw with (requires `batch_draw`),
+        which draw the same pixels as a single process does (c.f.
+        `ParallelRenderer`). Default is 1, which draws in this process.
 
     Attributes
     ----------
@@ -55,120 +106,700 @@ class Viewport(object):
     strafe_dir
     zoom : float
     projection_matrix
-    models : iterable of Model
+    models : iterable of Model or Scene
+    clip : bool
+    cull : bool
+    lod : bool
+    lod_pixel_error : float
+    min_pixel_size : float
+    batch_draw : bool
+    depth_test : bool
+    fade_distances : tuple of float or None
+    world : WorldGeometry
+        the packed world-space geometry of `models`, kept between frames
+    rasterizer : LineRasterizer
+    profiler : FrameProfiler
+    workers : int
+    renderer : ParallelRenderer or None
+        the pool of worker processes, once started
+    scratch : ScratchArrays
+        the buffers of the arrays computed anew every frame
     """
     __metaclass__ = ABCMeta
 
     def __init__(self, surface, background_color=0x000000, eye=None,
                  center_offset=(0, 0), near=0, far=float('inf'), look_dir=None,
-                 up_dir=None, zoom=1.0, models=None):
+                 up_dir=None, zoom=1.0, models=None, clip=True, cull=True,
+                 lod=True, lod_pixel_error=1.0, min_pixel_size=1.0,
+                 batch_draw=True, depth_test=False, fade_distances=None,
+                 profiler=None, workers=1):
         self._surface = surface
         self.background_color = background_color
         self.eye = eye if eye is not None else np.array([0.0, 0.0, 0.0])
         self.center_offset = center_offset
         self.near = near
         self.far = far
-        self._look_dir = look_dir or np.array([0.0, 0.0, 1.0])
+        # copies, which are rotated in place
+        self._look_dir = np.array(look_dir if look_dir is not None
+                                  else (0.0, 0.0, 1.0), dtype=float)
         self._look_dir /= np.linalg.norm(self._look_dir)
-        self._up_dir = up_dir or np.array([0.0, 1.0, 0.0])
+        self._up_dir = np.array(up_dir if up_dir is not None
+                                else (0.0, 1.0, 0.0), dtype=float)
         self._up_dir /= np.linalg.norm(self._up_dir)
         self._strafe_dir = np.cross(self.look_dir, self.up_dir)
         self.zoom = zoom
         self.models = models if models is not None else []
+        self.clip = clip
+        self.cull = cull
+        self.lod = lod
+        self.lod_pixel_error = lod_pixel_error
+        self.min_pixel_size = min_pixel_size
+        self.batch_draw = batch_draw
+        self.depth_test = depth_test
+        self.fade_distances = fade_distances
+        self.world = WorldGeometry()
+        self.rasterizer = LineRasterizer()
+        self.profiler = profiler if profiler is not None \
+                        else FrameProfiler(enabled=False)
+        self.workers = workers
+        self.renderer = None
+        self.scratch = ScratchArrays()
+        self._last_view_state = None
+        # the matrices of the camera, which are only recomputed when the eye,
+        # the orientation, or the projection have changed: the world to
+        # camera matrix, and the world to clip matrix followed by the row of
+        # the distances from the eye along the look direction
+        self._world_to_camera = np.identity(4)
+        self._transforms = np.empty((5, 4))
+        self._world_to_clip = self._transforms[:4]
+        self._camera_eye = None
+        self._transform_projection = None
         self._projection_matrix = None
+        self._projection_parameters = self.get_projection_parameters()
         self.update_projection_matrix()
 
     @abstractmethod
     def update_projection_matrix(self):
         """Updates the projection matrix (`self._projection_matrix`) of this
-        viewport. Should be called when the view parameters are changed.
+        viewport, which must be assigned a new array. Called when the
+        projection parameters (c.f. `get_projection_parameters`) have changed.
         """
         pass
 
-    @timed
-    def repaint(self):
+    def get_projection_parameters(self):
+        """Returns the parameters of the projection, which is recomputed
+        whenever they have changed. Subclasses whose projections depend on
+        other parameters must extend them.
+
+        Returns
+        -------
+        tuple
+        """
+        return (self.surface.get_size(), self.near, self.far,
+                tuple(self.center_offset), self.zoom)
+
+    def repaint(self, force=False):
+        """Draws the models on the surface, unless neither the models nor
+        anything else affecting the drawing (c.f. `get_view_state`) has
+        changed since the last repaint, in which case the surface is left
+        with the last frame.
+
+        Parameters
+        ----------
+        force : bool, optional
+            Whether to draw even if nothing has changed, e.g., because
+            something else has been drawn on the surface. Default is `False`.
+
+        Returns
+        -------
+        bool
+            whether the surface has been drawn
+        """
+        profiler = self.profiler
+        profiler.mark()
+        changed = self.world.update(self.models)
+        profiler.lap('world')
+        return self.repaint_view(changed or force)
+
+    def repaint_view(self, force=False):
+        """Draws the packed geometry of the models (`world`) as it is, unless
+        nothing affecting the drawing (c.f. `get_view_state`) has changed
+        since the last repaint. Unlike `repaint`, does not bring `world` up to
+        date with the models first.
+
+        Parameters
+        ----------
+        force : bool, optional
+            Whether to draw even if the view has not changed, e.g., because
+            the packed geometry has. Default is `False`.
+
+        Returns
+        -------
+        bool
+            whether the surface has been drawn
+        """
+        state = self.get_view_state()
+        if not force and state == self._last_view_state:
+            return False
+        self._last_view_state = state
+        self.draw()
+        return True
+
+    def draw(self):
+        """Draws the packed geometry of the models (`world`) on the surface.
+        """
+        profiler = self.profiler
+        profiler.mark()
         self.surface.fill(self.background_color)
+        profiler.lap('raster')
+        world = self.world
+        profiler.count('models', len(world.models))
+        if len(world.edge_indices) == 0:
+            return
 
         world_to_camera = self.get_world_to_camera_matrix()
-        transform = self.projection_matrix * world_to_camera
+        transform = self.get_world_to_clip_matrix()
+
+        if self.workers > 1 and self.batch_draw:
+            self.draw_parallel(world, world_to_camera, transform)
+            return
+
+        vertices, indices, colors = self.select_geometry(world, transform)
+        profiler.lap('cull')
+        profiler.count('edges', len(indices))
+        if len(indices) == 0:
+            return
+
+        view_starts, view_ends, colors, depths, shades, _ = \
+            self.project_edges(vertices, indices, colors, world_to_camera,
+                               transform)
+        profiler.count('drawn edges', len(colors))
+
+        if self.batch_draw:
+            self.rasterizer.clear_depths()
+            self.rasterizer.draw(self.surface, view_starts, view_ends, colors,
+                                 depths, shades, self.background_color)
+            profiler.lap('raster')
+            return
+        colors = colors.astype(int).tolist()
+        for start, end, color in izip(view_starts, view_ends, colors):
+            pygame.draw.line(self.surface, color, start, end, 1)
+        profiler.lap('raster')
+
+    def draw_parallel(self, world, world_to_camera, transform):
+        """Draws the packed geometry of the models with the worker processes
+        of `renderer`, which is started on first use.
+        """
+        profiler = self.profiler
+        visible, levels, points, point_colors = \
+            self.select_models(world, transform)
+        edge_starts, edge_counts = world.edge_ranges(visible, levels)
+        profiler.lap('cull')
+        profiler.count('edges', edge_counts.sum() + len(points))
+        if self.renderer is None:
+            self.renderer = ParallelRenderer(self.workers)
+        drawn = self.renderer.draw(self, world, edge_starts, edge_counts,
+                                   points, point_colors, world_to_camera,
+                                   transform)
+        profiler.count('drawn edges', drawn)
+
+    def close(self):
+        """Stops the worker processes of `renderer`, if started.
+        """
+        if self.renderer is not None:
+            self.renderer.close()
+            self.renderer = None
+
+    def project_edges(self, vertices, edge_indices, colors, world_to_camera,
+                      transform):
+        """Transforms edges to view coordinates: projects their vertices,
+        clips them (if `clip` is set), and computes the depths and shades of
+        their endpoints (if needed by `depth_test` and `fade_distances`).
+
+        Parameters
+        ----------
+        vertices : numpy array (of shape (V, 4))
+            the vertices in homogeneous world coordinates
+        edge_indices : numpy array (of shape (N, 2)) of int
+        colors : numpy array (of shape (N,))
+        world_to_camera : numpy array (of shape (4, 4))
+        transform : numpy array (of shape (4, 4))
+            the matrix transforming world coordinates to clip coordinates
+
+        Returns
+        -------
+        view_starts, view_ends : numpy array (of shape (M, 2))
+            the endpoints of the visible edges in view coordinates
+        colors : numpy array (of shape (M,))
+        depths, shades : numpy array (of shape (M, 2)) or None
+            as taken by `LineRasterizer.draw`
+        num_unclipped : int
+            the number of visible edges that were not clipped, which come
+            before the clipped ones
+
+        The returned arrays may be buffers of `scratch`, which are only valid
+        until the next call.
+        """
+        profiler = self.profiler
+        shaded = self.batch_draw and (self.depth_test
+                                      or self.fade_distances is not None)
+        if shaded:
+            # carry the distance of every vertex from the eye through clipping
+            # and division as an attribute
+            if transform is self._world_to_clip:
+                transform = self._transforms
+            else:
+                transform = np.vstack((transform, world_to_camera[2]))
+
+        # the whole scene goes through a single transform, division, and view
+        # mapping pass; every distinct vertex is transformed exactly once and
+        # the edges are gathered by index afterwards
+        proj_vertices = np.dot(vertices, transform.T,
+                               out=self.scratch.get(
+                                   'projected',
+                                   (len(vertices), len(transform))))
+        profiler.lap('projection')
+
+        if self.clip:
+            view_starts, view_ends, colors, num_unclipped = \
+                self.clip_edges(proj_vertices, edge_indices, colors)
+        else:
+            valid = perspective_division(proj_vertices)
+            if not valid.all():
+                # edges reaching behind the eye cannot be projected without
+                # clipping
+                visible = valid[edge_indices].all(axis=1)
+                edge_indices = edge_indices[visible]
+                colors = colors[visible]
+            profiler.lap('divide')
+            view_vertices = self.to_view_points(
+                proj_vertices, out=self.scratch.get(
+                    'view', (len(proj_vertices), len(transform) - 2)))
+            view_starts = self.gather_rows(view_vertices, edge_indices[:, 0],
+                                           'view_starts')
+            view_ends = self.gather_rows(view_vertices, edge_indices[:, 1],
+                                         'view_ends')
+            num_unclipped = len(colors)
+            profiler.lap('view')
+
+        depths = shades = None
+        if shaded:
+            distances = self.scratch.get('distances', (len(colors), 2))
+            distances[:, 0] = view_starts[:, 2]
+            distances[:, 1] = view_ends[:, 2]
+            if self.depth_test:
+                depths = self.to_depths(distances)
+            if self.fade_distances is not None:
+                near, far = self.fade_distances
+                shades = np.clip((far - distances) / (far - near), 0, 1)
+        return (view_starts[:, :2], view_ends[:, :2], colors, depths, shades,
+                num_unclipped)
+
+    def get_view_state(self):
+        """Returns a snapshot of everything besides the models that affects
+        the drawing: the camera, the projection, the surface size, and the
+        drawing options, including the number of worker processes. Two
+        snapshots compare equal if and only if nothing has changed in
+        between.
+
+        Returns
+        -------
+        tuple
+        """
+        return (np.asarray(self.eye, dtype=float).tobytes(),
+                self.look_dir.tobytes(), self.up_dir.tobytes(),
+                self.strafe_dir.tobytes(),
+                self.projection_matrix.tobytes(),
+                tuple(self.center_offset), self.near, self.far, self.zoom,
+                self.surface.get_size(), self.background_color, self.clip,
+                self.cull, self.lod, self.lod_pixel_error,
+                self.min_pixel_size, self.batch_draw, self.depth_test,
+                self.fade_distances, self.workers)
+
+    def detached_copy(self):
+        """Copies the camera and drawing options of this viewport, but not its
+        surface (only its size and clip area), models, or buffers, so that the
+        copy can be sent to other processes to do per-edge work.
+
+        Returns
+        -------
+        Viewport
+        """
+        detached = copy.copy(self)
+        detached._surface = SurfaceSize(self.surface.get_size(),
+                                        self.surface.get_clip())
+        detached.models = []
+        detached.world = None
+        detached.rasterizer = None
+        detached.renderer = None
+        detached.scratch = ScratchArrays()
+        detached.profiler = FrameProfiler(enabled=False)
+        return detached
+
+    def gather_rows(self, array, indices, name):
+        """Gathers rows of an array into a buffer of `scratch`.
+
+        Parameters
+        ----------
+        array : numpy array
+        indices : numpy array of int
+            valid, non-negative row indices
+        name : str
+            the name of the buffer
+
+        Returns
+        -------
+        numpy array
+        """
+        out = self.scratch.get(name, (len(indices),) + array.shape[1:],
+                               array.dtype)
+        # unlike the default mode, does not gather into a temporary array
+        return np.take(array, indices, axis=0, out=out, mode='clip')
+
+    def select_geometry(self, world, transform):
+        """Gathers the geometry to draw (c.f. `select_models`).
+
+        Parameters
+        ----------
+        world : WorldGeometry
+        transform : numpy array (of shape (4, 4))
+            the matrix transforming world coordinates to clip coordinates
+
+        Returns
+        -------
+        vertices : numpy array (of shape (V, 4))
+        edge_indices : numpy array (of shape (N, 2)) of int
+            the vertex indices of each edge, referring to `vertices`
+        colors : numpy array (of shape (N,))
+        """
+        visible, levels, points, point_colors = \
+            self.select_models(world, transform)
+        vertices, edge_indices, colors = world.select(visible, levels)
+        if not len(points):
+            return vertices, edge_indices, colors
+
+        # draw each small model as a degenerate edge at its center
+        point_indices = np.arange(len(vertices), len(vertices) + len(points))
+        return (np.concatenate((vertices, points)),
+                np.concatenate((edge_indices,
+                                np.repeat(point_indices[:, np.newaxis], 2,
+                                          axis=1))),
+                np.concatenate((colors, point_colors)))
+
+    def select_models(self, world, transform):
+        """Selects the models to draw: culls the models out of view (if
+        `cull` is set), and chooses the level of detail of each remaining
+        model from its size on the surface, drawing the models smaller than
+        `min_pixel_size` as a single point (if `lod` is set).
+
+        Parameters
+        ----------
+        world : WorldGeometry
+        transform : numpy array (of shape (4, 4))
+            the matrix transforming world coordinates to clip coordinates
 
-        for obj in self.models:
-            world_starts, world_ends = \
-                Viewport.get_world_endpoints(obj.edges, obj.position, obj.scale)
+        Returns
+        -------
+        visible : numpy array of int or None
+            the indices of the models in `world.models` to draw as edges, or
+            `None` for all of them
+        levels : numpy array of int or None
+            the level of detail of each of them, or `None` for the full
+            detail
+        points : numpy array (of shape (S, 4))
+            the centers of the models to draw as points, in homogeneous
+            world coordinates
+        point_colors : numpy array (of shape (S,))
+            the color of each point, which is that of the first edge of its
+            model
+        """
+        no_points = np.empty((0, 4)), np.empty(0, dtype=world.colors.dtype)
+        visible = self.cull_models(world, transform) if self.cull else None
+        if not self.lod:
+            return (visible, None) + no_points
+        if visible is None:
+            visible = np.arange(len(world.models))
+
+        centers = world.centers[visible]
+        radii = world.radii[visible]
+        pixel_scales = self.get_pixel_scales(centers, radii, transform)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            levels = world.choose_levels(visible,
+                                         self.lod_pixel_error / pixel_scales)
+            small = 2.0 * radii * pixel_scales < self.min_pixel_size
+        if not small.any():
+            return (visible, levels) + no_points
+
+        point_models = small & (world.edge_offsets[visible + 1]
+                                > world.edge_offsets[visible])
+        points = np.empty((point_models.sum(), 4))
+        points[:, :3] = centers[point_models]
+        points[:, 3] = 1.0
+        return (visible[~small], levels[~small], points,
+                world.colors[world.edge_offsets[visible[point_models]]])
+
+    def cull_models(self, world, transform):
+        """Finds the models whose bounding boxes do not lie outside the view
+        volume. If `models` is a `Scene`, its hierarchy is traversed instead
+        of testing every model.
+
+        Parameters
+        ----------
+        world : WorldGeometry
+        transform : numpy array (of shape (4, 4))
+            the matrix transforming world coordinates to clip coordinates
 
-            if len(world_starts) == 0 or len(world_ends) == 0:
-                continue
+        Returns
+        -------
+        numpy array of int or None
+            the indices of the models in `world.models`, or `None` if all of
+            them are in view
+        """
+        planes, offsets = self.get_frustum_planes(transform)
+        if isinstance(self.models, Scene):
+            return self.models.query_planes(planes, offsets)
+        outside = boxes_outside_planes(world.bounds_low, world.bounds_high,
+                                       planes, offsets)
+        if not outside.any():
+            return None
+        return np.flatnonzero(~outside)
+
+    def get_pixel_scales(self, centers, radii, transform):
+        """Estimates how many pixels a unit of length in the world covers on
+        the surface near spheres, at their points closest to the eye.
+
+        Parameters
+        ----------
+        centers : numpy array (of shape (M, 3))
+        radii : numpy array (of shape (M,))
+        transform : numpy array (of shape (4, 4))
+            the matrix transforming world coordinates to clip coordinates
+
+        Returns
+        -------
+        numpy array (of shape (M,))
+            the number of pixels per unit of length, which is infinite for the
+            spheres reaching behind the eye
+        """
+        scratch = self.scratch
+        points = scratch.get('sphere_points', (len(centers), 4))
+        np.multiply(radii[:, np.newaxis], self.look_dir, out=points[:, :3])
+        np.subtract(centers, points[:, :3], out=points[:, :3])
+        points[:, 3] = 1.0
+        near = np.dot(points, transform.T,
+                      out=scratch.get('sphere_near', (len(centers), 4)))
+        points[:, :3] += self.up_dir
+        above = np.dot(points, transform.T,
+                       out=scratch.get('sphere_above', (len(centers), 4)))
+        valid = perspective_division(near) & perspective_division(above)
+        scales = np.linalg.norm(self.to_view_coords(above)
+                                - self.to_view_coords(near), axis=1)
+        scales[~valid] = np.inf
+        return scales
+
+    def get_frustum_planes(self, transform=None):
+        """Computes the planes bounding the part of the world visible on the
+        surface.
 
-            proj_starts = transform * world_starts.T
-            proj_ends = transform * world_ends.T
-            proj_starts = proj_starts.T
-            proj_ends = proj_ends.T
+        Parameters
+        ----------
+        transform : numpy array (of shape (4, 4)), optional
+            the matrix transforming world coordinates to clip coordinates.
+            Default is the current one of this viewport.
 
-            # visible = (clip_4d_liang_barsky(self.near, self.far,
-            #                                 start.getA1(),
-            #                                 end.getA1())
-            #            for start, end in izip(proj_starts, proj_ends))
-            # visible = np.fromiter(visible, dtype=bool)
-            # proj_starts = proj_starts[visible]
-            # proj_ends = proj_ends[visible]
-            # colors = (edge.color
-            #           for i, edge in enumerate(obj.edges) if visible[i])
+        Returns
+        -------
+        planes, offsets : numpy array
+            the planes in world coordinates, in the form returned by
+            `homogeneous_clip_planes`
+        """
+        if transform is None:
+            transform = self.get_world_to_clip_matrix()
+        xmin, xmax, ymin, ymax = self.get_clip_bounds(margin=1)
+        planes, offsets = homogeneous_clip_planes(
+            xmin, xmax, ymin, ymax, clip_far=self.far != float('inf'))
+        return transform.T.dot(planes), offsets
+
+    def clip_edges(self, proj_vertices, edge_indices, colors):
+        """Clips the edges against the view volume and maps the visible parts
+        to view coordinates. Edges entirely inside the view volume share the
+        division and view mapping of their vertices; only the edges crossing
+        its boundary are clipped individually.
 
-            colors = (edge.color for edge in obj.edges)
+        Parameters
+        ----------
+        proj_vertices : numpy array (of shape (V, 4 + A))
+            the vertices in homogeneous clip coordinates, optionally followed
+            by `A` attributes, which are interpolated along the clipped edges;
+            they are divided in place
+        edge_indices : numpy array (of shape (N, 2)) of int
+        colors : numpy array (of shape (N,))
 
-            perspective_division(proj_starts)
-            perspective_division(proj_ends)
+        Returns
+        -------
+        view_starts, view_ends : numpy array (of shape (M, 2 + A))
+            the endpoints of the visible edges in view coordinates, followed
+            by their attributes
+        colors : numpy array (of shape (M,))
+            the colors of the visible edges
+        num_unclipped : int
+            the number of edges entirely inside the view volume, which come
+            first, in their order
+        """
+        xmin, xmax, ymin, ymax = self.get_clip_bounds()
+        planes, offsets = homogeneous_clip_planes(
+            xmin, xmax, ymin, ymax, clip_far=self.far != float('inf'))
+        # the attributes do not bound the view volume
+        planes = np.concatenate((planes,
+                                 np.zeros((proj_vertices.shape[1] - 4,
+                                           len(offsets)))))
+        codes = outcodes_4d(proj_vertices, planes, offsets)
+        start_codes = codes[edge_indices[:, 0]]
+        end_codes = codes[edge_indices[:, 1]]
+        inside = (start_codes | end_codes) == 0
+        partial = np.flatnonzero(~inside & ((start_codes & end_codes) == 0))
+
+        visible, clipped_starts, clipped_ends = clip_4d_liang_barsky_batch(
+            proj_vertices[edge_indices[partial, 0]],
+            proj_vertices[edge_indices[partial, 1]], planes, offsets)
+        self.profiler.lap('clip')
+        perspective_division(clipped_starts)
+        perspective_division(clipped_ends)
+
+        perspective_division(proj_vertices)
+        self.profiler.lap('divide')
+        scratch = self.scratch
+        width = proj_vertices.shape[1] - 2
+        view_vertices = self.to_view_points(
+            proj_vertices, out=scratch.get('view', (len(proj_vertices), width)))
+        inside_indices = edge_indices[inside]
+
+        # the unclipped edges come first, followed by the clipped ones
+        num_inside = len(inside_indices)
+        num_visible = num_inside + len(clipped_starts)
+        view_starts = scratch.get('view_starts', (num_visible, width))
+        view_ends = scratch.get('view_ends', (num_visible, width))
+        np.take(view_vertices, inside_indices[:, 0], axis=0,
+                out=view_starts[:num_inside], mode='clip')
+        np.take(view_vertices, inside_indices[:, 1], axis=0,
+                out=view_ends[:num_inside], mode='clip')
+        self.to_view_points(clipped_starts, out=view_starts[num_inside:])
+        self.to_view_points(clipped_ends, out=view_ends[num_inside:])
+        visible_colors = scratch.get('colors', num_visible, colors.dtype)
+        np.compress(inside, colors, out=visible_colors[:num_inside])
+        np.take(colors, partial[visible], out=visible_colors[num_inside:],
+                mode='clip')
+        self.profiler.lap('view')
+        return view_starts, view_ends, visible_colors, num_inside
+
+    def get_clip_bounds(self, margin=None):
+        """Computes the region of normalized device coordinates that
+        `to_view_coords` maps onto the surface extended by a guard band,
+        assuming that the mapping is affine. Edges only crossing the guard band
+        are left to the rasterizer, which draws them exactly as if they were
+        not clipped.
 
-            view_starts = self.to_view_coords(proj_starts)
-            view_ends = self.to_view_coords(proj_ends)
+        Parameters
+        ----------
+        margin : float, optional
+            the width of the guard band in pixels. Default is the larger of the
+            width and height of the surface.
 
-            for start, end, color in izip(view_starts, view_ends, colors):
-                pygame.draw.line(self.surface, color, start, end, 1)
+        Returns
+        -------
+        xmin, xmax, ymin, ymax : float
+        """
+        if margin is None:
+            margin = max(self.width, self.height)
+        corners = self.to_view_coords(np.array([[0.0, 0.0, 0.0, 1.0],
+                                                [1.0, 1.0, 0.0, 1.0]]))
+        offset = corners[0]
+        scale = corners[1] - corners[0]
+        low = (-margin - offset) / scale
+        high = (np.array([self.width, self.height]) + margin - offset) / scale
+        xmin, xmax = sorted((low[0], high[0]))
+        ymin, ymax = sorted((low[1], high[1]))
+        return xmin, xmax, ymin, ymax
 
     @staticmethod
-    def get_world_endpoints(edges, pos, scale):
+    def get_world_endpoints(starts, ends, pos, scale):
         """Returns the edge endpoints in homogeneous world coordinates
 
         Parameters
         ----------
-        edges : iterable of Edge
+        starts, ends : numpy array (of shape (N, 3))
+            the edge endpoints in model coordinates
         pos : numpy array
         scale : float
 
         Returns
         -------
-        tuple of iterable of points
+        tuple of numpy array
             a value in the form `(start_points, end_points)`, where
-            `start_points` and `end_points` are in the form of a numpy matrix
+            `start_points` and `end_points` are `(N, 4)` arrays
         """
-        edge_starts = (coord
-                       for edge in edges
-                       for coord in chain(scale * edge.start + pos, (1.0, )))
-        edge_ends = (coord
-                     for edge in edges
-                     for coord in chain(scale * edge.end + pos, (1.0, )))
+        return (Viewport.to_homogeneous_world(starts, pos, scale),
+                Viewport.to_homogeneous_world(ends, pos, scale))
 
-        homo_starts = np.fromiter(edge_starts, np.float, count=4 * len(edges))
-        homo_ends = np.fromiter(edge_ends, np.float, count=4 * len(edges))
+    @staticmethod
+    def to_homogeneous_world(points, pos, scale):
+        """Returns `scale * points + pos` in homogeneous coordinates as an
+        `(N, 4)` array.
+        """
+        homo = np.empty((len(points), 4))
+        np.multiply(points, scale, out=homo[:, :3])
+        homo[:, :3] += pos
+        homo[:, 3] = 1.0
+        return homo
 
-        homo_starts = homo_starts.reshape((len(edges), 4))
-        homo_ends = homo_ends.reshape((len(edges), 4))
 
-        return homo_starts, homo_ends
+    def get_world_to_camera_matrix(self):
+        """Returns the matrix that transforms the world coordinates to camera
+        coordinates, which is only recomputed when the eye or the orientation
+        of the camera has changed. The matrix must not be modified.
 
+        Returns
+        -------
+        numpy array (of shape (4, 4))
+        """
+        self._update_transforms()
+        return self._world_to_camera
 
-    def get_world_to_camera_matrix(self):
-        """Computes the matrix that transforms the world coordinates to camera
-        coordinates.
-        """
-        xaxis = self.strafe_dir
-        yaxis = self.up_dir
-        zaxis = self.look_dir
-        return np.matrix([
-            [xaxis[0], xaxis[1], xaxis[2], -np.dot(xaxis, self.eye)],
-            [yaxis[0], yaxis[1], yaxis[2], -np.dot(yaxis, self.eye)],
-            [zaxis[0], zaxis[1], zaxis[2], -np.dot(zaxis, self.eye)],
-            [0.0,      0.0,      0.0,      1.0]])
+    def get_world_to_clip_matrix(self):
+        """Returns the matrix that transforms the world coordinates to clip
+        coordinates (the projection matrix times the world to camera matrix),
+        which is only recomputed when the eye, the orientation of the camera,
+        or the projection has changed. The matrix must not be modified.
+
+        Returns
+        -------
+        numpy array (of shape (4, 4))
+        """
+        self._update_transforms()
+        return self._world_to_clip
+
+    def _update_transforms(self):
+        projection = self.projection_matrix
+        eye = self.eye
+        cached_eye = self._camera_eye
+        camera_changed = cached_eye is None or eye[0] != cached_eye[0] \
+                         or eye[1] != cached_eye[1] or eye[2] != cached_eye[2]
+        if not camera_changed and projection is self._transform_projection:
+            return
+        if camera_changed:
+            world_to_camera = self._world_to_camera
+            for row, axis in enumerate((self.strafe_dir, self.up_dir,
+                                        self.look_dir)):
+                world_to_camera[row, :3] = axis
+                world_to_camera[row, 3] = -np.dot(axis, eye)
+            self._camera_eye = tuple(eye)
+        np.dot(projection, self._world_to_camera, out=self._world_to_clip)
+        self._transforms[4] = self._world_to_camera[2]
+        self._transform_projection = projection
+
+    def _orientation_changed(self):
+        # the matrices are recomputed on next use
+        self._camera_eye = None
 
     @abstractmethod
     def to_view_coords(self, projected_points):
@@ -177,7 +808,7 @@ class Viewport(object):
         Parameters
         ----------
         projected_points : iterable of array-like
-            the numpy matrix with the position vectors in row-major order
+            the numpy array with the position vectors in row-major order
 
         Returns
         -------
@@ -187,28 +818,60 @@ class Viewport(object):
         """
         pass
 
-    def rotate_x(self, theta):
-        rot_x = np.matrix([[1.0, 0.0,             0.0],
-                           [0.0, math.cos(theta), -math.sin(theta)],
-                           [0.0, math.sin(theta), math.cos(theta)]])
+    def to_view_points(self, projected_points, out=None):
+        """Converts divided projected points to view coordinates, keeping any
+        attributes following their homogeneous coordinates.
+
+        Parameters
+        ----------
+        projected_points : numpy array (of shape (N, 4 + A))
+        out : numpy array (of shape (N, 2 + A)), optional
+            the array in which to store the result. Default is a new array.
 
-        self._up_dir = (self.up_dir * rot_x.T).getA1()
-        self._look_dir = np.cross(self.up_dir, self.strafe_dir)
+        Returns
+        -------
+        numpy array (of shape (N, 2 + A))
+        """
+        view_points = self.to_view_coords(projected_points)
+        if out is None:
+            if projected_points.shape[1] == 4:
+                return view_points
+            out = np.empty((len(projected_points),
+                            projected_points.shape[1] - 2))
+        out[:, :2] = view_points[:, :2]
+        out[:, 2:] = projected_points[:, 4:]
+        return out
+
+    def to_depths(self, distances):
+        """Converts distances from the eye along the look direction to depths
+        for depth testing, which must increase with the distance and vary
+        linearly across the view. The distances themselves do so for affine
+        projections.
 
-    def rotate_y(self, theta):
-        rot_y = np.matrix([[math.cos(theta),  0.0, math.sin(theta)],
-                           [0.0,              1.0, 0.0],
-                           [-math.sin(theta), 0.0, math.cos(theta)]])
+        Parameters
+        ----------
+        distances : numpy array
 
-        self._look_dir = (self.look_dir * rot_y.T).getA1()
-        self._strafe_dir = np.cross(self.look_dir, self.up_dir)
+        Returns
+        -------
+        numpy array
+        """
+        return distances
+
+    def rotate_x(self, theta):
+        rotate_in_plane(self._up_dir, 1, 2, theta)
+        cross_into(self.up_dir, self.strafe_dir, self._look_dir)
+        self._orientation_changed()
+
+    def rotate_y(self, theta):
+        rotate_in_plane(self._look_dir, 2, 0, theta)
+        cross_into(self.look_dir, self.up_dir, self._strafe_dir)
+        self._orientation_changed()
 
     def rotate_z(self, theta):
-        rot_z = np.matrix([[math.cos(theta), -math.sin(theta), 0.0],
-                           [math.sin(theta), math.cos(theta),  0.0],
-                           [0.0,             0.0,              1.0]])
-        self._strafe_dir = (self.strafe_dir * rot_z.T).getA1()
-        self._up_dir = np.cross(self.strafe_dir, self.look_dir)
+        rotate_in_plane(self._strafe_dir, 0, 1, theta)
+        cross_into(self.strafe_dir, self.look_dir, self._up_dir)
+        self._orientation_changed()
 
     def translate(self, vect):
         self.eye += vect
@@ -251,6 +914,12 @@ class Viewport(object):
 
     @property
     def projection_matrix(self):
-        """The projection matrix used by the view.
+        """The projection matrix used by the view, which is updated first if
+        the projection parameters (c.f. `get_projection_parameters`) have
+        changed. It must not be modified.
         """
+        parameters = self.get_projection_parameters()
+        if parameters != self._projection_parameters:
+            self._projection_parameters = parameters
+            self.update_projection_matrix()
         return self._projection_matrix
@@ -0,0 +1,463 @@
+"""Contains geometry shared by many models, which differ only by their
+transforms and colors.
+"""
+import copy
+import numpy as np
+
+from three_d.mathutil import affine_parts, rotated_bounds
+from three_d.model import Model
+from three_d.primitives import IndexedWireframe, Wireframe
+
+class InstanceArray(object):
+    """The packed transforms and colors of all instances of a
+    `SharedGeometry`, one row per instance. The arrays may be read and written
+    in bulk, e.g. to move many instances at once (c.f. `Kinematics`), after
+    which `mark_dirty` must be called.
+
+    Rows are appended by `add` and never reused. Appending may reallocate the
+    arrays, so references to them (or to their rows) must not be kept across
+    calls to `add`.
+
+    Attributes
+    ----------
+    positions : numpy array (of shape (K, 3))
+    scales : numpy array (of shape (K,))
+    rotations : numpy array (of shape (K, 3, 3))
+        the rotation matrix of each instance, which is applied to the
+        geometry before scaling it
+    colors : numpy array (of shape (K,)) of uint32
+        the color of all edges of each instance for which `tinted` is set
+    tinted : numpy array (of shape (K,)) of bool
+        whether each instance has a color of its own instead of the colors of
+        the geometry
+    versions : numpy array (of shape (K,)) of int
+        the version of each instance (c.f. `Wireframe.version`)
+    """
+    def __init__(self, capacity=16):
+        self._count = 0
+        self._positions = np.empty((capacity, 3))
+        self._scales = np.empty(capacity)
+        self._rotations = np.empty((capacity, 3, 3))
+        self._colors = np.empty(capacity, dtype=np.uint32)
+        self._tinted = np.empty(capacity, dtype=bool)
+        self._versions = np.empty(capacity, dtype=np.int64)
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def positions(self):
+        return self._positions[:self._count]
+
+    @property
+    def scales(self):
+        return self._scales[:self._count]
+
+    @property
+    def rotations(self):
+        return self._rotations[:self._count]
+
+    @property
+    def colors(self):
+        return self._colors[:self._count]
+
+    @property
+    def tinted(self):
+        return self._tinted[:self._count]
+
+    @property
+    def versions(self):
+        return self._versions[:self._count]
+
+    def add(self, position, scale=1.0, color=None, rotation=None):
+        """Appends an instance.
+
+        Parameters
+        ----------
+        position : numpy array (of size 3)
+        scale : float, optional
+        color : int, optional
+            The color of all edges of the instance. Default is the colors of
+            the geometry.
+        rotation : numpy array (of shape (3, 3)), optional
+            Default is no rotation.
+
+        Returns
+        -------
+        int
+            the row of the instance
+        """
+        if self._count == len(self._scales):
+            capacity = 2 * len(self._scales)
+            for name in ('_positions', '_scales', '_rotations', '_colors',
+                         '_tinted', '_versions'):
+                array = getattr(self, name)
+                grown = np.empty((capacity,) + array.shape[1:],
+                                 dtype=array.dtype)
+                grown[:self._count] = array[:self._count]
+                setattr(self, name, grown)
+        row = self._count
+        self._count += 1
+        self._positions[row] = position
+        self._scales[row] = scale
+        self._rotations[row] = rotation if rotation is not None \
+                                else np.identity(3)
+        self._colors[row] = color if color is not None else 0
+        self._tinted[row] = color is not None
+        self.mark_dirty(row)
+        return row
+
+    def mark_dirty(self, rows=None):
+        """Gives instances new versions. Must be called after writing into the
+        arrays directly.
+
+        Parameters
+        ----------
+        rows : int, slice, or numpy array of int, optional
+            the rows of the instances that have changed. Default is all of
+            them.
+        """
+        if rows is None:
+            rows = slice(None)
+        versions = self.versions[rows]
+        first = Wireframe._new_version()
+        count = np.size(versions)
+        # as many distinct versions as there are instances
+        Wireframe._last_version += max(count - 1, 0)
+        self.versions[rows] = np.arange(first, first + count).reshape(
+            np.shape(versions))
+
+
+class SharedGeometry(IndexedWireframe):
+    """An indexed wireframe whose vertices, edges, colors, and levels of
+    detail are shared by many models (c.f. `InstancedModel`), so that they are
+    stored only once. Its arrays are read-only, and it cannot be changed once
+    created.
+
+    Parameters
+    ----------
+    vertices : array-like (of shape (V, 3))
+    edge_indices : array-like (of shape (N, 2)) of int
+    colors : array-like (of shape (N,)) of int, optional
+    lods : int, optional
+        The number of simplified levels of detail to build (c.f.
+        `Wireframe.build_lods`). Default is none.
+
+    Attributes
+    ----------
+    instances : InstanceArray
+        the transforms and colors of the models sharing this geometry
+    """
+    def __init__(self, vertices, edge_indices, colors=None, lods=0):
+        self._frozen = False
+        # copies, which are then made read-only
+        edge_indices = np.array(edge_indices, dtype=np.intp).reshape((-1, 2))
+        super(SharedGeometry, self).__init__(
+            vertices=np.array(vertices, dtype=float),
+            edge_indices=edge_indices,
+            colors=Wireframe._pack_colors(colors, len(edge_indices)),
+            copy=False)
+        if lods:
+            self.build_lods(lods)
+        for _, level_indices, level_colors in self.lod_levels:
+            level_indices.flags.writeable = False
+            level_colors.flags.writeable = False
+        self._vertices.flags.writeable = False
+        self._frozen = True
+        self.instances = InstanceArray()
+
+    def _check_mutable(self):
+        if self._frozen:
+            raise TypeError('shared geometry cannot be changed')
+
+    def set_indexed_arrays(self, *args, **kwargs):
+        self._check_mutable()
+        super(SharedGeometry, self).set_indexed_arrays(*args, **kwargs)
+
+    def build_lods(self, *args, **kwargs):
+        self._check_mutable()
+        super(SharedGeometry, self).build_lods(*args, **kwargs)
+
+    def clone(self):
+        # the clone has no instances of its own yet
+        new = super(SharedGeometry, self).clone()
+        new.instances = InstanceArray()
+        return new
+
+    def instantiate(self, position, scale=1.0, color=None, rotation=None):
+        """Creates a model of this geometry.
+
+        Returns
+        -------
+        InstancedModel
+        """
+        return InstancedModel(self, position, scale=scale, color=color,
+                              rotation=rotation)
+
+
+class InstancedModel(Model):
+    """A model whose geometry is a `SharedGeometry`, which it shares with the
+    other instances of the geometry. Its position, scale, rotation, and color
+    are a row of the packed `InstanceArray` of the geometry, so that viewports
+    place all instances of a geometry in the world at once.
+
+    Moving, rescaling, or rotating an instance transforms its model
+    coordinates, as for any wireframe, but through its transform rather than
+    its (read-only) vertices; only rotations, translations, and uniform
+    scaling are supported.
+
+    Parameters
+    ----------
+    geometry : SharedGeometry
+    position : numpy array (of size 3)
+    scale : float, optional
+    color : int, optional
+        The color of all edges. Default is the colors of the geometry.
+    rotation : numpy array (of shape (3, 3)), optional
+        Default is no rotation.
+
+    Attributes
+    ----------
+    geometry : SharedGeometry
+    row : int
+        the row of this instance in `geometry.instances`
+    color : int or None
+    """
+    def __init__(self, geometry, position, scale=1.0, color=None,
+                 rotation=None):
+        # the attributes of a model, without `Model.__init__`, which would
+        # give it edges of its own: the arrays are those of the geometry,
+        # while the position, scale, rotation, color, and version are its row
+        # of the instance array (c.f. the properties below)
+        self._geometry = geometry
+        self._row = geometry.instances.add(position, scale, color, rotation)
+        self._vertices = geometry._vertices
+        self._edge_indices = geometry._edge_indices
+        self._colors = geometry._colors
+        self._lods = geometry._lods
+        self._bounds = geometry.bounds
+        self._bounds_version = self._geometry_version = \
+            geometry._geometry_version
+        self._world_vertices = None
+        self._world_version = None
+        self._world_bounds = None
+        self._world_bounds_version = None
+
+    @property
+    def geometry(self):
+        return self._geometry
+
+    @property
+    def row(self):
+        return self._row
+
+    @property
+    def position(self):
+        """The position of the origin of this model in world coordinates, as
+        a view of its row of the instance array.
+        """
+        return self._geometry.instances.positions[self._row]
+
+    @position.setter
+    def position(self, position):
+        self._geometry.instances.positions[self._row] = position
+        self.mark_dirty()
+
+    @property
+    def scale(self):
+        return self._row_scale
+
+    @scale.setter
+    def scale(self, scale):
+        self._row_scale = scale
+
+    @property
+    def _row_scale(self):
+        """The scale of this instance in its row of the instance array, which
+        is `scale` unless a subclass scales the geometry further.
+        """
+        return float(self._geometry.instances.scales[self._row])
+
+    @_row_scale.setter
+    def _row_scale(self, scale):
+        self._geometry.instances.scales[self._row] = scale
+        self.mark_dirty()
+
+    @property
+    def rotation(self):
+        """The rotation matrix of this model, as a view of its row of the
+        instance array.
+        """
+        return self._geometry.instances.rotations[self._row]
+
+    @rotation.setter
+    def rotation(self, rotation):
+        self._geometry.instances.rotations[self._row] = rotation
+        self.mark_dirty()
+
+    @property
+    def color(self):
+        instances = self._geometry.instances
+        if not instances.tinted[self._row]:
+            return None
+        return int(instances.colors[self._row])
+
+    @color.setter
+    def color(self, color):
+        instances = self._geometry.instances
+        instances.colors[self._row] = color if color is not None else 0
+        instances.tinted[self._row] = color is not None
+        self.mark_dirty()
+
+    @property
+    def version(self):
+        return int(self._geometry.instances.versions[self._row])
+
+    def mark_dirty(self):
+        self._geometry.instances.mark_dirty(self._row)
+
+    @property
+    def vertices(self):
+        return self._geometry.vertices
+
+    @property
+    def edge_indices(self):
+        return self._geometry.edge_indices
+
+    @property
+    def colors(self):
+        """The `(N,)` array of edge colors, which is a new array if this
+        instance has a color of its own.
+        """
+        color = self.color
+        if color is None:
+            return self._geometry.colors
+        return np.full(self.num_edges, color, dtype=np.uint32)
+
+    @property
+    def starts(self):
+        return self._geometry.starts
+
+    @property
+    def ends(self):
+        return self._geometry.ends
+
+    @property
+    def num_edges(self):
+        return self._geometry.num_edges
+
+    @property
+    def bounds(self):
+        return self._geometry.bounds
+
+    @property
+    def world_vertices(self):
+        if self._world_version != self.version:
+            world_vertices = np.empty((len(self.vertices), 4))
+            if self._is_rotated():
+                world_vertices[:, :3] = self.vertices.dot(
+                    (self._row_scale * self.rotation).T)
+            else:
+                np.multiply(self.vertices, self._row_scale,
+                            out=world_vertices[:, :3])
+            world_vertices[:, :3] += self.position
+            world_vertices[:, 3] = 1.0
+            self._world_vertices = world_vertices
+            self._world_version = self.version
+        return self._world_vertices
+
+    @property
+    def world_bounds(self):
+        if self._world_bounds_version != self.version:
+            if self._is_rotated():
+                self._world_bounds = rotated_bounds(
+                    self._geometry.bounds, self._row_scale * self.rotation,
+                    self.position)
+            else:
+                low, high = self._geometry.bounds
+                low = self._row_scale * low + self.position
+                high = self._row_scale * high + self.position
+                self._world_bounds = (np.minimum(low, high),
+                                      np.maximum(low, high))
+            self._world_bounds_version = self.version
+        return self._world_bounds
+
+    @property
+    def lod_levels(self):
+        color = self.color
+        if color is None:
+            return self._geometry.lod_levels
+        return [(error, edge_indices,
+                 np.full(len(edge_indices), color, dtype=np.uint32))
+                for error, edge_indices, _ in self._geometry.lod_levels]
+
+    def _check_mutable(self):
+        raise TypeError('the geometry of an instance cannot be changed')
+
+    def set_arrays(self, starts, ends, colors=None):
+        self._check_mutable()
+
+    def build_lods(self, count=3, factor=4.0):
+        self._check_mutable()
+
+    def transform(self, matrix):
+        """Applies an affine transform to the model coordinates of this
+        instance, which must be a rotation and a uniform scaling followed by
+        a translation.
+
+        Parameters
+        ----------
+        matrix : array-like (of shape (4, 4))
+
+        Returns
+        -------
+        InstancedModel
+            this instance
+        """
+        linear, offset = affine_parts(matrix)
+        factor = np.cbrt(np.linalg.det(linear))
+        rotation = linear / factor if factor else linear
+        if not np.allclose(rotation.dot(rotation.T), np.identity(3)):
+            raise ValueError('instances can only be scaled uniformly')
+        instances = self._geometry.instances
+        row = self._row
+        instances.positions[row] += self._row_scale \
+                                    * self.rotation.dot(offset)
+        instances.rotations[row] = self.rotation.dot(rotation)
+        instances.scales[row] *= factor
+        self.mark_dirty()
+        return self
+
+    def clone(self):
+        return copy.deepcopy(self)
+
+    def __iadd__(self, vect):
+        self.position = self.position \
+                        + self._row_scale * self.rotation.dot(np.asarray(vect))
+        return self
+
+    def __isub__(self, vect):
+        self.position = self.position \
+                        - self._row_scale * self.rotation.dot(np.asarray(vect))
+        return self
+
+    def __imul__(self, v):
+        if np.ndim(v):
+            raise ValueError('instances can only be scaled uniformly')
+        self.scale = self.scale * v
+        return self
+
+    def __deepcopy__(self, memo):
+        # a new instance of the same geometry, rather than a copy of it
+        new = copy.copy(self)
+        new._row = self._geometry.instances.add(self.position.copy(),
+                                                self._row_scale, self.color,
+                                                self.rotation.copy())
+        new._world_vertices = None
+        new._world_version = None
+        new._world_bounds_version = None
+        return new
+
+    def __repr__(self):
+        return 'InstancedModel(position={!r}, scale={!r}, color={!r})' \
+            .format(self.position, self.scale, self.color)
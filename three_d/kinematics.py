@@ -0,0 +1,223 @@
+"""Contains a simulation moving many models at constant velocities.
+"""
+import numpy as np
+
+from itertools import izip
+
+from three_d.instancing import InstancedModel
+from three_d.mathutil import rotation_matrices
+from three_d.model import Model
+
+def _as_slice(indices):
+    """Returns a slice selecting the same elements as an array of increasing
+    consecutive indices, or the array itself if they are not consecutive.
+    """
+    if len(indices) and indices[-1] - indices[0] == len(indices) - 1 \
+       and (np.diff(indices) == 1).all():
+        return slice(indices[0], indices[-1] + 1)
+    return indices
+
+def _select(indices, mask):
+    """Returns the indices (as an array or a slice) selected by a mask.
+    """
+    if isinstance(indices, slice):
+        return indices.start + np.flatnonzero(mask)
+    return indices[mask]
+
+
+class Kinematics(object):
+    """Moves many models at constant linear and angular velocities, all at
+    once.
+
+    The velocities are kept in packed arrays, one row per model. The
+    positions and rotations of instanced models are the packed arrays of
+    their shared geometries (c.f. `InstanceArray`), so that `step` moves all
+    instances of a geometry with a few array operations, and gives new
+    versions only to the instances that have moved; viewports then only place
+    those in the world again. The positions of the other models are rows of
+    one packed array of this simulation (c.f. `Model.share_position`), which
+    are moved at once as well, and so are their rotations (c.f.
+    `Model.share_rotation`), which leave their vertices unchanged.
+
+    Parameters
+    ----------
+    models : iterable of Model, optional
+        the models to move, which start at rest
+
+    Attributes
+    ----------
+    models : list of Model
+        the moving models. Use `add` and `remove` to change it; its order
+        changes when models are removed.
+    velocities : numpy array (of shape (K, 3))
+        the velocity of each model in world units per second, which may be
+        written into directly
+    angular_velocities : numpy array (of shape (K, 3))
+        the angular velocity of each model, as its axis of rotation through
+        its position scaled by radians per second, which may be written into
+        directly
+    """
+    def __init__(self, models=None):
+        self.models = []
+        self._indices = {}
+        self._velocities = np.empty((16, 3))
+        self._angular_velocities = np.empty((16, 3))
+        # the models by instance array, followed by the other models
+        self._groups = None
+        self._plain = None
+        self._plain_models = None
+        self._plain_positions = None
+        self._plain_rotations = None
+        for model in models or []:
+            self.add(model)
+
+    def __len__(self):
+        return len(self.models)
+
+    def __contains__(self, model):
+        return model in self._indices
+
+    @property
+    def velocities(self):
+        return self._velocities[:len(self.models)]
+
+    @property
+    def angular_velocities(self):
+        return self._angular_velocities[:len(self.models)]
+
+    def add(self, model, velocity=(0.0, 0.0, 0.0),
+            angular_velocity=(0.0, 0.0, 0.0)):
+        """Adds a model to move.
+
+        Parameters
+        ----------
+        model : Model
+        velocity : array-like (of size 3), optional
+            Default is at rest.
+        angular_velocity : array-like (of size 3), optional
+            Default is no rotation.
+
+        Returns
+        -------
+        int
+            the index of the model in `models` and the velocity arrays
+        """
+        if model in self._indices:
+            raise ValueError('the model is already moved')
+        index = len(self.models)
+        if index == len(self._velocities):
+            for name in ('_velocities', '_angular_velocities'):
+                array = getattr(self, name)
+                grown = np.empty((2 * len(array), 3))
+                grown[:index] = array
+                setattr(self, name, grown)
+        self.models.append(model)
+        self._indices[model] = index
+        self._velocities[index] = velocity
+        self._angular_velocities[index] = angular_velocity
+        self._groups = None
+        return index
+
+    def remove(self, model):
+        """Stops moving a model. The last model of `models` takes its place.
+
+        Parameters
+        ----------
+        model : Model
+        """
+        try:
+            index = self._indices.pop(model)
+        except KeyError:
+            raise ValueError('the model is not moved')
+        last = self.models.pop()
+        if last is not model:
+            last_index = len(self.models)
+            self.models[index] = last
+            self._indices[last] = index
+            self._velocities[index] = self._velocities[last_index]
+            self._angular_velocities[index] = \
+                self._angular_velocities[last_index]
+        self._groups = None
+
+    def _get_groups(self):
+        if self._groups is None:
+            groups = {}
+            plain = []
+            for index, model in enumerate(self.models):
+                if isinstance(model, InstancedModel):
+                    groups.setdefault(model.geometry, []).append(
+                        (index, model.row))
+                else:
+                    plain.append(index)
+            self._groups = []
+            for geometry, pairs in groups.iteritems():
+                indices, rows = np.array(pairs, dtype=np.intp).T
+                order = np.argsort(rows)
+                self._groups.append((geometry.instances,
+                                     _as_slice(indices[order]),
+                                     _as_slice(rows[order])))
+            self._plain = np.array(plain, dtype=np.intp)
+            self._plain_models = [self.models[index] for index in plain]
+            # the positions and rotations of the other models, packed
+            self._plain_positions = np.empty((len(plain), 3))
+            self._plain_rotations = np.empty((len(plain), 3, 3))
+            for model, position, rotation in izip(self._plain_models,
+                                                  self._plain_positions,
+                                                  self._plain_rotations):
+                model.share_position(position)
+                model.share_rotation(rotation)
+        return self._groups
+
+    def step(self, dt):
+        """Moves and rotates all models by their velocities over a period of
+        time, and marks those that have moved dirty.
+
+        Parameters
+        ----------
+        dt : float
+            the period in seconds
+        """
+        for instances, indices, rows in self._get_groups():
+            velocities = self._velocities[indices]
+            angular_velocities = self._angular_velocities[indices]
+            moving = velocities.any(axis=1)
+            spinning = angular_velocities.any(axis=1)
+            if moving.all():
+                instances.positions[rows] += dt * velocities
+            elif moving.any():
+                instances.positions[_select(rows, moving)] += \
+                    dt * velocities[moving]
+            if spinning.any():
+                spun = _select(rows, spinning)
+                rotations = instances.rotations
+                rotations[spun] = np.matmul(
+                    rotation_matrices(dt * angular_velocities[spinning]),
+                    rotations[spun])
+            changed = moving | spinning
+            if changed.all():
+                instances.mark_dirty(rows)
+            elif changed.any():
+                instances.mark_dirty(_select(rows, changed))
+
+        plain = self._plain
+        if not len(plain):
+            return
+        velocities = self._velocities[plain]
+        angular_velocities = self._angular_velocities[plain]
+        moving = velocities.any(axis=1)
+        spinning = angular_velocities.any(axis=1)
+        if moving.all():
+            self._plain_positions += dt * velocities
+        elif moving.any():
+            self._plain_positions[moving] += dt * velocities[moving]
+        if spinning.any():
+            rotations = self._plain_rotations
+            rotations[spinning] = np.matmul(
+                rotation_matrices(dt * angular_velocities[spinning]),
+                rotations[spinning])
+        changed = moving | spinning
+        if changed.all():
+            Model.mark_moved(self._plain_models)
+        elif changed.any():
+            models = self._plain_models
+            Model.mark_moved([models[i] for i in np.flatnonzero(changed)])
@@ -11,24 +11,195 @@ def deg_to_rad(deg):
 def rad_to_deg(rad):
     return 180 / math.pi * rad
 
-def perspective_division(matrix):
+def rotate_in_plane(vector, i, j, theta):
+    """Rotates a vector in place by an angle in the plane of two of its
+    coordinates, from the `i`th axis towards the `j`th one.
+
+    Parameters
+    ----------
+    vector : numpy array
+    i, j : int
+    theta : float
+    """
+    cos = math.cos(theta)
+    sin = math.sin(theta)
+    vi = vector[i]
+    vj = vector[j]
+    vector[i] = cos * vi - sin * vj
+    vector[j] = sin * vi + cos * vj
+
+def cross_into(a, b, out):
+    """Computes the cross product of two 3-D vectors into a third one, like
+    `np.cross` but without allocating a new array.
+
+    Parameters
+    ----------
+    a, b, out : numpy array (of size 3)
+    """
+    a0, a1, a2 = a
+    b0, b1, b2 = b
+    out[0] = a1 * b2 - a2 * b1
+    out[1] = a2 * b0 - a0 * b2
+    out[2] = a0 * b1 - a1 * b0
+
+def translation_matrix(vect):
+    """Returns the affine transform translating points by a vector.
+
+    Parameters
+    ----------
+    vect : array-like (of size 3)
+
+    Returns
+    -------
+    numpy array (of shape (4, 4))
     """
-    Performs in-place perspective division on homogeneous coordinates.
+    matrix = np.identity(4)
+    matrix[:3, 3] = vect
+    return matrix
+
+def scaling_matrix(factors, center=None):
+    """Returns the affine transform scaling points about a center.
 
     Parameters
     ----------
-    matrix : iterable of 4-vectors
-        the list of vectors on which to operate
+    factors : float or array-like (of size 3)
+        the factor for all axes, or for each of them
+    center : array-like (of size 3), optional
+        Default is the origin.
 
     Returns
     -------
-    None
+    numpy array (of shape (4, 4))
     """
-    for vec in matrix:
-        vec[0, 0] /= vec[0, 3]
-        vec[0, 1] /= vec[0, 3]
-        vec[0, 2] = 1
-        vec[0, 3] = 1
+    matrix = np.identity(4)
+    matrix[:3, :3] *= factors
+    if center is not None:
+        center = np.asarray(center, dtype=float)
+        matrix[:3, 3] = center - matrix[:3, :3].dot(center)
+    return matrix
+
+def rotation_matrix(axis, theta, center=None):
+    """Returns the affine transform rotating points by an angle about an axis
+    through a center, in the same sense as `rotate_in_plane` rotates from the
+    y-axis towards the z-axis for the x-axis.
+
+    Parameters
+    ----------
+    axis : array-like (of size 3)
+        the direction of the axis, which need not be of unit length
+    theta : float
+    center : array-like (of size 3), optional
+        Default is the origin.
+
+    Returns
+    -------
+    numpy array (of shape (4, 4))
+    """
+    axis = np.asarray(axis, dtype=float)
+    axis = axis / np.linalg.norm(axis)
+    cos = math.cos(theta)
+    sin = math.sin(theta)
+    x, y, z = axis
+    # Rodrigues' rotation formula
+    cross = np.array([[0.0, -z, y],
+                      [z, 0.0, -x],
+                      [-y, x, 0.0]])
+    matrix = np.identity(4)
+    matrix[:3, :3] = cos * np.identity(3) + sin * cross \
+                     + (1 - cos) * np.outer(axis, axis)
+    if center is not None:
+        center = np.asarray(center, dtype=float)
+        matrix[:3, 3] = center - matrix[:3, :3].dot(center)
+    return matrix
+
+def rotation_matrices(rotation_vectors):
+    """Computes the matrices of many rotations at once (c.f.
+    `rotation_matrix`).
+
+    Parameters
+    ----------
+    rotation_vectors : numpy array (of shape (K, 3))
+        the axis of each rotation, scaled by its angle
+
+    Returns
+    -------
+    numpy array (of shape (K, 3, 3))
+    """
+    angles = np.linalg.norm(rotation_vectors, axis=1)
+    axes = rotation_vectors / np.where(angles, angles, 1.0)[:, np.newaxis]
+    cos = np.cos(angles)
+    sin = np.sin(angles)
+    # Rodrigues' rotation formula, written into one array
+    matrices = axes[:, :, np.newaxis] * axes[:, np.newaxis, :]
+    matrices *= (1 - cos)[:, np.newaxis, np.newaxis]
+    for i in xrange(3):
+        matrices[:, i, i] += cos
+    sin_x, sin_y, sin_z = sin * axes.T
+    matrices[:, 0, 1] -= sin_z
+    matrices[:, 0, 2] += sin_y
+    matrices[:, 1, 0] += sin_z
+    matrices[:, 1, 2] -= sin_x
+    matrices[:, 2, 0] -= sin_y
+    matrices[:, 2, 1] += sin_x
+    return matrices
+
+def affine_parts(matrix):
+    """Splits an affine transform into its linear part and its translation.
+
+    Parameters
+    ----------
+    matrix : array-like (of shape (4, 4))
+        an affine transform in homogeneous coordinates, whose last row is
+        `(0, 0, 0, 1)`
+
+    Returns
+    -------
+    linear : numpy array (of shape (3, 3))
+    offset : numpy array (of shape (3,))
+
+    Raises
+    ------
+    ValueError
+        if the matrix is not an affine transform
+    """
+    matrix = np.asarray(matrix, dtype=float)
+    if matrix.shape != (4, 4) or (matrix[3] != (0.0, 0.0, 0.0, 1.0)).any():
+        raise ValueError('not an affine transform: {!r}'.format(matrix))
+    return matrix[:3, :3], matrix[:3, 3]
+
+def perspective_division(points, out=None):
+    """
+    Performs perspective division on homogeneous coordinates, i.e., divides
+    the x, y, and z coordinates of every point by its w coordinate and sets w
+    to 1.
+
+    Points with `w <= 0` lie on or behind the plane of the eye and have no
+    meaningful projection (dividing would mirror them through the eye). Their
+    coordinates are set to NaN instead, and they are reported as invalid.
+
+    Parameters
+    ----------
+    points : numpy array (of shape (N, 4 + A))
+        the vectors on which to operate, in row-major order, optionally
+        followed by `A` attributes, which are left as they are
+    out : numpy array (of shape (N, 4 + A)), optional
+        the array in which to store the result. Default is `points` (in-place
+        operation).
+
+    Returns
+    -------
+    valid : numpy array (of shape (N,)) of bool
+        `True` for the points with `w > 0`
+    """
+    points = np.asarray(points)
+    out = points if out is None else np.asarray(out)
+    valid = points[:, 3] > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(points[:, :3], points[:, 3:4], out=out[:, :3])
+    out[:, 3] = 1.0
+    if not valid.all():
+        out[~valid, :3] = np.nan
+    return valid
 
 
 def clip_point(xmin, ymin, xmax, ymax, x, y):
@@ -235,3 +406,174 @@ def clip_4d_liang_barsky(zmin, zmax, p0, p1):
                                 p0[3] += t0 * dw
                             return True
     return False
+
+
+def homogeneous_clip_planes(xmin=-1.0, xmax=1.0, ymin=-1.0, ymax=1.0,
+                            clip_far=True, wmin=1e-9):
+    """Computes the planes bounding the view volume `xmin * w <= x <= xmax * w`,
+    `ymin * w <= y <= ymax * w`, `0 <= z <= w`, `w >= wmin` in homogeneous
+    coordinates. The last plane keeps clipped points strictly in front of the
+    eye so that they can be divided by `w`.
+
+    Parameters
+    ----------
+    xmin, xmax, ymin, ymax : float, optional
+        the bounds of the volume after perspective division. Default is the
+        canonical view volume.
+    clip_far : bool, optional
+        whether to clip against the far plane `z <= w`. Default is `True`.
+    wmin : float, optional
+
+    Returns
+    -------
+    planes : numpy array (of shape (4, K))
+    offsets : numpy array (of shape (K,))
+        a point `p` lies inside the `k`th plane if
+        `p.dot(planes[:, k]) + offsets[k] >= 0`
+    """
+    planes = [(1.0, 0.0, 0.0, -xmin), # left
+              (-1.0, 0.0, 0.0, xmax), # right
+              (0.0, 1.0, 0.0, -ymin), # bottom
+              (0.0, -1.0, 0.0, ymax), # top
+              (0.0, 0.0, 1.0, 0.0)] # front
+    if clip_far:
+        planes.append((0.0, 0.0, -1.0, 1.0)) # back
+    planes.append((0.0, 0.0, 0.0, 1.0)) # eye
+    offsets = np.zeros(len(planes))
+    offsets[-1] = -wmin
+    return np.array(planes).T, offsets
+
+
+def outcodes_4d(points, planes, offsets):
+    """Computes the outcode of every point, in which bit `k` is set if the
+    point lies outside the `k`th plane.
+
+    Parameters
+    ----------
+    points : numpy array (of shape (N, 4))
+    planes, offsets : numpy array
+        as returned by `homogeneous_clip_planes`
+
+    Returns
+    -------
+    numpy array (of shape (N,)) of int
+    """
+    outside = points.dot(planes) + offsets < 0
+    return outside.dot(1 << np.arange(len(offsets)))
+
+
+def clip_4d_liang_barsky_batch(p0, p1, planes, offsets):
+    """Clips many line segments in homogeneous coordinates at once by the
+    algorithm of Liang and Barsky. Segments entirely outside one of the planes
+    are rejected and segments entirely inside all of them are accepted
+    without further work; only the remaining segments are clipped.
+
+    Parameters
+    ----------
+    p0, p1 : numpy array (of shape (N, 4))
+        the endpoints of the segments to be clipped
+    planes, offsets : numpy array
+        as returned by `homogeneous_clip_planes`
+
+    Returns
+    -------
+    visible : numpy array (of shape (N,)) of bool
+    p0, p1 : numpy array (of shape (M, 4))
+        the clipped endpoints of the `M` visible segments, in order
+    """
+    p0 = np.asarray(p0)
+    p1 = np.asarray(p1)
+    d0 = p0.dot(planes) + offsets
+    d1 = p1.dot(planes) + offsets
+    out0 = d0 < 0
+    out1 = d1 < 0
+    visible = ~(out0 & out1).any(axis=1)
+    partial = np.flatnonzero(visible & (out0 | out1).any(axis=1))
+
+    if len(partial):
+        d0 = d0[partial]
+        d1 = d1[partial]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = d0 / (d0 - d1)
+        t0 = np.where(out0[partial], t, 0.0).max(axis=1)
+        t1 = np.where(out1[partial], t, 1.0).min(axis=1)
+        is_visible = t0 < t1
+        visible[partial[~is_visible]] = False
+        partial = partial[is_visible]
+        t0 = t0[is_visible, np.newaxis]
+        t1 = t1[is_visible, np.newaxis]
+        delta = p1[partial] - p0[partial]
+        clipped0 = p0[partial] + t0 * delta
+        clipped1 = p0[partial] + t1 * delta
+
+    result0 = p0[visible]
+    result1 = p1[visible]
+    if len(partial):
+        # positions of the clipped segments among the visible ones
+        compacted = np.cumsum(visible)[partial] - 1
+        result0[compacted] = clipped0
+        result1[compacted] = clipped1
+    return visible, result0, result1
+
+
+def classify_boxes(low, high, planes, offsets):
+    """Tests axis-aligned boxes against a convex volume bounded by planes.
+
+    Parameters
+    ----------
+    low, high : numpy array (of shape (M, 3))
+        the minimum and maximum corners of the boxes
+    planes, offsets : numpy array
+        the planes in the form returned by `homogeneous_clip_planes`,
+        transformed into the coordinate system of the boxes
+
+    Returns
+    -------
+    outside : numpy array (of shape (M,)) of bool
+        `True` for the boxes entirely outside one of the planes (a box may be
+        outside the volume without being outside any single plane, in which
+        case it is conservatively reported as not outside)
+    inside : numpy array (of shape (M,)) of bool
+        `True` for the boxes entirely inside all of the planes
+    """
+    normals = planes[:3]
+    centers = (low + high) / 2.0
+    extents = (high - low) / 2.0
+    distances = centers.dot(normals) + planes[3] + offsets
+    reach = extents.dot(np.abs(normals))
+    return (distances + reach < 0).any(axis=1), \
+        (distances - reach >= 0).all(axis=1)
+
+
+def boxes_outside_planes(low, high, planes, offsets):
+    """Returns the `outside` result of `classify_boxes`.
+    """
+    return classify_boxes(low, high, planes, offsets)[0]
+
+def rotated_bounds(bounds, linear, position):
+    """Computes the axis-aligned bounding box of a box after a linear
+    transform and a translation.
+
+    Parameters
+    ----------
+    bounds : tuple of numpy array
+        the minimum and maximum corners of the box, or of each of `K` boxes
+    linear : numpy array (of shape (3, 3) or (K, 3, 3))
+        the linear transform, or one for each of `K` copies of the box
+    position : numpy array (of shape (3,) or (K, 3))
+
+    Returns
+    -------
+    tuple of numpy array
+        the minimum and maximum corners of the transformed box, or of each of
+        its copies
+    """
+    low, high = bounds
+    if not np.isfinite(low).all():
+        # an empty box stays empty
+        shape = np.shape(position)
+        return np.full(shape, np.inf), np.full(shape, -np.inf)
+    center = np.einsum('...ij,...j->...i', linear, (low + high) / 2.0) \
+             + position
+    half = np.einsum('...ij,...j->...i', np.abs(linear), (high - low) / 2.0)
+    return center - half, center + half
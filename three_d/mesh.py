@@ -0,0 +1,66 @@
+"""Contains functions deriving the edges of wireframes from polygon meshes.
+"""
+import numpy as np
+
+def polygon_edges(indices, sizes, closed=True):
+    """Finds the edges between consecutive vertices of many polygons (or
+    polylines) at once.
+
+    Parameters
+    ----------
+    indices : numpy array (of shape (K,)) of int
+        the vertex indices of all polygons, one polygon after another
+    sizes : numpy array (of shape (P,)) of int
+        the number of vertices of each polygon
+    closed : bool, optional
+        Whether to connect the last vertex of each polygon to its first one,
+        as for faces, rather than only consecutive ones, as for polylines.
+        Default is `True`.
+
+    Returns
+    -------
+    numpy array (of shape (N, 2)) of int
+        the vertex indices of each edge, in the order of the polygons
+    """
+    indices = np.asarray(indices, dtype=np.intp)
+    sizes = np.asarray(sizes, dtype=np.intp)
+    poly_ends = np.cumsum(sizes)
+    nonempty = sizes > 0
+    following = np.arange(1, len(indices) + 1)
+    if closed:
+        following[poly_ends[nonempty] - 1] = (poly_ends - sizes)[nonempty]
+        edge_starts = np.arange(len(indices))
+    else:
+        is_last = np.zeros(len(indices), dtype=bool)
+        is_last[poly_ends[nonempty] - 1] = True
+        edge_starts = np.flatnonzero(~is_last)
+    return np.column_stack((indices[edge_starts],
+                            indices[following[edge_starts]]))
+
+
+def unique_edges(edge_indices):
+    """Finds the edges to keep of a list of edges which may contain the same
+    edges several times (e.g., the edges shared by adjacent faces, once from
+    each of them, in opposite directions), and degenerate ones. Each edge is
+    hashed to a single integer from its sorted pair of vertex indices, so
+    that duplicates are found by a single sort.
+
+    Parameters
+    ----------
+    edge_indices : numpy array (of shape (N, 2)) of int
+
+    Returns
+    -------
+    numpy array of int
+        the indices in `edge_indices` of the first occurrence of every
+        non-degenerate edge, in increasing order
+    """
+    edge_indices = np.asarray(edge_indices, dtype=np.int64).reshape((-1, 2))
+    low = edge_indices.min(axis=1)
+    high = edge_indices.max(axis=1)
+    candidates = np.flatnonzero(low != high)
+    if not len(candidates):
+        return candidates
+    keys = low[candidates] * (high[candidates].max() + 1) + high[candidates]
+    _, first = np.unique(keys, return_index=True)
+    return candidates[np.sort(first)]
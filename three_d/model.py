@@ -1,21 +1,224 @@
 """Contains the interface for a game object model in our game world.
 """
-from three_d.primitives import Wireframe
+import numpy as np
+
+from itertools import count, izip
+
+from three_d.mathutil import rotated_bounds
+from three_d.primitives import IndexedWireframe, Wireframe
 
 class Model(Wireframe):
     """Represents a wireframe model in the game world.
 
+    Moving, rescaling, or rotating a model (by assigning `position`, `scale`,
+    or `rotation`) gives it a new `version`, just like changing its edges.
+    Code modifying `position` or `rotation` in place must call `mark_dirty`
+    (or `mark_moved`) afterwards.
+
     Parameters
     ----------
     position : numpy array (of size 3)
     scale : float, optional
+    rotation : numpy array (of shape (3, 3)), optional
+        Default is no rotation.
 
     Attributes
     ----------
     position : numpy array
     scale : float
+    rotation : numpy array
+    world_vertices : numpy array (of shape (V, 4))
+    world_bounds : tuple of numpy array
+    bounding_sphere : tuple of numpy array and float
     """
-    def __init__(self, position, scale=1.0, **kwargs):
+    def __init__(self, position, scale=1.0, rotation=None, **kwargs):
+        self._world_vertices = None
+        self._world_version = None
+        self._world_bounds_version = None
         super(Model, self).__init__(**kwargs)
+        self._position = np.empty(3)
         self.position = position
         self.scale = scale
+        self._rotation = np.identity(3)
+        if rotation is not None:
+            self.rotation = rotation
+
+    @property
+    def position(self):
+        """The position of the origin of this model in world coordinates.
+        Assigning it copies the new position into the array, which may be a
+        row of an array packing many positions (c.f. `share_position`).
+        """
+        return self._position
+
+    @position.setter
+    def position(self, position):
+        self._position[...] = position
+        self._version = Wireframe._new_version()
+
+    @property
+    def scale(self):
+        """The factor by which this model is scaled in world coordinates.
+        """
+        return self._scale
+
+    @scale.setter
+    def scale(self, scale):
+        self._scale = scale
+        self._version = Wireframe._new_version()
+
+    @property
+    def rotation(self):
+        """The rotation of this model about its position in world
+        coordinates, which leaves its vertices unchanged. Assigning it copies
+        the new matrix into the array, which may be a row of an array packing
+        many rotations (c.f. `share_rotation`).
+        """
+        return self._rotation
+
+    @rotation.setter
+    def rotation(self, rotation):
+        self._rotation[...] = rotation
+        self._version = Wireframe._new_version()
+
+    def _is_rotated(self):
+        return (self.rotation != np.identity(3)).any()
+
+    @property
+    def world_vertices(self):
+        """The `(V, 4)` array of the vertices in homogeneous world coordinates.
+        It is cached, and only recomputed after this model has changed.
+        """
+        if self._world_version != self.version:
+            n = len(self.vertices)
+            if self._world_vertices is None or len(self._world_vertices) != n:
+                self._world_vertices = np.empty((n, 4))
+            if self._is_rotated():
+                self._world_vertices[:, :3] = self.vertices.dot(
+                    (self.scale * self.rotation).T)
+            else:
+                np.multiply(self.vertices, self.scale,
+                            out=self._world_vertices[:, :3])
+            self._world_vertices[:, :3] += self.position
+            self._world_vertices[:, 3] = 1.0
+            self._world_version = self.version
+        return self._world_vertices
+
+    @property
+    def world_bounds(self):
+        """The axis-aligned bounding box of this model in world coordinates,
+        as a tuple of the minimum and maximum corners. It is derived from the
+        cached bounding box of the vertices, so moving, rescaling, or rotating
+        the model does not touch its vertices.
+        """
+        if self._world_bounds_version != self.version:
+            if self._is_rotated():
+                self._world_bounds = rotated_bounds(
+                    self.bounds, self.scale * self.rotation, self.position)
+            else:
+                low, high = self.bounds
+                low = self.scale * low + self.position
+                high = self.scale * high + self.position
+                self._world_bounds = (np.minimum(low, high),
+                                      np.maximum(low, high))
+            self._world_bounds_version = self.version
+        return self._world_bounds
+
+    @property
+    def bounding_sphere(self):
+        """The sphere enclosing `world_bounds`, as a tuple of its center and
+        radius.
+        """
+        low, high = self.world_bounds
+        return (low + high) / 2.0, np.linalg.norm(high - low) / 2.0
+
+    def clone(self):
+        """Returns a copy of this model at the same position, scale, and
+        rotation, which shares the arrays of this model until either of them
+        is changed (c.f. `Wireframe.clone`).
+
+        Returns
+        -------
+        Model
+        """
+        new = super(Model, self).clone()
+        new._position = self._position.copy()
+        new._rotation = self._rotation.copy()
+        # the world vertices may be a view of a buffer packing many models
+        new._world_vertices = None
+        new._world_version = None
+        new._world_bounds_version = None
+        return new
+
+    def share_world_vertices(self, out, is_current=False):
+        """Makes `out` the cache of the world vertices of this model, so that
+        they are recomputed in place, e.g. in a buffer packing the vertices of
+        many models.
+
+        Parameters
+        ----------
+        out : numpy array (of shape (V, 4))
+        is_current : bool, optional
+            Whether `out` already holds the current world vertices. Default is
+            `False`, in which case they are copied into it.
+        """
+        if not is_current:
+            out[:] = self.world_vertices
+        self._world_vertices = out
+        self._world_version = self.version
+
+    def share_position(self, out):
+        """Makes `out` the array of the position of this model, e.g. a row of
+        an array packing the positions of many models, so that they can all
+        be moved at once by writing into it (c.f. `mark_moved`). The current
+        position is copied into it.
+
+        Parameters
+        ----------
+        out : numpy array (of shape (3,))
+        """
+        out[...] = self._position
+        self._position = out
+
+    def share_rotation(self, out):
+        """Makes `out` the array of the rotation of this model, e.g. a row of
+        an array packing the rotations of many models, so that they can all
+        be rotated at once by writing into it (c.f. `mark_moved`). The current
+        rotation is copied into it.
+
+        Parameters
+        ----------
+        out : numpy array (of shape (3, 3))
+        """
+        out[...] = self._rotation
+        self._rotation = out
+
+    @staticmethod
+    def mark_moved(models):
+        """Gives models new versions, after their positions or rotations have
+        been written into directly, e.g. through a packed array (c.f.
+        `share_position` and `share_rotation`). Unlike `mark_dirty`, their
+        geometry is known to be unchanged, so its bounds are kept.
+
+        Parameters
+        ----------
+        models : sequence of Model
+        """
+        first = Wireframe._new_version()
+        # as many distinct versions as there are models
+        Wireframe._last_version += max(len(models) - 1, 0)
+        for model, version in izip(models, count(first)):
+            model._version = version
+
+
+class IndexedModel(Model, IndexedWireframe):
+    """Represents a wireframe model in the game world whose edges share
+    vertices (c.f. `IndexedWireframe`).
+
+    Parameters
+    ----------
+    position : numpy array (of size 3)
+    scale : float, optional
+    rotation : numpy array (of shape (3, 3)), optional
+    """
+    pass
@@ -0,0 +1,386 @@
+"""Contains a renderer drawing the edges of a viewport with a pool of worker
+processes.
+
+A frame is drawn in two parallel passes. First, the selected edges are split
+into contiguous slices, and the workers project, clip, and prepare the lines of
+each slice (c.f. `Viewport.project_edges` and `prepare_lines`). Then the frame
+buffer is split into bands of rows, and the workers draw the pixels of every
+line crossing each band. The lines are drawn in the same order as a single
+process draws them, so that the same pixels end up on top.
+
+The geometry, the prepared lines, and the frame buffer are shared with the
+workers as memory-mapped files in shared memory (c.f. `SharedArrays`); only the
+camera and the bounds of each task are pickled.
+"""
+from __future__ import division
+
+import atexit
+import mmap
+import multiprocessing
+import numpy as np
+import os
+import pygame
+import shutil
+import signal
+import tempfile
+
+from three_d.raster import (band_steps, prepare_lines, rasterize,
+                            read_surface)
+from three_d.scratch import ScratchArrays
+from three_d.world import concatenated_ranges
+
+SHARED_MEMORY_DIRECTORY = '/dev/shm'
+
+class SharedArrays(object):
+    """Arrays which other processes can map by name (c.f. `attach`), kept in
+    files in a temporary directory in shared memory (where available). An
+    array is only moved to a new file when it outgrows its file.
+
+    Attributes
+    ----------
+    directory : str
+    """
+    def __init__(self):
+        parent = SHARED_MEMORY_DIRECTORY \
+                 if os.path.isdir(SHARED_MEMORY_DIRECTORY) else None
+        self.directory = tempfile.mkdtemp(prefix='wireframes-', dir=parent)
+        self._buffers = {}
+        self._count = 0
+        self._owner = os.getpid()
+        atexit.register(self.close)
+
+    def get(self, name, shape, dtype):
+        """Returns the array of a name, with undefined contents.
+
+        Parameters
+        ----------
+        name : str
+        shape : tuple of int
+        dtype : numpy dtype
+
+        Returns
+        -------
+        array : numpy array
+        description : tuple
+            the description of the array to `attach` it in another process
+        """
+        dtype = np.dtype(dtype)
+        size = int(np.prod(shape)) * dtype.itemsize
+        path, buf = self._buffers.get(name, (None, None))
+        if buf is None or len(buf) < size:
+            capacity = max(size, 2 * (len(buf) if buf is not None else 0),
+                           mmap.PAGESIZE)
+            self._count += 1
+            new_path = os.path.join(self.directory,
+                                    '{}-{}'.format(name, self._count))
+            with open(new_path, 'wb') as f:
+                f.truncate(capacity)
+            buf = np.memmap(new_path, dtype=np.uint8, mode='r+',
+                            shape=(capacity,))
+            if path is not None:
+                # the workers still mapping it keep it alive
+                os.remove(path)
+            path = new_path
+            self._buffers[name] = (path, buf)
+        return (buf[:size].view(dtype).reshape(shape),
+                (name, path, tuple(shape), dtype.str))
+
+    def close(self):
+        """Removes the files of the arrays, which remain mapped in the
+        processes that map them.
+        """
+        if os.getpid() == self._owner:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+# the arrays mapped by this (worker) process, by name
+_attached = {}
+
+def attach(description):
+    """Maps an array of a `SharedArrays` of another process.
+
+    Parameters
+    ----------
+    description : tuple
+        as returned by `SharedArrays.get`
+
+    Returns
+    -------
+    numpy array
+    """
+    name, path, shape, dtype = description
+    dtype = np.dtype(dtype)
+    if name not in _attached or _attached[name][0] != path:
+        _attached[name] = (path, np.memmap(path, dtype=np.uint8, mode='r+'))
+    size = int(np.prod(shape)) * dtype.itemsize
+    return _attached[name][1][:size].view(dtype).reshape(shape)
+
+
+class ParallelRenderer(object):
+    """Draws the edges of a viewport with a pool of worker processes.
+
+    Parameters
+    ----------
+    workers : int
+    tasks_per_worker : int, optional
+        the number of slices of edges and bands of rows into which each pass
+        is split per worker, so that workers finishing early take over the
+        work of the others. Default is 2.
+
+    Attributes
+    ----------
+    workers : int
+    tasks_per_worker : int
+    arrays : SharedArrays
+    pool : multiprocessing.Pool
+    """
+    def __init__(self, workers, tasks_per_worker=2):
+        self.workers = workers
+        self.tasks_per_worker = tasks_per_worker
+        self.arrays = SharedArrays()
+        self.pool = multiprocessing.Pool(workers, initializer=_init_worker)
+        self._world = None
+        self._world_version = None
+        self._world_descriptions = None
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+        self.arrays.close()
+
+    def share_world(self, world):
+        """Copies the packed geometry of the models into shared memory, unless
+        it has not changed since the last frame.
+
+        Returns
+        -------
+        dict
+            the descriptions of the shared arrays, by name
+        """
+        if world is not self._world or world.version != self._world_version:
+            descriptions = {}
+            for name in ('vertices', 'edge_indices', 'colors'):
+                array = getattr(world, name)
+                shared, descriptions[name] = self.arrays.get(
+                    'world_' + name, array.shape, array.dtype)
+                shared[...] = array
+            self._world = world
+            self._world_version = world.version
+            self._world_descriptions = descriptions
+        return self._world_descriptions
+
+    def draw(self, view, world, edge_starts, edge_counts, points,
+             point_colors, world_to_camera, transform):
+        """Draws the selected geometry of the models on the surface of a
+        viewport (c.f. `Viewport.select_models`).
+
+        Parameters
+        ----------
+        view : Viewport
+        world : WorldGeometry
+        edge_starts, edge_counts : numpy array of int
+            the ranges of the edges to draw in the packed geometry
+        points : numpy array (of shape (S, 4))
+            the points to draw, after the edges
+        point_colors : numpy array (of shape (S,))
+        world_to_camera : numpy array (of shape (4, 4))
+        transform : numpy array (of shape (4, 4))
+            the matrix transforming world coordinates to clip coordinates
+
+        Returns
+        -------
+        int
+            the number of edges drawn
+        """
+        surface = view.surface
+        rect = surface.get_clip()
+        num_edges = int(edge_counts.sum())
+        total = num_edges + len(points)
+        if not total or not rect.width or not rect.height:
+            return 0
+        frame = {'view': view.detached_copy(),
+                 'world_to_camera': world_to_camera,
+                 'transform': transform,
+                 'rect': tuple(rect),
+                 'num_edges': num_edges,
+                 'fade_color': view.background_color}
+        shared = dict(self.share_world(world))
+
+        ranges, shared['ranges'] = self.arrays.get('ranges',
+                                                   (len(edge_starts), 3),
+                                                   np.intp)
+        ranges[:, 0] = edge_starts
+        np.cumsum(edge_counts, out=ranges[:, 2])
+        ranges[:, 1] = ranges[:, 2] - edge_counts
+        for name, array in (('points', points),
+                            ('point_colors', point_colors)):
+            shared_array, shared[name] = self.arrays.get(name, array.shape,
+                                                         array.dtype)
+            shared_array[...] = array
+        # the prepared lines of every slice, in place of its edges
+        for name, shape, dtype in (('lines', (total, 4), np.intp),
+                                   ('rows', (total, 2), np.intp),
+                                   ('params', (total, 2), float),
+                                   ('line_colors', (total,),
+                                    world.colors.dtype),
+                                   ('depths', (total, 2), np.float32),
+                                   ('shades', (total, 2), np.float32)):
+            _, shared[name] = self.arrays.get(name, shape, dtype)
+        pixels, shared['pixels'] = self.arrays.get(
+            'pixels', (rect.height + 1, rect.width + 1), np.uint32)
+        frame['shared'] = shared
+
+        num_tasks = self.workers * self.tasks_per_worker
+        bounds = np.linspace(0, total, num_tasks + 1).astype(int)
+        slices = [(frame, start, stop)
+                  for start, stop in zip(bounds[:-1], bounds[1:])
+                  if stop > start]
+        counts = self.pool.map(project_slice, slices, chunksize=1)
+        view.profiler.lap('projection')
+
+        target = surface.subsurface(rect)
+        read_surface(target, pixels[:-1, :-1].T)
+        # the unclipped lines of every slice come before the clipped ones
+        regions = [(start, start + num_unclipped)
+                   for (_, start, _), (num_unclipped, _)
+                   in zip(slices, counts)]
+        regions += [(start + num_unclipped, start + num_lines)
+                    for (_, start, _), (num_unclipped, num_lines)
+                    in zip(slices, counts)]
+        bounds = np.linspace(0, rect.height + 1, num_tasks + 1).astype(int)
+        self.pool.map(draw_band,
+                      [(frame, regions, row_low, row_high)
+                       for row_low, row_high in zip(bounds[:-1], bounds[1:])
+                       if row_high > row_low],
+                      chunksize=1)
+        pygame.surfarray.blit_array(target, pixels[:-1, :-1].T)
+        view.profiler.lap('raster')
+        return sum(num_lines for _, num_lines in counts)
+
+
+def _init_worker():
+    # interrupting the main process stops the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # SDL's handler, inherited from the main process, would hang the worker
+    # when the pool terminates it
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+# the buffers of the slices projected by this (worker) process
+_scratch = ScratchArrays()
+
+def project_slice(task):
+    """Projects, clips, and prepares the lines of a slice of the edges of a
+    frame in a worker process, in place of the edges.
+
+    Parameters
+    ----------
+    task : tuple
+        the frame, and the first and last (excluded) edges of the slice among
+        the selected edges followed by the points
+
+    Returns
+    -------
+    num_unclipped : int
+        the number of lines that were not clipped, which come first
+    num_lines : int
+        the number of lines of the slice
+    """
+    frame, start, stop = task
+    shared = dict((name, attach(description))
+                  for name, description in frame['shared'].iteritems())
+    num_edges = frame['num_edges']
+
+    # the edges of the slice in the packed geometry
+    edge_stop = min(stop, num_edges)
+    ranges = shared['ranges']
+    pieces = slice(np.searchsorted(ranges[:, 2], start, 'right'),
+                   np.searchsorted(ranges[:, 2], edge_stop, 'left') + 1)
+    firsts = np.maximum(ranges[pieces, 1], start)
+    lasts = np.minimum(ranges[pieces, 2], edge_stop)
+    edge_ids = concatenated_ranges(ranges[pieces, 0] + firsts
+                                   - ranges[pieces, 1],
+                                   np.maximum(lasts - firsts, 0))
+    world_indices = shared['edge_indices'][edge_ids]
+    points = shared['points'][max(start - num_edges, 0):
+                              max(stop - num_edges, 0)]
+    vertices = np.concatenate((shared['vertices'][world_indices.ravel()],
+                               points))
+    edge_indices = np.concatenate((
+        np.arange(2 * len(edge_ids)).reshape((-1, 2)),
+        np.repeat(np.arange(2 * len(edge_ids), len(vertices))[:, np.newaxis],
+                  2, axis=1)))
+    colors = np.concatenate((shared['colors'][edge_ids],
+                             shared['point_colors'][
+                                 max(start - num_edges, 0):
+                                 max(stop - num_edges, 0)]))
+
+    view = frame['view']
+    view.scratch = _scratch
+    view_starts, view_ends, colors, depths, shades, num_unclipped = \
+        view.project_edges(vertices, edge_indices, colors,
+                           frame['world_to_camera'], frame['transform'])
+    visible, starts, ends, params = prepare_lines(
+        view_starts, view_ends, pygame.Rect(frame['rect']))
+    lines = slice(start, start + len(starts))
+    shared['lines'][lines, :2] = starts
+    shared['lines'][lines, 2:] = ends
+    np.minimum(starts[:, 1], ends[:, 1], out=shared['rows'][lines, 0])
+    np.maximum(starts[:, 1], ends[:, 1], out=shared['rows'][lines, 1])
+    shared['params'][lines] = params
+    shared['line_colors'][lines] = colors[visible]
+    if depths is not None:
+        shared['depths'][lines] = depths[visible]
+    if shades is not None:
+        shared['shades'][lines] = shades[visible]
+    return int(visible[:num_unclipped].sum()), len(starts)
+
+
+# the depth buffer of this (worker) process, and its scratch array
+_depth_buffers = [None, None]
+
+def draw_band(task):
+    """Draws the pixels of the prepared lines of a frame in a band of rows
+    of the frame buffer in a worker process.
+
+    Parameters
+    ----------
+    task : tuple
+        the frame, the ranges of the lines in drawing order, and the first
+        row of the band and the first row after it
+    """
+    frame, regions, row_low, row_high = task
+    shared = dict((name, attach(description))
+                  for name, description in frame['shared'].iteritems())
+    pixels = shared['pixels']
+    rows = shared['rows']
+    selected = []
+    for first, last in regions:
+        crossing = (rows[first:last, 0] < row_high) \
+                   & (rows[first:last, 1] >= row_low)
+        selected.append(np.flatnonzero(crossing) + first)
+    selected = np.concatenate(selected)
+    if not len(selected):
+        return
+    lines = shared['lines'][selected]
+    starts = lines[:, :2]
+    ends = lines[:, 2:]
+    first_steps, last_steps = band_steps(starts, ends, row_low, row_high)
+
+    view = frame['view']
+    depths = shades = None
+    depth_buffer, owners = _depth_buffers
+    if view.depth_test:
+        if depth_buffer is None or depth_buffer.shape != pixels.shape:
+            depth_buffer = np.empty(pixels.shape, dtype=np.float32)
+            owners = np.zeros(pixels.size, dtype=np.intp)
+            _depth_buffers[:] = depth_buffer, owners
+        depth_buffer[row_low:row_high] = np.inf
+        depths = shared['depths'][selected]
+    if view.fade_distances is not None:
+        shades = shared['shades'][selected]
+    offsets, pixel_colors = rasterize(
+        starts, ends, shared['params'][selected],
+        shared['line_colors'][selected], pixels.shape[1], depths, shades,
+        frame['fade_color'], depth_buffer, owners, first_steps, last_steps)
+    pixels.ravel()[offsets] = pixel_colors
@@ -1,11 +1,15 @@
 """Contains primitive three-dimensional types
 """
 import copy
+import math
+import numpy as np
 
 from numbers import Number
 
 from abc import ABCMeta, abstractmethod
 
+from three_d.mathutil import affine_parts
+
 class Entity3D(object):
     """The interface for a three-dimensional entity that can be manipulated in
     the usual ways. Subclasses must implement __imul__, __iadd__, and __isub__.
@@ -35,18 +39,24 @@ class Entity3D(object):
     def __isub__(self, vect):
         pass
 
+    def clone(self):
+        """Returns a copy of this entity, which the binary operators then
+        change in place.
+        """
+        return copy.deepcopy(self)
+
     def __mul__(self, v):
-        new = copy.deepcopy(self)
+        new = self.clone()
         new *= v
         return new
 
     def __add__(self, v):
-        new = copy.deepcopy(self)
+        new = self.clone()
         new += v
         return new
 
     def __sub__(self, v):
-        new = copy.deepcopy(self)
+        new = self.clone()
         new -= v
         return new
 
@@ -90,31 +100,532 @@ class Edge(Entity3D):
             .format(self.start, self.end, self.color)
 
 
+class _Endpoint(np.ndarray):
+    """A copy of an endpoint of an `EdgeView`, which writes itself back to the
+    wireframe whenever an element of it is assigned (e.g. `edge.start[1] =
+    7`), just as assigning the whole endpoint does.
+    """
+    def __array_finalize__(self, obj):
+        # arrays computed from an endpoint are plain copies
+        self._edge = None
+        self._name = None
+
+    def __setitem__(self, index, value):
+        super(_Endpoint, self).__setitem__(index, value)
+        if self._edge is not None:
+            setattr(self._edge, self._name, self.view(np.ndarray))
+
+    def __repr__(self):
+        return repr(self.view(np.ndarray))
+
+
+class EdgeView(Edge):
+    """A lightweight view of a single edge stored in a `Wireframe`. Reading
+    `start` or `end` gives a copy of the endpoint; assigning it, or any of its
+    elements, or `color` writes the arrays of the underlying wireframe, which
+    is then marked dirty (and no longer shares its arrays with its clones).
+    For an `IndexedWireframe`, writing an endpoint moves the shared vertex, and
+    therefore every edge incident to it.
+
+    Parameters
+    ----------
+    wireframe : Wireframe
+    index : int
+    """
+    def __init__(self, wireframe, index):
+        self._wireframe = wireframe
+        self._index = index
+
+    def _vertex_index(self, end):
+        return self._wireframe.edge_indices[self._index, end]
+
+    def _endpoint(self, end, name):
+        point = np.array(self._wireframe.vertices[self._vertex_index(end)],
+                         dtype=float).view(_Endpoint)
+        point._edge = self
+        point._name = name
+        return point
+
+    def _set_endpoint(self, end, value):
+        self._wireframe.make_writable()
+        self._wireframe.vertices[self._vertex_index(end)] = value
+        self._wireframe.mark_dirty()
+
+    @property
+    def start(self):
+        return self._endpoint(0, 'start')
+
+    @start.setter
+    def start(self, value):
+        self._set_endpoint(0, value)
+
+    @property
+    def end(self):
+        return self._endpoint(1, 'end')
+
+    @end.setter
+    def end(self, value):
+        self._set_endpoint(1, value)
+
+    @property
+    def color(self):
+        return int(self._wireframe.colors[self._index])
+
+    @color.setter
+    def color(self, value):
+        self._wireframe.make_writable()
+        self._wireframe.colors[self._index] = value
+        self._wireframe.mark_dirty()
+
+
 class Wireframe(Entity3D):
     """Represents a wireframe mesh in its own coordinate system.
 
+    The edges are stored in structure-of-arrays form: the endpoints live in
+    one contiguous `(2 * N, 3)` float array, whose first and second halves are
+    the `(N, 3)` start and end arrays, and the colors in an `(N,)` `uint32`
+    array. Every wireframe also exposes its geometry as a vertex array plus an
+    `(N, 2)` array of vertex indices, which is how the viewports consume it.
+
+    Every change made through the methods of a wireframe gives it a new
+    `version`. Code writing into the arrays directly must call `make_writable`
+    before and `mark_dirty` afterwards.
+
+    The whole geometry is moved, scaled, or rotated at once by `transform`.
+    A `clone` shares the arrays of the original until either of them is
+    changed, so that copying a large mesh to transform the copy (as the binary
+    operators do) only costs the transformed vertices.
+
     Parameters
     ----------
-    edges : iterable of edges, optional
+    edges : iterable of Edge, optional
+    starts, ends : array-like (of shape (N, 3)), optional
+        The edge endpoints. If given, `edges` is ignored.
+    colors : array-like (of shape (N,)) of int, optional
+        The edge colors, used together with `starts` and `ends`. Default is
+        `0xFFFFFF` for every edge.
 
     Attributes
     ----------
-    edges : iterable of edges
+    edges : list of EdgeView
+    starts, ends : numpy array (of shape (N, 3))
+    colors : numpy array (of shape (N,)) of uint32
+    vertices : numpy array (of shape (V, 3))
+    edge_indices : numpy array (of shape (N, 2)) of int
+    bounds : tuple of numpy array
+    lod_levels : list of tuple
+    version : int
     """
-    def __init__(self, edges=None):
-        self.edges = edges if edges is not None else []
+    _last_version = 0
+
+    def __init__(self, edges=None, starts=None, ends=None, colors=None):
+        self._bounds_version = None
+        if starts is not None:
+            self.set_arrays(starts, ends, colors)
+        else:
+            self.edges = edges if edges is not None else []
+
+    def set_arrays(self, starts, ends, colors=None):
+        """Replaces all edges of this wireframe.
+
+        Parameters
+        ----------
+        starts, ends : array-like (of shape (N, 3))
+        colors : array-like (of shape (N,)) of int, optional
+        """
+        starts = np.asarray(starts, dtype=float).reshape((-1, 3))
+        ends = np.asarray(ends, dtype=float).reshape((-1, 3))
+        assert starts.shape == ends.shape
+        n = len(starts)
+        self._vertices = np.empty((2 * n, 3))
+        self._vertices[:n] = starts
+        self._vertices[n:] = ends
+        self._edge_indices = None
+        self._colors = Wireframe._pack_colors(colors, n)
+        self._lods = []
+        self.mark_dirty()
+
+    def clone(self):
+        """Returns a copy of this wireframe that shares its arrays (and levels
+        of detail) until either of them is changed. Until then, the shared
+        arrays of both are read-only (c.f. `make_writable`), while changing
+        either through its methods or `edges` first copies them.
+
+        Returns
+        -------
+        Wireframe
+        """
+        new = copy.copy(self)
+        for name in ('_vertices', '_colors', '_edge_indices'):
+            array = getattr(self, name)
+            if array is not None and array.flags.writeable:
+                shared = array.view()
+                shared.flags.writeable = False
+                setattr(self, name, shared)
+                setattr(new, name, shared)
+        new._lods = list(self._lods)
+        new._version = Wireframe._new_version()
+        return new
+
+    def _check_mutable(self):
+        # overridden by wireframes that cannot be changed
+        pass
+
+    def _own_array(self, name):
+        """Returns the array of an attribute, which is first copied if it is
+        read-only, e.g. because it is shared with a clone.
+        """
+        self._check_mutable()
+        array = getattr(self, name)
+        if not array.flags.writeable:
+            array = array.copy()
+            setattr(self, name, array)
+        return array
+
+    def make_writable(self):
+        """Copies the arrays of this wireframe that are read-only, e.g.
+        because they are shared with a clone, so that they can be written
+        into directly.
+        """
+        for name in ('_vertices', '_colors', '_edge_indices'):
+            if getattr(self, name) is not None:
+                self._own_array(name)
+
+    def mark_dirty(self):
+        """Gives this wireframe a new version. Must be called after writing
+        into its arrays directly.
+        """
+        self._version = self._geometry_version = Wireframe._new_version()
+
+    @staticmethod
+    def _new_version():
+        Wireframe._last_version += 1
+        return Wireframe._last_version
+
+    @property
+    def version(self):
+        """A number that changes whenever this wireframe changes. Versions are
+        unique across all wireframes and increase monotonically.
+        """
+        return self._version
+
+    @staticmethod
+    def last_version():
+        """Returns the most recent version given to any wireframe, so that
+        comparing it against an earlier value tells whether any wireframe has
+        changed in between.
+        """
+        return Wireframe._last_version
+
+    @staticmethod
+    def _pack_colors(colors, n):
+        packed = np.empty(n, dtype=np.uint32)
+        packed[:] = 0xFFFFFF if colors is None else colors
+        return packed
+
+    @property
+    def edges(self):
+        """Views of the edges of this wireframe. Assigning an iterable of
+        `Edge` replaces all edges.
+        """
+        return [EdgeView(self, i) for i in xrange(self.num_edges)]
+
+    @edges.setter
+    def edges(self, edges):
+        edges = list(edges)
+        n = len(edges)
+        starts = np.empty((n, 3))
+        ends = np.empty((n, 3))
+        colors = np.empty(n, dtype=np.uint32)
+        for i, edge in enumerate(edges):
+            starts[i] = edge.start
+            ends[i] = edge.end
+            colors[i] = edge.color
+        self.set_arrays(starts, ends, colors)
+
+    @property
+    def bounds(self):
+        """The axis-aligned bounding box of the vertices, as a tuple of the
+        minimum and maximum corners. The box of an empty wireframe has
+        infinite minima and negative infinite maxima.
+        """
+        if self._bounds_version != self._geometry_version:
+            if len(self.vertices):
+                self._bounds = (self.vertices.min(axis=0),
+                                self.vertices.max(axis=0))
+            else:
+                self._bounds = (np.full(3, np.inf), np.full(3, -np.inf))
+            self._bounds_version = self._geometry_version
+        return self._bounds
+
+    @property
+    def lod_levels(self):
+        """The levels of detail of this wireframe, from the finest to the
+        coarsest, as a list of tuples `(error, edge_indices, colors)`. The
+        first level is the full set of edges with an error of 0; the others are
+        built by `build_lods`. All levels refer to `vertices`, and `error`
+        bounds how far (in the coordinates of the wireframe) any vertex of a
+        level is from where it should be.
+        """
+        return [(0.0, self.edge_indices, self.colors)] + self._lods
+
+    def build_lods(self, count=3, factor=4.0):
+        """Precomputes simplified versions of the edges of this wireframe,
+        which viewports draw instead when the wireframe is far enough away.
+        Short edges are collapsed by merging all vertices within the same cell
+        of a grid into one of them. Levels that would not remove any edges are
+        left out. The levels are discarded when the arrays of this wireframe
+        are replaced.
+
+        Parameters
+        ----------
+        count : int, optional
+            The maximum number of simplified levels. Default is 3.
+        factor : float, optional
+            The ratio between the grid cell sizes of consecutive levels; the
+            coarsest level uses cells of `1 / factor` of the diagonal of the
+            bounding box. Default is 4.
+        """
+        self._lods = []
+        low, high = self.bounds
+        diagonal = np.linalg.norm(high - low) if len(self.vertices) else 0.0
+        edge_count = self.num_edges
+        for k in xrange(count, 0, -1):
+            if not diagonal:
+                break
+            cell = diagonal / factor ** k
+            edge_indices, colors = self._collapse_edges(cell)
+            if len(edge_indices) < edge_count:
+                self._lods.append((cell * math.sqrt(3), edge_indices, colors))
+                edge_count = len(edge_indices)
+        self.mark_dirty()
+
+    def _collapse_edges(self, cell):
+        cells = np.floor((self.vertices - self.bounds[0]) / cell)
+        _, first, inverse = np.unique(cells.astype(np.int64), axis=0,
+                                      return_index=True, return_inverse=True)
+        edge_indices = first[inverse][self.edge_indices]
+        kept = edge_indices[:, 0] != edge_indices[:, 1]
+        edge_indices = edge_indices[kept]
+        colors = self.colors[kept]
+        if len(edge_indices):
+            _, unique = np.unique(np.sort(edge_indices, axis=1), axis=0,
+                                  return_index=True)
+            unique.sort()
+            edge_indices = edge_indices[unique]
+            colors = colors[unique]
+        return edge_indices, colors
+
+    @property
+    def num_edges(self):
+        """The number of edges in this wireframe.
+        """
+        return len(self._colors)
+
+    @property
+    def starts(self):
+        """The `(N, 3)` array of edge start points.
+        """
+        return self._vertices[:self.num_edges]
+
+    @property
+    def ends(self):
+        """The `(N, 3)` array of edge end points.
+        """
+        return self._vertices[self.num_edges:]
+
+    @property
+    def colors(self):
+        """The `(N,)` array of edge colors as packed RGB integers.
+        """
+        return self._colors
+
+    @property
+    def vertices(self):
+        """The `(V, 3)` array of distinct vertices referenced by
+        `edge_indices`.
+        """
+        return self._vertices
+
+    @property
+    def edge_indices(self):
+        """The `(N, 2)` array of the start and end vertex indices of each edge.
+        """
+        if self._edge_indices is None:
+            n = self.num_edges
+            self._edge_indices = np.empty((n, 2), dtype=np.intp)
+            self._edge_indices[:, 0] = np.arange(n)
+            self._edge_indices[:, 1] = np.arange(n, 2 * n)
+        return self._edge_indices
+
+    def transform(self, matrix):
+        """Applies an affine transform to all vertices of this wireframe at
+        once, in place.
+
+        Parameters
+        ----------
+        matrix : array-like (of shape (4, 4))
+            the transform in homogeneous coordinates (c.f.
+            `translation_matrix`, `scaling_matrix`, and `rotation_matrix`),
+            which may be a product of several of them
+
+        Returns
+        -------
+        Wireframe
+            this wireframe
+        """
+        linear, offset = affine_parts(matrix)
+        self._check_mutable()
+        transformed = self._vertices.dot(linear.T)
+        transformed += offset
+        if self._vertices.flags.writeable:
+            self._vertices[...] = transformed
+        else:
+            # the vertices are shared with a clone, so they are not copied
+            self._vertices = transformed
+        # the vertices are at most this much farther apart
+        self._scale_lod_errors(np.linalg.norm(linear, 2))
+        self.mark_dirty()
+        return self
+
+    def transformed(self, matrix):
+        """Returns a clone of this wireframe to which an affine transform has
+        been applied (c.f. `transform`).
+
+        Parameters
+        ----------
+        matrix : array-like (of shape (4, 4))
+
+        Returns
+        -------
+        Wireframe
+        """
+        return self.clone().transform(matrix)
+
+    def _scale_lod_errors(self, factor):
+        self._lods = [(error * factor, edge_indices, colors)
+                      for error, edge_indices, colors in self._lods]
 
     def __iadd__(self, vect):
-        for i in xrange(len(self.edges)):
-            self.edges[i] += vect
+        vertices = self._own_array('_vertices')
+        vertices += vect
+        self.mark_dirty()
+        return self
 
     def __isub__(self, vect):
-        for i in xrange(len(self.edges)):
-            self.edges[i] -= vect
+        vertices = self._own_array('_vertices')
+        vertices -= vect
+        self.mark_dirty()
+        return self
 
     def __imul__(self, v):
-        for i in xrange(len(self.edges)):
-            self.edges[i] *= vect
+        vertices = self._own_array('_vertices')
+        vertices *= v
+        self._scale_lod_errors(np.max(np.abs(v)))
+        self.mark_dirty()
+        return self
 
     def __repr__(self):
         return 'Wireframe(edges={!r})'.format(self.edges)
+
+
+class IndexedWireframe(Wireframe):
+    """Represents a wireframe mesh whose edges share vertices. Each distinct
+    vertex is stored (and transformed) once, and edges refer to vertices by
+    index.
+
+    Parameters
+    ----------
+    vertices : array-like (of shape (V, 3)), optional
+    edge_indices : array-like (of shape (N, 2)) of int, optional
+        The start and end vertex indices of each edge. Required if `vertices`
+        is given.
+    colors : array-like (of shape (N,)) of int, optional
+    copy : bool, optional
+        Whether to copy `vertices`, `edge_indices`, and `colors` (c.f.
+        `set_indexed_arrays`). Default is `True`.
+    edges, starts, ends : optional
+        As for `Wireframe`; used if `vertices` is not given. Coincident
+        endpoints are merged into a single vertex.
+    """
+    def __init__(self, vertices=None, edge_indices=None, colors=None,
+                 copy=True, **kwargs):
+        if vertices is not None:
+            self._bounds_version = None
+            self.set_indexed_arrays(vertices, edge_indices, colors, copy=copy)
+        else:
+            super(IndexedWireframe, self).__init__(colors=colors, **kwargs)
+
+    def set_indexed_arrays(self, vertices, edge_indices, colors=None,
+                           copy=True):
+        """Replaces all vertices and edges of this wireframe.
+
+        Parameters
+        ----------
+        vertices : array-like (of shape (V, 3))
+        edge_indices : array-like (of shape (N, 2)) of int
+        colors : array-like (of shape (N,)) of int, optional
+        copy : bool, optional
+            Whether to copy the arrays into new `float`, `intp`, and `uint32`
+            arrays. If `False`, floating-point vertices, integer edge indices,
+            and `uint32` colors are used as they are, e.g., straight from a
+            memory-mapped file, and the others are converted. Default is
+            `True`.
+        """
+        if copy:
+            vertices = np.asarray(vertices, dtype=float)
+            edge_indices = np.asarray(edge_indices, dtype=np.intp)
+        else:
+            vertices = np.asarray(vertices)
+            if vertices.dtype.kind != 'f':
+                vertices = vertices.astype(float)
+            edge_indices = np.asarray(edge_indices)
+            if edge_indices.dtype.kind not in 'iu':
+                edge_indices = edge_indices.astype(np.intp)
+        self._vertices = vertices.reshape((-1, 3))
+        self._edge_indices = edge_indices.reshape((-1, 2))
+        n = len(self._edge_indices)
+        if not copy and isinstance(colors, np.ndarray) \
+           and colors.dtype == np.uint32 and colors.shape == (n,):
+            self._colors = colors
+        else:
+            self._colors = Wireframe._pack_colors(colors, n)
+        self._lods = []
+        self.mark_dirty()
+
+    def set_arrays(self, starts, ends, colors=None):
+        starts = np.asarray(starts, dtype=float).reshape((-1, 3))
+        ends = np.asarray(ends, dtype=float).reshape((-1, 3))
+        assert starts.shape == ends.shape
+        n = len(starts)
+        if n == 0:
+            self.set_indexed_arrays(starts, np.empty((0, 2)), colors)
+            return
+        vertices, inverse = np.unique(np.concatenate((starts, ends)), axis=0,
+                                      return_inverse=True)
+        edge_indices = np.empty((n, 2), dtype=np.intp)
+        edge_indices[:, 0] = inverse[:n]
+        edge_indices[:, 1] = inverse[n:]
+        self.set_indexed_arrays(vertices, edge_indices, colors)
+
+    @property
+    def starts(self):
+        """The `(N, 3)` array of edge start points. This is a copy; write to
+        `vertices` to move edges.
+        """
+        return self._vertices[self._edge_indices[:, 0]]
+
+    @property
+    def ends(self):
+        """The `(N, 3)` array of edge end points. This is a copy; write to
+        `vertices` to move edges.
+        """
+        return self._vertices[self._edge_indices[:, 1]]
+
+    @property
+    def edge_indices(self):
+        return self._edge_indices
+
+    def __repr__(self):
+        return 'IndexedWireframe(vertices={!r}, edge_indices={!r})' \
+            .format(self.vertices, self.edge_indices)
@@ -0,0 +1,285 @@
+"""Contains a profiler timing the stages of every frame.
+"""
+from __future__ import division
+
+import json
+import numpy as np
+import pygame
+import timeit
+
+# the stages of a frame, in the order in which they happen
+STAGES = ('simulate', 'world', 'cull', 'projection', 'clip', 'divide', 'view',
+          'raster', 'overlay', 'display')
+
+class RollingSeries(object):
+    """The most recent samples of a quantity, e.g., the duration of a stage in
+    each of the last few hundred frames.
+
+    Parameters
+    ----------
+    size : int
+        the number of samples to keep
+
+    Attributes
+    ----------
+    count : int
+        the number of samples ever added
+    last : float
+        the most recent sample
+    """
+    def __init__(self, size):
+        self._samples = np.zeros(size)
+        self.count = 0
+        self.last = 0.0
+
+    def __len__(self):
+        return min(self.count, len(self._samples))
+
+    def append(self, value):
+        self._samples[self.count % len(self._samples)] = value
+        self.count += 1
+        self.last = value
+
+    @property
+    def values(self):
+        """numpy array: the kept samples, from the oldest to the newest
+        """
+        if self.count <= len(self._samples):
+            return self._samples[:self.count].copy()
+        return np.roll(self._samples, -(self.count % len(self._samples)))
+
+    def mean(self):
+        return self.values.mean() if len(self) else 0.0
+
+    def percentile(self, q):
+        """Computes percentiles of the kept samples.
+
+        Parameters
+        ----------
+        q : float or sequence of float
+            the percentiles, in [0, 100]
+
+        Returns
+        -------
+        float or numpy array
+        """
+        if not len(self):
+            return np.zeros(np.shape(q)) if np.ndim(q) else 0.0
+        return np.percentile(self.values, q)
+
+    def histogram(self, bins=10, range=None):
+        """Computes the histogram of the kept samples (c.f.
+        `numpy.histogram`).
+
+        Returns
+        -------
+        counts : numpy array of int
+        edges : numpy array
+            the edges of the bins
+        """
+        return np.histogram(self.values, bins=bins, range=range)
+
+    def summary(self):
+        """Returns the mean, median, 99th percentile, and maximum of the kept
+        samples, and the latest sample, as a `dict`.
+        """
+        p50, p99, high = self.percentile([50, 99, 100]).tolist()
+        return {'mean': float(self.mean()), 'p50': p50, 'p99': p99,
+                'max': high, 'last': float(self.last)}
+
+
+class FrameProfiler(object):
+    """Times the stages of frames and counts what they process, keeping the
+    values of the last `history` frames.
+
+    A frame is timed as a sequence of laps: `lap` charges the time since the
+    previous lap (or `begin_frame` or `mark`) to a stage. Several laps of the
+    same stage within a frame add up. Stages that do not happen in a frame
+    (e.g., because nothing had to be drawn) get no sample for it.
+
+    When disabled, every method returns immediately, so that the calls can
+    stay in place at almost no cost.
+
+    Parameters
+    ----------
+    history : int, optional
+        the number of frames to keep. Default is 300.
+    enabled : bool, optional
+        Default is `True`.
+
+    Attributes
+    ----------
+    enabled : bool
+    stages : dict of str to RollingSeries
+        the durations of the stages in seconds. `'frame'` is the duration of
+        the whole frame, from `begin_frame` to `end_frame`, and `'interval'`
+        the time between the beginnings of consecutive frames.
+    counters : dict of str to RollingSeries
+        the counts per frame, e.g., of `'models'` and `'edges'`
+    """
+    def __init__(self, history=300, enabled=True):
+        self.history = history
+        self.enabled = enabled
+        self.stages = {}
+        self.counters = {}
+        self._frame_start = None
+        self._mark = 0.0
+        self._times = {}
+        self._counts = {}
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        now = timeit.default_timer()
+        if self._frame_start is not None:
+            self._get_series(self.stages, 'interval').append(
+                now - self._frame_start)
+        self._frame_start = self._mark = now
+        self._times = {}
+        self._counts = {}
+
+    def mark(self):
+        """Starts the next lap without charging the time since the last one
+        to any stage.
+        """
+        if not self.enabled:
+            return
+        self._mark = timeit.default_timer()
+
+    def lap(self, stage):
+        """Charges the time since the last lap to a stage.
+
+        Parameters
+        ----------
+        stage : str
+        """
+        if not self.enabled:
+            return
+        now = timeit.default_timer()
+        self._times[stage] = self._times.get(stage, 0.0) + now - self._mark
+        self._mark = now
+
+    def count(self, name, value):
+        """Adds to a counter of the current frame.
+
+        Parameters
+        ----------
+        name : str
+        value : int
+        """
+        if not self.enabled:
+            return
+        self._counts[name] = self._counts.get(name, 0) + value
+
+    def end_frame(self):
+        if not self.enabled or self._frame_start is None:
+            return
+        self._get_series(self.stages, 'frame').append(
+            timeit.default_timer() - self._frame_start)
+        for stage, duration in self._times.iteritems():
+            self._get_series(self.stages, stage).append(duration)
+        for name, value in self._counts.iteritems():
+            self._get_series(self.counters, name).append(value)
+        self._times = {}
+        self._counts = {}
+
+    def reset(self):
+        """Forgets all samples.
+        """
+        self.stages = {}
+        self.counters = {}
+        self._frame_start = None
+
+    @property
+    def fps(self):
+        """float: the mean frame rate over the kept frames
+        """
+        interval = self.stages.get('interval')
+        mean = interval.mean() if interval is not None else 0.0
+        return 1 / mean if mean else 0.0
+
+    def stage_names(self):
+        """Returns the names of the timed stages, in the order of `STAGES`
+        followed by the others in alphabetical order.
+        """
+        known = [stage for stage in STAGES if stage in self.stages]
+        return known + sorted(set(self.stages) - set(known))
+
+    def summary(self):
+        """Summarizes the kept samples (c.f. `RollingSeries.summary`), with
+        durations in milliseconds.
+
+        Returns
+        -------
+        dict
+        """
+        stages = {}
+        for stage, series in self.stages.iteritems():
+            stages[stage] = dict((key, value * 1000) for key, value in
+                                 series.summary().iteritems())
+        counters = dict((name, series.summary())
+                        for name, series in self.counters.iteritems())
+        return {'fps': self.fps, 'frames': self.stages['frame'].count
+                if 'frame' in self.stages else 0,
+                'stages_ms': stages, 'counters': counters}
+
+    def dump(self, filename, bins=20):
+        """Writes the summary and the histograms of the kept samples (with
+        durations in milliseconds) to a file as JSON.
+
+        Parameters
+        ----------
+        filename : str
+        bins : int, optional
+            the number of bins of each histogram. Default is 20.
+        """
+        report = self.summary()
+        histograms = {}
+        for group, scale in ((self.stages, 1000), (self.counters, 1)):
+            for name, series in group.iteritems():
+                counts, edges = series.histogram(bins)
+                histograms[name] = {'counts': counts.tolist(),
+                                    'edges': (edges * scale).tolist()}
+        report['histograms'] = histograms
+        with open(filename, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    def render_overlay(self, font, color=(255, 0, 0)):
+        """Renders the frame rate, the mean duration of every stage, and the
+        mean counts as text.
+
+        Parameters
+        ----------
+        font : pygame font
+        color : tuple of int, optional
+            Default is red.
+
+        Returns
+        -------
+        pygame surface
+            the text on a transparent background
+        """
+        lines = ['{:.1f} fps'.format(self.fps)]
+        for stage in self.stage_names():
+            if stage == 'interval':
+                continue
+            series = self.stages[stage]
+            lines.append('{}: {:.2f} ms (p99 {:.2f})'.format(
+                stage, series.mean() * 1000, series.percentile(99) * 1000))
+        for name in sorted(self.counters):
+            lines.append('{}: {:.0f}'.format(name,
+                                             self.counters[name].mean()))
+
+        texts = [font.render(line, True, color) for line in lines]
+        overlay = pygame.Surface(
+            (max(text.get_width() for text in texts),
+             font.get_linesize() * len(texts)), pygame.SRCALPHA)
+        for i, text in enumerate(texts):
+            overlay.blit(text, (0, i * font.get_linesize()))
+        return overlay
+
+    def _get_series(self, group, name):
+        series = group.get(name)
+        if series is None:
+            series = group[name] = RollingSeries(self.history)
+        return series
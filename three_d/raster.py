@@ -0,0 +1,465 @@
+"""Contains a rasterizer drawing many lines at once with NumPy.
+
+The lines are drawn exactly as `pygame.draw.line` (of pygame 2.0) draws them
+one at a time: the endpoints are truncated to integers, clipped against the
+clip area of the surface, and the pixels in between are those of Bresenham's
+algorithm. Instead of stepping through the pixels of each line, every pixel of
+every line is computed directly from its position along the line.
+"""
+from __future__ import division
+
+import numpy as np
+import pygame
+
+# the largest magnitude of a pixel coordinate, so that the coordinates of
+# lines going very far off the surface still fit the integer arithmetic
+MAX_COORD = 1 << 30
+
+def clip_lines(starts, ends, rect):
+    """Clips lines with integer endpoints against a rectangle with the
+    Liang-Barsky algorithm, rounding the clipped endpoints to the nearest
+    integers.
+
+    Parameters
+    ----------
+    starts, ends : numpy array (of shape (N, 2)) of int
+    rect : pygame.Rect
+        the rectangle, whose right and bottom edges are included
+
+    Returns
+    -------
+    visible : numpy array (of shape (N,)) of bool
+        whether each line intersects the rectangle
+    starts, ends : numpy array (of shape (M, 2)) of int
+        the clipped endpoints of the visible lines
+    params : numpy array (of shape (M, 2))
+        the positions of the clipped endpoints along the visible lines, from
+        0 at their starts to 1 at their ends
+    """
+    low = np.array(rect.topleft)
+    high = np.array(rect.bottomright)
+    visible = np.ones(len(starts), dtype=bool)
+    params = np.zeros((len(starts), 2))
+    params[:, 1] = 1.0
+    # the lines inside the rectangle are left as they are
+    partial = np.flatnonzero(((starts < low) | (starts > high)
+                              | (ends < low) | (ends > high)).any(axis=1))
+    if not len(partial):
+        return visible, starts, ends, params
+
+    partial_starts = starts[partial]
+    p = (ends[partial] - partial_starts).astype(float)
+    q_low = partial_starts - low
+    q_high = high - partial_starts
+
+    parallel = p == 0
+    partial_visible = ~(parallel & ((q_low < 0) | (q_high < 0))).any(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r_low = -q_low / p
+        r_high = q_high / p
+    # the parameters at which each line enters and leaves the slab of each
+    # axis
+    entering = np.where(parallel, 0.0, np.where(p > 0, r_low, r_high))
+    leaving = np.where(parallel, 1.0, np.where(p > 0, r_high, r_low))
+    t_enter = np.maximum(entering.max(axis=1), 0.0)
+    t_leave = np.minimum(leaving.min(axis=1), 1.0)
+    partial_visible &= t_enter <= t_leave
+    visible[partial] = partial_visible
+    params[partial, 0] = t_enter
+    params[partial, 1] = t_leave
+
+    starts = starts.copy()
+    ends = ends.copy()
+    partial = partial[partial_visible]
+    p = p[partial_visible]
+    partial_starts = partial_starts[partial_visible]
+    for t, out in ((t_enter, starts), (t_leave, ends)):
+        offsets = p * t[partial_visible, np.newaxis]
+        offsets += np.where(offsets < 0, -0.5, 0.5)
+        out[partial] = partial_starts + np.trunc(offsets).astype(out.dtype)
+    return visible, starts[visible], ends[visible], params[visible]
+
+
+def line_pixels(starts, ends, pitch, first_steps=None, last_steps=None):
+    """Computes the pixels of lines with integer endpoints with Bresenham's
+    algorithm, without a loop over the pixels.
+
+    Each line steps one pixel along its major axis at a time, and the minor
+    coordinate of its `k`th pixel is `(k * minor + bias) // major` pixels away
+    from its start, where `major` and `minor` are the absolute differences of
+    the coordinates of its endpoints along each axis.
+
+    Parameters
+    ----------
+    starts, ends : numpy array (of shape (N, 2)) of int
+        the endpoints, which must lie in the buffer
+    pitch : int
+        the number of pixels in a row of the buffer
+    first_steps, last_steps : numpy array (of shape (N,)) of int, optional
+        the first and last steps of the pixels to compute of each line (c.f.
+        `band_steps`). Default is all pixels.
+
+    Returns
+    -------
+    offsets : numpy array of int
+        the index of each pixel of all lines in the flattened buffer
+    line_indices : numpy array of int
+        the index of the line of each pixel, in increasing order
+    steps : numpy array of int
+        the number of steps of each pixel from the start of its line
+    """
+    deltas = ends - starts
+    lengths = np.abs(deltas)
+    x_major = lengths[:, 0] > lengths[:, 1]
+    major = np.where(x_major, lengths[:, 0], lengths[:, 1])
+    minor = np.where(x_major, lengths[:, 1], lengths[:, 0])
+    # the offsets in the buffer of a step along each axis
+    strides = np.where(deltas < 0, -1, 1) * np.array([1, pitch])
+    major_strides = np.where(x_major, strides[:, 0], strides[:, 1])
+    minor_strides = np.where(x_major, strides[:, 1], strides[:, 0])
+    bias = np.maximum(major - major // 2 - 1, 0)
+    if first_steps is None:
+        counts = major + 1
+    else:
+        counts = np.maximum(last_steps - first_steps + 1, 0)
+    firsts = np.cumsum(counts) - counts
+
+    line_indices = np.repeat(np.arange(len(starts)), counts)
+    steps = np.arange(counts.sum())
+    steps -= firsts[line_indices]
+    if first_steps is not None:
+        steps += first_steps[line_indices]
+    minor_steps = steps * minor[line_indices]
+    minor_steps += bias[line_indices]
+    minor_steps //= np.maximum(major, 1)[line_indices]
+
+    offsets = steps * major_strides[line_indices]
+    minor_steps *= minor_strides[line_indices]
+    offsets += minor_steps
+    offsets += (starts[:, 1] * pitch + starts[:, 0])[line_indices]
+    return offsets, line_indices, steps
+
+
+def band_steps(starts, ends, row_low, row_high):
+    """Finds the steps of lines (c.f. `line_pixels`) whose pixels lie in a
+    band of rows, which are consecutive since the rows of the pixels of a
+    line are monotonic in their steps.
+
+    Parameters
+    ----------
+    starts, ends : numpy array (of shape (N, 2)) of int
+    row_low, row_high : int
+        the first row of the band, and the first row after it
+
+    Returns
+    -------
+    first_steps, last_steps : numpy array (of shape (N,)) of int
+        the first and last steps of each line in the band, with the last one
+        before the first one if the line does not cross the band
+    """
+    deltas = ends - starts
+    lengths = np.abs(deltas)
+    x_major = lengths[:, 0] > lengths[:, 1]
+    major = np.where(x_major, lengths[:, 0], lengths[:, 1])
+    minor = np.where(x_major, lengths[:, 1], lengths[:, 0])
+    bias = np.maximum(major - major // 2 - 1, 0)
+    # the band as a range of the number of rows away from the start
+    down = deltas[:, 1] >= 0
+    low = np.where(down, row_low - starts[:, 1], starts[:, 1] - row_high + 1)
+    high = np.where(down, row_high - 1 - starts[:, 1], starts[:, 1] - row_low)
+
+    # the row of the kth pixel is k rows away for lines along the y-axis,
+    # and (k * minor + bias) // major rows away for those along the x-axis
+    first_steps = low.copy()
+    last_steps = high.copy()
+    along_x = np.flatnonzero(x_major & (minor > 0))
+    if len(along_x):
+        x_major_minor = minor[along_x]
+        x_major_major = major[along_x]
+        x_major_bias = bias[along_x]
+        first_steps[along_x] = -((x_major_bias - low[along_x] * x_major_major)
+                                 // x_major_minor)
+        last_steps[along_x] = ((high[along_x] + 1) * x_major_major
+                               - x_major_bias - 1) // x_major_minor
+    # horizontal lines stay on the row of their start
+    flat = np.flatnonzero(x_major & (minor == 0))
+    in_band = (low[flat] <= 0) & (high[flat] >= 0)
+    first_steps[flat] = np.where(in_band, 0, 1)
+    last_steps[flat] = np.where(in_band, major[flat], 0)
+    np.maximum(first_steps, 0, out=first_steps)
+    np.minimum(last_steps, major, out=last_steps)
+    return first_steps, last_steps
+
+
+def interpolate(values, line_indices, fractions):
+    """Linearly interpolates values given at the endpoints of lines at
+    positions along them.
+
+    Parameters
+    ----------
+    values : numpy array (of shape (N, 2))
+        the values at the starts and ends of the lines
+    line_indices : numpy array of int
+    fractions : numpy array of float
+        the positions along the lines, from 0 at their starts to 1 at their
+        ends
+
+    Returns
+    -------
+    numpy array of float32
+    """
+    values = values.astype(np.float32)
+    result = (values[:, 1] - values[:, 0])[line_indices]
+    result *= fractions
+    result += values[line_indices, 0]
+    return result
+
+
+def fade_colors(colors, shades, fade_color):
+    """Blends colors towards another color.
+
+    Parameters
+    ----------
+    colors : numpy array of int
+        the colors in the form `0xRRGGBB`
+    shades : numpy array of float
+        the weight of each color, from 0 for `fade_color` to 1 for the color
+        itself
+    fade_color : int
+
+    Returns
+    -------
+    numpy array of uint32
+    """
+    colors = np.asarray(colors, dtype=np.uint32)
+    faded = colors & np.uint32(0xFF000000)
+    for shift in (16, 8, 0):
+        channel = (colors >> np.uint32(shift)) & np.uint32(0xFF)
+        fade_channel = (fade_color >> shift) & 0xFF
+        blended = channel.astype(np.float32)
+        blended -= fade_channel
+        blended *= shades
+        blended += fade_channel + 0.5
+        faded |= blended.astype(np.uint32) << np.uint32(shift)
+    return faded
+
+
+def prepare_lines(starts, ends, rect):
+    """Truncates the endpoints of lines to pixels, and clips the lines against
+    a rectangle, as `pygame.draw.line` does.
+
+    Parameters
+    ----------
+    starts, ends : numpy array (of shape (N, 2))
+        the endpoints of the lines in pixels
+    rect : pygame.Rect
+        the clip area
+
+    Returns
+    -------
+    visible, starts, ends, params
+        as returned by `clip_lines`, with the endpoints relative to the
+        top-left corner of `rect`
+    """
+    origin = np.array(rect.topleft)
+    starts = np.trunc(np.clip(starts, -MAX_COORD, MAX_COORD)) \
+        .astype(np.intp) - origin
+    ends = np.trunc(np.clip(ends, -MAX_COORD, MAX_COORD)) \
+        .astype(np.intp) - origin
+    return clip_lines(starts, ends, pygame.Rect((0, 0), rect.size))
+
+
+def rasterize(starts, ends, params, colors, pitch, depths=None, shades=None,
+              fade_color=0x000000, depth_buffer=None, owners=None,
+              first_steps=None, last_steps=None):
+    """Computes the pixels of prepared lines (c.f. `prepare_lines`) to write
+    into a frame buffer, after depth testing and fading them.
+
+    Parameters
+    ----------
+    starts, ends : numpy array (of shape (N, 2)) of int
+    params : numpy array (of shape (N, 2))
+    colors : numpy array (of shape (N,)) of int
+    pitch : int
+        the number of pixels in a row of the buffer
+    depths, shades : numpy array (of shape (N, 2)), optional
+        as in `LineRasterizer.draw`
+    fade_color : int, optional
+    depth_buffer : numpy array of float32, optional
+        the depth buffer, which is updated; required with `depths`
+    owners : numpy array of int, optional
+        a scratch array of the size of `depth_buffer`; required with `depths`
+    first_steps, last_steps : numpy array (of shape (N,)) of int, optional
+        the steps of the pixels to compute of each line (c.f. `line_pixels`)
+
+    Returns
+    -------
+    offsets : numpy array of int
+        the index of each pixel in the flattened buffer, in drawing order
+    pixel_colors : numpy array
+        the color of each pixel
+    """
+    offsets, line_indices, steps = line_pixels(starts, ends, pitch,
+                                               first_steps, last_steps)
+    pixel_colors = np.asarray(colors)[line_indices]
+    if depths is not None or shades is not None:
+        # the position of every pixel along its line before clipping
+        lengths = np.abs(ends - starts).max(axis=1)
+        fractions = steps / np.maximum(lengths, 1)[line_indices]
+        fractions *= (params[:, 1] - params[:, 0])[line_indices]
+        fractions += params[line_indices, 0]
+    if depths is not None:
+        pixel_depths = interpolate(np.asarray(depths), line_indices,
+                                   fractions)
+        nearest = depth_test(offsets, pixel_depths, depth_buffer, owners)
+        offsets = offsets[nearest]
+        pixel_colors = pixel_colors[nearest]
+        depth_buffer.ravel()[offsets] = pixel_depths[nearest]
+        if shades is not None:
+            line_indices = line_indices[nearest]
+            fractions = fractions[nearest]
+    if shades is not None:
+        pixel_colors = fade_colors(
+            pixel_colors, interpolate(np.asarray(shades), line_indices,
+                                      fractions),
+            fade_color)
+    return offsets, pixel_colors
+
+
+def depth_test(offsets, depths, depth_buffer, owners):
+    """Finds the pixels nearer than the depth buffer and than every other
+    pixel at the same position, preferring later pixels at equal depths.
+
+    The pixels passing the test against the depth buffer each claim their
+    position, with later pixels overwriting earlier ones; then every pixel
+    nearer than the one that claimed its position claims it again, until
+    no pixel is nearer. Each round only involves the pixels that lost the
+    previous one, which are few unless many lines overlap.
+
+    Parameters
+    ----------
+    offsets : numpy array of int
+        the index of each pixel in the flattened buffer
+    depths : numpy array
+        the depth of each pixel
+    depth_buffer : numpy array
+    owners : numpy array of int
+        a scratch array of the size of `depth_buffer`
+
+    Returns
+    -------
+    numpy array of int
+        the indices of the nearest pixels, in increasing order
+    """
+    candidates = np.flatnonzero(depths <= depth_buffer.ravel()[offsets])
+    owners = owners.ravel()
+    owners[offsets[candidates]] = candidates
+    contenders = candidates
+    while len(contenders):
+        claimed = owners[offsets[contenders]]
+        # only the pixels that lost their position need their depths
+        # compared
+        lost = claimed != contenders
+        contenders = contenders[lost]
+        claimed = claimed[lost]
+        contender_depths = depths[contenders]
+        claimed_depths = depths[claimed]
+        nearer = (contender_depths < claimed_depths) \
+                 | ((contender_depths == claimed_depths)
+                    & (contenders > claimed))
+        contenders = contenders[nearer]
+        owners[offsets[contenders]] = contenders
+    return candidates[owners[offsets[candidates]] == candidates]
+
+
+class LineRasterizer(object):
+    """Draws many one-pixel wide lines at once, as if by calling
+    `pygame.draw.line` for each of them in order.
+
+    The lines are drawn into a frame buffer covering the clip area of the
+    surface, which is copied from the surface and back once per call. The
+    buffer is kept between calls, and has an extra row and column into which
+    the pixels on the right and bottom edges of the clip area go, since they
+    are not drawn.
+
+    Lines may also be depth tested against a depth buffer of the same size,
+    which keeps the depth of the nearest pixel drawn at every position since
+    it was last cleared, and faded towards a color with their depth.
+
+    Attributes
+    ----------
+    pixels : numpy array (of shape (H + 1, W + 1)) of uint32
+        the frame buffer of the last call, indexed by row
+    depths : numpy array (of shape (H + 1, W + 1)) of float32
+        the depth buffer, indexed by row
+    """
+    def __init__(self):
+        self.pixels = np.zeros((1, 1), dtype=np.uint32)
+        self.depths = np.full((1, 1), np.inf, dtype=np.float32)
+        self._owners = np.zeros(1, dtype=np.intp)
+
+    def clear_depths(self):
+        """Clears the depth buffer, so that the next lines drawn are not
+        hidden by any of the lines drawn so far.
+        """
+        self.depths.fill(np.inf)
+
+    def draw(self, surface, starts, ends, colors, depths=None, shades=None,
+             fade_color=0x000000):
+        """Draws lines on a surface.
+
+        Parameters
+        ----------
+        surface : pygame surface
+        starts, ends : numpy array (of shape (N, 2))
+            the endpoints of the lines in pixels
+        colors : numpy array (of shape (N,)) of int
+            the color of each line, as a pixel value of the surface
+        depths : numpy array (of shape (N, 2)), optional
+            the depths of the endpoints of the lines, which must vary
+            linearly along them and decrease towards the eye. If given, only
+            the pixels nearer than those already in the depth buffer are
+            drawn, and their depths are stored in it.
+        shades : numpy array (of shape (N, 2)), optional
+            the weights of the colors at the endpoints of the lines, from 0
+            for `fade_color` to 1 for the colors themselves, which vary
+            linearly along the lines. If given, the colors must be in the form
+            `0xRRGGBB`.
+        fade_color : int, optional
+            Default is black.
+        """
+        rect = surface.get_clip()
+        if not len(starts) or not rect.width or not rect.height:
+            return
+        visible, starts, ends, params = prepare_lines(starts, ends, rect)
+
+        if self.pixels.shape != (rect.height + 1, rect.width + 1):
+            self.pixels = np.zeros((rect.height + 1, rect.width + 1),
+                                   dtype=np.uint32)
+            self.depths = np.full(self.pixels.shape, np.inf,
+                                  dtype=np.float32)
+            self._owners = np.zeros(self.pixels.size, dtype=np.intp)
+
+        offsets, pixel_colors = rasterize(
+            starts, ends, params, np.asarray(colors)[visible], rect.width + 1,
+            None if depths is None else np.asarray(depths)[visible],
+            None if shades is None else np.asarray(shades)[visible],
+            fade_color, self.depths, self._owners)
+
+        target = surface.subsurface(rect)
+        frame = self.pixels[:-1, :-1].T
+        read_surface(target, frame)
+        # the pixels of later lines come later, so that they are drawn over
+        # those of earlier lines
+        self.pixels.ravel()[offsets] = pixel_colors
+        pygame.surfarray.blit_array(target, frame)
+
+
+def read_surface(surface, frame):
+    """Copies the pixels of a surface into an array indexed by column.
+    """
+    if surface.get_bytesize() == 3:
+        # 24-bit surfaces cannot be referenced as an array of pixel values
+        frame[...] = pygame.surfarray.array2d(surface)
+    else:
+        frame[...] = pygame.surfarray.pixels2d(surface)
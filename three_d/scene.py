@@ -0,0 +1,301 @@
+"""Contains a container of models with a bounding volume hierarchy.
+"""
+import numpy as np
+
+from itertools import izip
+
+from three_d.mathutil import classify_boxes
+from three_d.primitives import Wireframe
+
+def morton_codes(points, low, high):
+    """Computes the 30-bit Morton (Z-order) codes of points, so that sorting
+    by them keeps points that are close in space close in order.
+
+    Parameters
+    ----------
+    points : numpy array (of shape (N, 3))
+    low, high : numpy array (of size 3)
+        the corners of the box to which the points are quantized
+
+    Returns
+    -------
+    numpy array (of shape (N,)) of uint64
+    """
+    extent = np.where(high > low, high - low, 1.0)
+    cells = np.clip((points - low) / extent * 1023, 0, 1023).astype(np.uint64)
+    codes = np.zeros(len(points), dtype=np.uint64)
+    for axis in xrange(3):
+        x = cells[:, axis]
+        x = (x | (x << np.uint64(16))) & np.uint64(0x030000FF)
+        x = (x | (x << np.uint64(8))) & np.uint64(0x0300F00F)
+        x = (x | (x << np.uint64(4))) & np.uint64(0x030C30C3)
+        x = (x | (x << np.uint64(2))) & np.uint64(0x09249249)
+        codes |= x << np.uint64(axis)
+    return codes
+
+
+class Scene(object):
+    """A collection of models with a bounding volume hierarchy over their
+    world-space bounding boxes, so that the models in view can be found in
+    time proportional to their number rather than that of all models.
+
+    The hierarchy is a complete binary tree stored in arrays in heap order:
+    node 1 is the root, the children of node `i` are `2 * i` and `2 * i + 1`,
+    and the leaves hold the models sorted by the Morton codes of their
+    centers. Inserting, removing, or moving a model only refits the boxes on
+    the path from its leaf to the root, and inserting into a full tree first
+    doubles its capacity; once many models have changed, the tree is rebuilt
+    to restore its quality.
+
+    A scene can be used in place of the list of models of a `Viewport`.
+
+    Parameters
+    ----------
+    models : iterable of Model, optional
+
+    Attributes
+    ----------
+    models : list of Model
+        the models in the scene. Use `insert`, `extend`, and `remove` to
+        change it; its order changes when models are removed.
+    """
+    def __init__(self, models=None):
+        self.models = []
+        self.extend(models or [])
+
+    def __len__(self):
+        return len(self.models)
+
+    def __iter__(self):
+        return iter(self.models)
+
+    def __contains__(self, model):
+        return model in self._indices
+
+    def insert(self, model):
+        """Adds a model to the scene.
+
+        Parameters
+        ----------
+        model : Model
+        """
+        if model in self._indices:
+            raise ValueError('the model is already in the scene')
+        if not self._free_slots:
+            self._grow()
+        slot = self._free_slots.pop()
+        self._indices[model] = len(self.models)
+        self._slot_items[slot] = len(self.models)
+        self.models.append(model)
+        self._slots.append(slot)
+        self._versions.append(model.version)
+        self._set_leaf(slot, model)
+
+    def extend(self, models):
+        """Adds many models to the scene at once, rebuilding the hierarchy.
+
+        Parameters
+        ----------
+        models : iterable of Model
+        """
+        self.models.extend(models)
+        self.rebuild()
+
+    def remove(self, model):
+        """Removes a model from the scene. The last model of `models` takes
+        its place.
+
+        Parameters
+        ----------
+        model : Model
+        """
+        try:
+            index = self._indices.pop(model)
+        except KeyError:
+            raise ValueError('the model is not in the scene')
+        slot = self._slots[index]
+        self._slot_items[slot] = -1
+        self._free_slots.append(slot)
+        self._set_leaf(slot, None)
+
+        last = self.models.pop()
+        last_slot = self._slots.pop()
+        last_version = self._versions.pop()
+        if last is not model:
+            self.models[index] = last
+            self._slots[index] = last_slot
+            self._versions[index] = last_version
+            self._indices[last] = index
+            self._slot_items[last_slot] = index
+
+    def move(self, model):
+        """Updates the hierarchy after a model has been moved, rescaled, or
+        otherwise changed.
+
+        Parameters
+        ----------
+        model : Model
+        """
+        index = self._indices[model]
+        self._versions[index] = model.version
+        self._set_leaf(self._slots[index], model)
+
+    def refit(self):
+        """Updates the hierarchy for all models that have changed since they
+        were last inserted or moved. Does nothing if no wireframe has changed
+        since the last call.
+        """
+        if Wireframe.last_version() == self._last_version:
+            return
+        self._last_version = Wireframe.last_version()
+        changed = [i for i, (obj, version) in
+                   enumerate(izip(self.models, self._versions))
+                   if obj.version != version]
+        if len(changed) * 8 < len(self._slot_items):
+            for i in changed:
+                self.move(self.models[i])
+            return
+        # many models have changed: update their leaves and refit all levels
+        # at once
+        slots = np.array([self._slots[i] for i in changed], dtype=np.intp)
+        leaves = slots + len(self._slot_items)
+        for i, leaf in izip(changed, leaves):
+            obj = self.models[i]
+            self._versions[i] = obj.version
+            self._low[leaf], self._high[leaf] = obj.world_bounds
+        self._changes += len(changed)
+        self._refit_levels()
+
+    def rebuild(self):
+        """Rebuilds the hierarchy from scratch.
+        """
+        n = len(self.models)
+        capacity = 1 << max(n - 1, 0).bit_length()
+        self._low = np.full((2 * capacity, 3), np.inf)
+        self._high = np.full((2 * capacity, 3), -np.inf)
+        self._slot_items = np.full(capacity, -1, dtype=np.intp)
+
+        low = np.empty((n, 3))
+        high = np.empty((n, 3))
+        for i, obj in enumerate(self.models):
+            low[i], high[i] = obj.world_bounds
+        if n:
+            centers = (low + high) / 2.0
+            finite = np.isfinite(centers).all(axis=1)
+            scene_low = centers[finite].min(axis=0) if finite.any() \
+                else np.zeros(3)
+            scene_high = centers[finite].max(axis=0) if finite.any() \
+                else np.zeros(3)
+            order = np.argsort(morton_codes(np.where(finite[:, np.newaxis],
+                                                     centers, scene_low),
+                                            scene_low, scene_high),
+                               kind='mergesort')
+        else:
+            order = np.empty(0, dtype=np.intp)
+        self._slot_items[:n] = order
+        self._low[capacity:capacity + n] = low[order]
+        self._high[capacity:capacity + n] = high[order]
+        self._refit_levels()
+
+        slots = np.empty(n, dtype=np.intp)
+        slots[order] = np.arange(n)
+        self._slots = slots.tolist()
+        self._free_slots = range(capacity - 1, n - 1, -1)
+        self._indices = dict((obj, i) for i, obj in enumerate(self.models))
+        self._versions = [obj.version for obj in self.models]
+        self._last_version = Wireframe.last_version()
+        self._changes = 0
+
+    def query_planes(self, planes, offsets):
+        """Finds the models whose bounding boxes are not entirely outside a
+        convex volume, such as the view volume of a viewport.
+
+        Parameters
+        ----------
+        planes, offsets : numpy array
+            the planes in world coordinates, in the form returned by
+            `homogeneous_clip_planes`
+
+        Returns
+        -------
+        numpy array of int
+            the indices in `models` of the models found, in increasing order
+        """
+        if self._changes * 2 > max(len(self.models), 32):
+            self.rebuild()
+        capacity = len(self._slot_items)
+        found = []
+        frontier = np.ones(1 if self.models else 0, dtype=np.intp)
+        depth = capacity.bit_length() - 1
+        while len(frontier):
+            # skip the subtrees without any models
+            frontier = frontier[self._low[frontier, 0]
+                                <= self._high[frontier, 0]]
+            outside, inside = classify_boxes(self._low[frontier],
+                                             self._high[frontier],
+                                             planes, offsets)
+            if depth == 0:
+                found.append(self._slot_items[frontier[~outside] - capacity])
+                break
+            # every leaf below a node inside the volume is found without
+            # further tests
+            for node in frontier[inside]:
+                found.append(self._slot_items[(node << depth) - capacity:
+                                              ((node + 1) << depth) - capacity])
+            frontier = frontier[~(outside | inside)]
+            frontier = np.concatenate((2 * frontier, 2 * frontier + 1))
+            depth -= 1
+        if not found:
+            return np.empty(0, dtype=np.intp)
+        items = np.concatenate(found)
+        items = items[items >= 0]
+        items.sort()
+        return items
+
+    def _grow(self):
+        """Doubles the number of leaves. The current tree becomes the left
+        subtree of the new root, so that the models keep their slots, and the
+        new slots on the right are free.
+        """
+        capacity = len(self._slot_items)
+        low = np.full((4 * capacity, 3), np.inf)
+        high = np.full((4 * capacity, 3), -np.inf)
+        level = 1
+        while level <= capacity:
+            low[2 * level:3 * level] = self._low[level:2 * level]
+            high[2 * level:3 * level] = self._high[level:2 * level]
+            level *= 2
+        low[1] = low[2]
+        high[1] = high[2]
+        self._low = low
+        self._high = high
+        self._slot_items = np.concatenate(
+            (self._slot_items, np.full(capacity, -1, dtype=np.intp)))
+        self._free_slots[:0] = range(2 * capacity - 1, capacity - 1, -1)
+
+    def _set_leaf(self, slot, model):
+        node = slot + len(self._slot_items)
+        if model is None:
+            self._low[node] = np.inf
+            self._high[node] = -np.inf
+        else:
+            self._low[node], self._high[node] = model.world_bounds
+        node //= 2
+        while node:
+            np.minimum(self._low[2 * node], self._low[2 * node + 1],
+                       out=self._low[node])
+            np.maximum(self._high[2 * node], self._high[2 * node + 1],
+                       out=self._high[node])
+            node //= 2
+        self._changes += 1
+
+    def _refit_levels(self):
+        level = len(self._slot_items) // 2
+        while level:
+            np.minimum(self._low[2 * level:4 * level:2],
+                       self._low[2 * level + 1:4 * level:2],
+                       out=self._low[level:2 * level])
+            np.maximum(self._high[2 * level:4 * level:2],
+                       self._high[2 * level + 1:4 * level:2],
+                       out=self._high[level:2 * level])
+            level //= 2
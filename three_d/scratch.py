@@ -0,0 +1,49 @@
+"""Contains buffers for the arrays that are computed anew every frame.
+"""
+import numpy as np
+
+class ScratchArrays(object):
+    """Buffers for the arrays that are computed anew every frame (e.g. the
+    projected vertices), kept between frames so that they are not allocated
+    and freed every time. A buffer only grows, to at least twice its size,
+    when it is too small, so that it soon fits the largest frame of a scene.
+
+    An array is only valid until the next array of the same name is taken.
+    """
+    def __init__(self):
+        self._buffers = {}
+
+    def get(self, name, shape, dtype=float):
+        """Returns the array of a name, with undefined contents.
+
+        Parameters
+        ----------
+        name : str
+        shape : tuple of int
+        dtype : numpy dtype, optional
+            Default is float.
+
+        Returns
+        -------
+        numpy array
+            a C-contiguous array, which is a view of the buffer of the name
+        """
+        dtype = np.dtype(dtype)
+        size = int(np.prod(shape)) * dtype.itemsize
+        buf = self._buffers.get(name)
+        if buf is None or len(buf) < size:
+            buf = np.empty(max(size, 2 * (len(buf) if buf is not None else 0)),
+                           dtype=np.uint8)
+            self._buffers[name] = buf
+        return buf[:size].view(dtype).reshape(shape)
+
+    @property
+    def nbytes(self):
+        """The total size of the buffers in bytes.
+        """
+        return sum(len(buf) for buf in self._buffers.itervalues())
+
+    def clear(self):
+        """Frees the buffers.
+        """
+        self._buffers.clear()
@@ -0,0 +1,433 @@
+"""Contains the packed world-space geometry of a scene.
+"""
+import numpy as np
+
+from itertools import izip
+
+from three_d.instancing import InstancedModel
+from three_d.mathutil import rotated_bounds
+from three_d.primitives import Wireframe
+from three_d.scene import Scene
+
+def concatenated_ranges(starts, counts):
+    """Returns the concatenation of `arange(start, start + count)` for every
+    pair of `starts` and `counts`, without a Python loop.
+    """
+    nonempty = counts > 0
+    starts = starts[nonempty]
+    counts = counts[nonempty]
+    if not len(counts):
+        return np.empty(0, dtype=np.intp)
+    steps = np.ones(counts.sum(), dtype=np.intp)
+    steps[0] = starts[0]
+    ends = np.cumsum(counts)[:-1]
+    steps[ends] = starts[1:] - (starts[:-1] + counts[:-1] - 1)
+    return np.cumsum(steps)
+
+
+def _consecutive_ranges(starts, count):
+    """Indexes the ranges `[start, start + count)` for every one of `starts`,
+    as a slice if they follow one another, which avoids gathering.
+    """
+    if len(starts) and (np.diff(starts) == count).all():
+        return slice(starts[0], starts[0] + count * len(starts))
+    return concatenated_ranges(starts, np.full(len(starts), count,
+                                               dtype=np.intp))
+
+
+class WorldGeometry(object):
+    """The geometry of a list of models packed into single buffers in
+    homogeneous world coordinates, so that a viewport can transform the whole
+    scene at once.
+
+    The buffers are kept between frames. Updating them does nothing if no
+    wireframe has changed, and otherwise only repacks the models that have
+    changed. The models that have changed are transformed into world space
+    all at once, and their world vertices are cached directly in the packed
+    buffer (c.f. `Model.share_world_vertices`).
+
+    The edges of every level of detail of a model (c.f.
+    `Wireframe.lod_levels`) are packed one after another, as separate pieces
+    of the edge buffer.
+
+    The instances of a `SharedGeometry` among the models are tracked through
+    its packed `InstanceArray`: the instances that have changed are found, and
+    their geometry is transformed into world space, with one broadcasted
+    operation per shared geometry rather than a step per instance.
+
+    Parameters
+    ----------
+    models : iterable of Model, optional
+
+    Attributes
+    ----------
+    models : list of Model
+        the packed models
+    vertices : numpy array (of shape (V, 4))
+    edge_indices : numpy array (of shape (E, 2)) of int
+        the vertex indices of each edge of every level of detail, referring to
+        `vertices`
+    colors : numpy array (of shape (E,)) of uint32
+    vertex_offsets, edge_offsets : numpy array (of shape (M + 1,)) of int
+        the vertices and edges (of all levels of detail) of the `i`th model
+        are `vertices[vertex_offsets[i]:vertex_offsets[i + 1]]` and
+        `edge_indices[edge_offsets[i]:edge_offsets[i + 1]]`
+    lod_offsets : numpy array (of shape (M + 1,)) of int
+        the levels of detail of the `i`th model are the pieces
+        `lod_offsets[i]` to `lod_offsets[i + 1] - 1`, from the finest to the
+        coarsest
+    lod_edge_offsets : numpy array (of shape (P + 1,)) of int
+        the edges of the `j`th piece are
+        `edge_indices[lod_edge_offsets[j]:lod_edge_offsets[j + 1]]`
+    lod_errors : numpy array (of shape (P,))
+        the error of each piece in world units
+    bounds_low, bounds_high : numpy array (of shape (M, 3))
+        the world-space bounding boxes of the models (c.f.
+        `Model.world_bounds`)
+    centers, radii : numpy array (of shape (M, 3) and (M,))
+        the spheres enclosing the bounding boxes
+    version : int
+        a number that is incremented whenever the packed geometry changes
+    """
+    def __init__(self, models=None):
+        self.version = 0
+        self.pack(models or [])
+
+    def update(self, models):
+        """Brings the packed geometry up to date with `models`.
+
+        Parameters
+        ----------
+        models : iterable of Model or Scene
+            the models, or a scene whose hierarchy is refit first
+
+        Returns
+        -------
+        bool
+            whether the packed geometry has changed
+        """
+        if isinstance(models, Scene):
+            models.refit()
+            models = models.models
+        if not isinstance(models, list):
+            models = list(models)
+        if models != self.models:
+            self.pack(models)
+            return True
+        if Wireframe.last_version() == self._last_version:
+            return False
+        self._last_version = Wireframe.last_version()
+
+        changed = [i for i in self._plain_indices
+                   if models[i].version != self._versions[i]]
+        levels = {}
+        for i in changed:
+            obj = models[i]
+            levels[i] = obj.lod_levels
+            first = self.lod_offsets[i]
+            piece_sizes = np.diff(self.lod_edge_offsets[
+                first:self.lod_offsets[i + 1] + 1])
+            if len(obj.vertices) != self.vertex_offsets[i + 1] \
+                                     - self.vertex_offsets[i] \
+               or [len(level[1]) for level in levels[i]] \
+                  != piece_sizes.tolist():
+                self.pack(models)
+                return True
+
+        self._place_models(np.array(changed, dtype=np.intp))
+        for i in changed:
+            obj = models[i]
+            piece = self.lod_offsets[i]
+            for error, edge_indices, colors in levels[i]:
+                edge_slice = slice(self.lod_edge_offsets[piece],
+                                   self.lod_edge_offsets[piece + 1])
+                np.add(edge_indices, self.vertex_offsets[i],
+                       out=self.edge_indices[edge_slice])
+                self.colors[edge_slice] = colors
+                self.lod_errors[piece] = error * abs(obj.scale)
+                piece += 1
+            self._versions[i] = obj.version
+
+        changed = [np.array(changed, dtype=np.intp)]
+        for geometry, indices, rows, versions in self._instances:
+            current = geometry.instances.versions[rows]
+            stale = current != versions
+            if stale.any():
+                versions[stale] = current[stale]
+                self._place_instances(geometry, indices[stale], rows[stale])
+                changed.append(indices[stale])
+        changed = np.concatenate(changed)
+        if len(changed):
+            self._update_spheres(changed)
+            self.version += 1
+        return bool(len(changed))
+
+    def select(self, model_indices=None, levels=None):
+        """Gathers the geometry of some of the packed models, in time
+        proportional to the size of their geometry.
+
+        Parameters
+        ----------
+        model_indices : numpy array of int, optional
+            the indices of the models in `models`. Default is all of them.
+        levels : numpy array of int, optional
+            the level of detail to use for each model. Default is the full
+            detail.
+
+        Returns
+        -------
+        vertices : numpy array (of shape (V, 4))
+        edge_indices : numpy array (of shape (N, 2)) of int
+            the vertex indices of each edge, referring to `vertices`
+        colors : numpy array (of shape (N,))
+        """
+        if model_indices is None:
+            if levels is None and len(self.lod_errors) == len(self.models):
+                return self.vertices, self.edge_indices, self.colors
+            model_indices = np.arange(len(self.models))
+        vertex_starts = self.vertex_offsets[model_indices]
+        vertex_counts = self.vertex_offsets[model_indices + 1] - vertex_starts
+        edge_starts, edge_counts = self.edge_ranges(model_indices, levels)
+        edge_ids = concatenated_ranges(edge_starts, edge_counts)
+
+        # shift the vertex indices of each model to where its vertices end up
+        shifts = vertex_starts - (np.cumsum(vertex_counts) - vertex_counts)
+        edge_indices = self.edge_indices[edge_ids]
+        edge_indices -= np.repeat(shifts, edge_counts)[:, np.newaxis]
+        return (self.vertices[concatenated_ranges(vertex_starts,
+                                                  vertex_counts)],
+                edge_indices, self.colors[edge_ids])
+
+    def edge_ranges(self, model_indices=None, levels=None):
+        """Finds where the edges of some of the packed models are, without
+        gathering them (c.f. `select`).
+
+        Parameters
+        ----------
+        model_indices : numpy array of int, optional
+            the indices of the models in `models`. Default is all of them.
+        levels : numpy array of int, optional
+            the level of detail to use for each model. Default is the full
+            detail.
+
+        Returns
+        -------
+        edge_starts, edge_counts : numpy array of int
+            the ranges of `edge_indices` (and `colors`) holding the edges of
+            each model, in order
+        """
+        if model_indices is None:
+            model_indices = np.arange(len(self.models))
+        pieces = self.lod_offsets[model_indices]
+        if levels is not None:
+            pieces = pieces + levels
+        edge_starts = self.lod_edge_offsets[pieces]
+        return edge_starts, self.lod_edge_offsets[pieces + 1] - edge_starts
+
+    def choose_levels(self, model_indices, max_errors):
+        """Chooses the coarsest level of detail of each model whose error does
+        not exceed the given one.
+
+        Parameters
+        ----------
+        model_indices : numpy array of int
+            the indices of the models in `models`
+        max_errors : numpy array of float
+            the largest acceptable error of each model in world units
+
+        Returns
+        -------
+        numpy array of int
+            the level of detail of each model
+        """
+        if not len(model_indices):
+            return np.empty(0, dtype=np.intp)
+        first = self.lod_offsets[model_indices]
+        counts = self.lod_offsets[model_indices + 1] - first
+        pieces = concatenated_ranges(first, counts)
+        acceptable = self.lod_errors[pieces] <= np.repeat(max_errors, counts)
+        levels = np.add.reduceat(acceptable, np.cumsum(counts) - counts) - 1
+        return np.maximum(levels, 0)
+
+    def pack(self, models):
+        """Packs the geometry of all models from scratch.
+
+        Parameters
+        ----------
+        models : iterable of Model
+        """
+        models = list(models)
+        instanced = [isinstance(obj, InstancedModel) for obj in models]
+        # the colors of tinted instances are filled in by `_place_instances`
+        levels = [obj.geometry.lod_levels if is_instance else obj.lod_levels
+                  for obj, is_instance in izip(models, instanced)]
+        pieces = [level for model_levels in levels for level in model_levels]
+
+        vertex_offsets = np.zeros(len(models) + 1, dtype=np.intp)
+        vertex_offsets[1:] = [len(obj.vertices) for obj in models]
+        lod_offsets = np.zeros(len(models) + 1, dtype=np.intp)
+        lod_offsets[1:] = [len(model_levels) for model_levels in levels]
+        lod_edge_offsets = np.zeros(len(pieces) + 1, dtype=np.intp)
+        lod_edge_offsets[1:] = [len(piece[1]) for piece in pieces]
+        np.cumsum(vertex_offsets, out=vertex_offsets)
+        np.cumsum(lod_offsets, out=lod_offsets)
+        np.cumsum(lod_edge_offsets, out=lod_edge_offsets)
+        edge_offsets = lod_edge_offsets[lod_offsets]
+        edge_counts = np.diff(edge_offsets)
+
+        vertices = np.empty((vertex_offsets[-1], 4))
+        colors = np.empty(edge_offsets[-1], dtype=np.uint32)
+        edge_indices = np.empty((edge_offsets[-1], 2), dtype=np.intp)
+        scales = np.array([obj.scale for obj in models], dtype=float)
+        # the world vertices are filled in by `_place_models` and
+        # `_place_instances`
+        vertices[:, 3] = 1.0
+        if models:
+            np.concatenate([piece[1] for piece in pieces], out=edge_indices)
+            np.concatenate([piece[2] for piece in pieces], out=colors)
+            edge_indices += np.repeat(vertex_offsets[:-1],
+                                      edge_counts)[:, np.newaxis]
+
+        self.lod_errors = np.array([piece[0] for piece in pieces], dtype=float)
+        self.lod_errors *= np.repeat(np.abs(scales), np.diff(lod_offsets))
+        self.bounds_low = np.empty((len(models), 3))
+        self.bounds_high = np.empty((len(models), 3))
+        self.models = models
+        self.vertices = vertices
+        self.edge_indices = edge_indices
+        self.colors = colors
+        self.vertex_offsets = vertex_offsets
+        self.edge_offsets = edge_offsets
+        self.lod_offsets = lod_offsets
+        self.lod_edge_offsets = lod_edge_offsets
+
+        self._plain_indices = []
+        groups = {}
+        for i, obj in enumerate(models):
+            if instanced[i]:
+                groups.setdefault(obj.geometry, []).append(i)
+                continue
+            self._plain_indices.append(i)
+        self._place_models(np.array(self._plain_indices, dtype=np.intp))
+        # the indices in `models`, rows in the instance array, and versions
+        # of the instances of each shared geometry
+        self._instances = []
+        for geometry, indices in groups.iteritems():
+            indices = np.array(indices, dtype=np.intp)
+            rows = np.array([models[i].row for i in indices], dtype=np.intp)
+            self._instances.append((geometry, indices, rows,
+                                    geometry.instances.versions[rows]))
+            self._place_instances(geometry, indices, rows)
+        self.centers = np.empty((len(models), 3))
+        self.radii = np.empty(len(models))
+        self._update_spheres(slice(None))
+
+        self._versions = [obj.version for obj in models]
+        self._last_version = Wireframe.last_version()
+        self.version += 1
+
+    def _place_models(self, indices):
+        """Transforms the vertices and bounds of some models that are not
+        instances into world space, all at once, and makes the packed world
+        vertices their caches (c.f. `Model.share_world_vertices`).
+
+        Parameters
+        ----------
+        indices : numpy array of int
+            the indices of the models in `models`
+        """
+        if not len(indices):
+            return
+        models = [self.models[i] for i in indices]
+        starts = self.vertex_offsets[indices]
+        counts = self.vertex_offsets[indices + 1] - starts
+        scales = np.array([obj.scale for obj in models], dtype=float)
+        positions = np.array([obj.position for obj in models], dtype=float)
+        rotations = np.array([obj.rotation for obj in models], dtype=float)
+        is_rotated = (rotations != np.identity(3)).any(axis=(1, 2)) \
+                     & (counts > 0)
+        rotated = np.flatnonzero(is_rotated)
+        vertices = np.concatenate([obj.vertices for obj in models])
+        world = vertices * np.repeat(scales, counts)[:, np.newaxis]
+        if len(rotated):
+            linear = rotations[rotated] \
+                     * scales[rotated, np.newaxis, np.newaxis]
+            rows = np.repeat(is_rotated, counts)
+            world[rows] = np.einsum(
+                'nij,nj->ni',
+                np.repeat(linear, counts[rotated], axis=0), vertices[rows])
+        world += np.repeat(positions, counts, axis=0)
+        self.vertices[concatenated_ranges(starts, counts), :3] = world
+
+        bounds = [obj.bounds for obj in models]
+        box_low = np.array([box[0] for box in bounds])
+        box_high = np.array([box[1] for box in bounds])
+        low = box_low * scales[:, np.newaxis] + positions
+        high = box_high * scales[:, np.newaxis] + positions
+        if len(rotated):
+            low[rotated], high[rotated] = rotated_bounds(
+                (box_low[rotated], box_high[rotated]), linear,
+                positions[rotated])
+        self.bounds_low[indices] = np.minimum(low, high)
+        self.bounds_high[indices] = np.maximum(low, high)
+
+        for obj, start, count in izip(models, starts, counts):
+            obj.share_world_vertices(self.vertices[start:start + count],
+                                     is_current=True)
+
+    def _place_instances(self, geometry, indices, rows):
+        """Transforms the geometry of some instances of a shared geometry into
+        world space, all at once.
+
+        Parameters
+        ----------
+        geometry : SharedGeometry
+        indices : numpy array of int
+            the indices of the instances in `models`
+        rows : numpy array of int
+            their rows in `geometry.instances`
+        """
+        instances = geometry.instances
+        positions = instances.positions[rows]
+        scales = instances.scales[rows]
+        rotations = instances.rotations[rows]
+        rotated = np.flatnonzero((rotations != np.identity(3))
+                                 .any(axis=(1, 2)))
+        world = np.empty((len(rows),) + geometry.vertices.shape)
+        np.multiply(geometry.vertices, scales[:, np.newaxis, np.newaxis],
+                    out=world)
+        if len(rotated):
+            linear = rotations[rotated] \
+                     * scales[rotated, np.newaxis, np.newaxis]
+            world[rotated] = np.matmul(geometry.vertices,
+                                       linear.transpose(0, 2, 1))
+        world += positions[:, np.newaxis]
+        self.vertices[_consecutive_ranges(self.vertex_offsets[indices],
+                                          len(geometry.vertices)), :3] = \
+            world.reshape((-1, 3))
+
+        low, high = geometry.bounds
+        low = low * scales[:, np.newaxis] + positions
+        high = high * scales[:, np.newaxis] + positions
+        if len(rotated):
+            low[rotated], high[rotated] = rotated_bounds(
+                geometry.bounds, linear, positions[rotated])
+        self.bounds_low[indices] = np.minimum(low, high)
+        self.bounds_high[indices] = np.maximum(low, high)
+
+        levels = geometry.lod_levels
+        errors = np.array([error for error, _, _ in levels])
+        pieces = self.lod_offsets[indices][:, np.newaxis] \
+                 + np.arange(len(levels))
+        self.lod_errors[pieces] = errors * np.abs(scales)[:, np.newaxis]
+        colors = np.concatenate([colors for _, _, colors in levels])
+        self.colors[_consecutive_ranges(self.edge_offsets[indices],
+                                        len(colors))] = \
+            np.where(instances.tinted[rows][:, np.newaxis],
+                     instances.colors[rows][:, np.newaxis], colors).ravel()
+
+    def _update_spheres(self, model_indices):
+        low = self.bounds_low[model_indices]
+        high = self.bounds_high[model_indices]
+        self.centers[model_indices] = (low + high) / 2.0
+        self.radii[model_indices] = np.linalg.norm(high - low, axis=1) / 2.0